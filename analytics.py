@@ -0,0 +1,267 @@
+import re
+import unicodedata
+
+import numpy as np
+
+from catalog import ROLE_GROUPS, split_legend_name
+
+# Columns parsed out of the legends' career stats. Batting rows are laid out
+# as their keys say; bowling rows were scraped one column off, so e.g. the
+# wickets sit under 'balls_or_balls_faced'.
+BATTING_COLUMNS = {
+    'matches': 'matches',
+    'innings': 'innings',
+    'runs': 'runs_or_wickets',
+    'average': 'avg',
+    'strike_rate': 'sr_or_economy',
+    'hundreds': 'hundreds_or_5w',
+    'fifties': 'fifties_or_4w',
+    'sixes': 'sixes_or_wickets'
+}
+BOWLING_COLUMNS = {
+    'matches': 'matches',
+    'innings': 'innings',
+    'wickets': 'balls_or_balls_faced',
+    'average': 'hundreds_or_5w',
+    'economy': 'fifties_or_4w',
+    'strike_rate': 'ducks_or_maidens'
+}
+
+# Rate stats (average, strike rate, economy) of short careers are shrunk
+# towards the role mean: weight = matches / (matches + SHRINK_MATCHES)
+SHRINK_MATCHES = 20
+
+# Players whose careers ended RECENT_YEARS or more before the newest one get
+# no recency bonus; current players get the full RECENCY_WEIGHT
+RECENT_YEARS = 10
+RECENCY_WEIGHT = 0.5
+
+# Suggested base price (crores) by score, the player's percentile in its
+# mode and role
+PRICE_BANDS = ((90, 2), (75, 1.5), (50, 1), (25, 0.75), (0, 0.5))
+
+# Filter values ranking() accepts; anything else would only fill the cache
+MODES = ('mega', 'legend')
+ROLES = tuple(role for _, role in ROLE_GROUPS)
+BANDS = tuple(price for _, price in PRICE_BANDS)
+
+MAX_TOP = 250
+
+def number(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return np.nan
+
+def span_end(text):
+    match = re.search(r'(\d{4})\s*$', text or '')
+    return float(match.group(1)) if match else np.nan
+
+def normalize_name(name):
+    # "Quinton  de Kock" -> "quinton de kock"; accents and punctuation dropped
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^a-z ]+', ' ', name.lower()).split())
+
+def zscore(values, mask):
+    # Standardized over the rows in mask; nan elsewhere
+    selected = values[mask]
+    selected = selected[~np.isnan(selected)]
+    if selected.size < 2:
+        return np.where(mask, 0.0, np.nan)
+    std = selected.std() or 1.0
+    return np.where(mask, (values - selected.mean()) / std, np.nan)
+
+class NameIndex:
+    # Matches scorecard names ("V Kohli", "Q de Kock", "Shubman Gill") to
+    # full names. Keyed by the whole normalized name and by (first initial,
+    # surname); a key shared by several players is settled by team, and
+    # stays unmatched if that does not single one out. Initials are weaker
+    # evidence: the candidate must also share a team and have a compatible
+    # role, and a key that two different names share never matches.
+    def __init__(self, players):
+        self.exact = {}
+        self.initials = {}
+        for player in players:
+            name = normalize_name(player['name'])
+            if not name:
+                continue
+            self.exact.setdefault(name, []).append(player)
+            tokens = name.split()
+            self.initials.setdefault((tokens[0][0], tokens[-1]), []).append(player)
+
+    def match(self, name, teams=(), role=None):
+        name = normalize_name(name)
+        if not name:
+            return None
+        candidates = self.exact.get(name)
+        if candidates:
+            if len(candidates) > 1:
+                candidates = [p for p in candidates if set(p['teams']) & set(teams)]
+            return candidates[0] if len(candidates) == 1 else None
+        tokens = name.split()
+        candidates = self.initials.get((tokens[0][0], tokens[-1]), [])
+        if len({normalize_name(p['name']) for p in candidates}) != 1:
+            return None
+        candidates = [p for p in candidates
+                      if set(p['teams']) & set(teams) and compatible_roles(p['role'], role)]
+        return candidates[0] if len(candidates) == 1 else None
+
+def compatible_roles(a, b):
+    # An all-rounder can be listed under either discipline elsewhere
+    return a is None or b is None or a == b or 'all_rounder' in (a, b)
+
+class Valuations:
+    # Ratings, scores and suggested base prices for every catalog player,
+    # as arrays indexed by player id. Legends are rated from their career
+    # stats; current (mega) players take the rating of the legend their name
+    # matches, and stay unrated (nan) otherwise. Rankings per filter are
+    # computed on first use and cached; the catalog never changes.
+    def __init__(self, catalog):
+        self.catalog = catalog
+        players = catalog.players
+        count = len(players)
+        self.modes = np.array([p['mode'] for p in players])
+        self.roles = np.array([p['role'] for p in players])
+        self.base_prices = np.array([p['basePrice'] for p in players], dtype=float)
+
+        batting = {column: np.full(count, np.nan) for column in BATTING_COLUMNS}
+        bowling = {column: np.full(count, np.nan) for column in BOWLING_COLUMNS}
+        last_season = np.full(count, np.nan)
+        for player in players:
+            if player['mode'] != 'legend':
+                continue
+            pid = player['id']
+            if player['role'] == 'all_rounder':
+                bat, bowl = player.get('batting_stats'), player.get('bowling_stats')
+            elif player['role'] == 'bowler':
+                bat, bowl = None, player.get('stats')
+            else:
+                bat, bowl = player.get('stats'), None
+            for columns, values, stats in ((BATTING_COLUMNS, batting, bat), (BOWLING_COLUMNS, bowling, bowl)):
+                if stats:
+                    for column, key in columns.items():
+                        values[column][pid] = number(stats.get(key))
+            last_season[pid] = span_end((bat or bowl or {}).get('span'))
+        self.batting = batting
+        self.bowling = bowling
+
+        legend_rating = self._rate(batting, bowling, last_season)
+
+        # Current players borrow the rating of the legend with their name
+        self.source = np.full(count, -1)
+        index = NameIndex([p for p in players if p['mode'] == 'mega'])
+        for player in players:
+            if player['mode'] != 'legend':
+                continue
+            self.source[player['id']] = player['id']
+            name, teams = split_legend_name(player['name'])
+            match = index.match(name, teams, player['role'])
+            if match is not None:
+                self.source[match['id']] = player['id']
+        rated = self.source >= 0
+        self.rating = np.where(rated, legend_rating[np.maximum(self.source, 0)], np.nan)
+
+        # Score: percentile of the rating among rated players of the same mode and role
+        self.score = np.full(count, np.nan)
+        for mode in ('mega', 'legend'):
+            for _, role in ROLE_GROUPS:
+                group = np.flatnonzero((self.modes == mode) & (self.roles == role) & rated)
+                if group.size == 0:
+                    continue
+                order = np.argsort(np.argsort(self.rating[group], kind='stable'), kind='stable')
+                self.score[group] = 100.0 * order / max(group.size - 1, 1)
+
+        self.suggested_price = np.select(
+            [self.score >= cut for cut, _ in PRICE_BANDS],
+            [price for _, price in PRICE_BANDS],
+            default=np.nan
+        )
+        # Unrated players keep the catalog's base price
+        self.suggested_price = np.where(rated, self.suggested_price, self.base_prices)
+        self._rankings = {}
+
+    @staticmethod
+    def _rate(batting, bowling, last_season):
+        has_bat = ~np.isnan(batting['runs'])
+        has_bowl = ~np.isnan(bowling['wickets'])
+
+        bat_weight = batting['matches'] / (batting['matches'] + SHRINK_MATCHES)
+        bat_volume = np.log1p(batting['runs'])
+        milestones = (batting['hundreds'] + batting['fifties']) / np.maximum(batting['innings'], 1)
+        bat = (0.4 * zscore(bat_volume, has_bat)
+               + bat_weight * (0.25 * zscore(batting['average'], has_bat)
+                               + 0.25 * zscore(batting['strike_rate'], has_bat)
+                               + 0.1 * zscore(milestones, has_bat)))
+
+        bowl_weight = bowling['matches'] / (bowling['matches'] + SHRINK_MATCHES)
+        bowl_volume = np.log1p(bowling['wickets'])
+        # Lower economy, average and strike rate are better
+        bowl = (0.4 * zscore(bowl_volume, has_bowl)
+                - bowl_weight * (0.3 * zscore(bowling['economy'], has_bowl)
+                                 + 0.2 * zscore(bowling['average'], has_bowl)
+                                 + 0.1 * zscore(bowling['strike_rate'], has_bowl)))
+
+        # All-rounders average both disciplines
+        rating = np.where(has_bat & has_bowl, (bat + bowl) / 2, np.where(has_bat, bat, bowl))
+        rating = np.nan_to_num(rating, nan=0.0)
+
+        newest = np.nanmax(last_season) if np.any(~np.isnan(last_season)) else 0
+        recency = np.clip(1 - (newest - last_season) / RECENT_YEARS, 0, 1)
+        return rating + RECENCY_WEIGHT * np.nan_to_num(recency, nan=0.0)
+
+    def ranking(self, mode=None, role=None, band=None):
+        # Player ids matching the filters, best score first; unrated last.
+        # Raises ValueError for a filter outside MODES, ROLES or BANDS
+        if mode is not None and mode not in MODES:
+            raise ValueError(f'mode must be one of {", ".join(MODES)}')
+        if role is not None and role not in ROLES:
+            raise ValueError(f'role must be one of {", ".join(ROLES)}')
+        if band is not None and band not in BANDS:
+            raise ValueError(f'band must be one of {", ".join(map(str, BANDS))}')
+        key = (mode, role, band)
+        ids = self._rankings.get(key)
+        if ids is None:
+            mask = np.ones(len(self.rating), dtype=bool)
+            if mode is not None:
+                mask &= self.modes == mode
+            if role is not None:
+                mask &= self.roles == role
+            if band is not None:
+                mask &= self.suggested_price == band
+            ids = np.flatnonzero(mask)
+            # nan scores sort last; ties keep id order
+            ids = ids[np.argsort(-np.nan_to_num(self.score[ids], nan=-1.0), kind='stable')]
+            ids.flags.writeable = False
+            self._rankings[key] = ids
+        return ids
+
+    def top(self, k, mode=None, role=None, band=None):
+        return self.ranking(mode, role, band)[:max(0, min(k, MAX_TOP))].tolist()
+
+    def auction_queue(self, mode, size):
+        # The best `size` players of a mode, each role's share in proportion
+        # to its pool, in the usual role order
+        pools = [self.ranking(mode, role) for _, role in ROLE_GROUPS]
+        total = sum(len(pool) for pool in pools)
+        if total == 0:
+            return []
+        size = max(0, min(size, total))
+        shares = [len(pool) * size // total for pool in pools]
+        # Rounding leftovers go to the largest pools
+        for i in sorted(range(len(pools)), key=lambda i: -len(pools[i]))[:size - sum(shares)]:
+            shares[i] += 1
+        return np.concatenate([pool[:share] for pool, share in zip(pools, shares)]).tolist()
+
+    def describe(self, player_id):
+        player = self.catalog.get(player_id)
+        score = self.score[player_id]
+        return {
+            'id': player_id,
+            'name': player['name'],
+            'mode': player['mode'],
+            'role': player['role'],
+            'rating': None if np.isnan(self.rating[player_id]) else round(float(self.rating[player_id]), 3),
+            'score': None if np.isnan(score) else round(float(score), 1),
+            'suggestedPrice': float(self.suggested_price[player_id]),
+            'basePrice': player['basePrice']
+        }
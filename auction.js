@@ -16,14 +16,22 @@ const BACKEND_WS_URL = 'wss://auction-zan2.onrender.com/ws';
 
 let ws = null;
 let playerId = null;
+let resumeToken = null;
 let roomCode = null;
 let roomData = null;
 let selectedTeam = null;
 let isHost = false;
-let playersData = { withStats: {}, categorized: {} };
+let playerCatalog = [];  // indexed by player id, served by /api/catalog
+let catalogReady = Promise.resolve();
 let auctionMode = 'mega';
-let auctionQueue = [];
 let timerInterval = null;
+let clockOffset = 0; // server clock minus local clock, in ms
+let chatOldestId = null; // cursor for fetching older chat pages
+let chatHasMore = true; // older chat messages may still be on the server
+let chatLoading = false;
+
+// Snapshots carry only the newest entries of these lists; keep them that size
+const HISTORY_LIMITS = { chat_messages: 50, bid_history: 20 };
 
 function normalizeTimerDuration(value, fallback = 15) {
   const parsed = parseInt(value, 10);
@@ -61,14 +69,19 @@ function resetSessionState() {
   localStorage.removeItem('currentScreen');
   localStorage.removeItem('roomCode');
   localStorage.removeItem('playerId');
+  localStorage.removeItem('resumeToken');
   roomCode = null;
   playerId = null;
+  resumeToken = null;
   roomData = null;
   isHost = false;
 }
 
 // Initialize
 window.addEventListener('load', () => {
+  // Room state only carries player ids; hold messages until they can be resolved
+  catalogReady = loadPlayerData();
+
   const savedScreen = localStorage.getItem('currentScreen');
   const savedRoomCode = localStorage.getItem('roomCode');
   const savedPlayerId = localStorage.getItem('playerId');
@@ -82,6 +95,7 @@ window.addEventListener('load', () => {
 
     roomCode = savedRoomCode;
     playerId = savedPlayerId;
+    resumeToken = localStorage.getItem('resumeToken');
     connectWebSocket(true);
   } else if (PAGE !== 'home') {
     navigateTo('home');
@@ -98,7 +112,6 @@ window.addEventListener('beforeunload', () => {
 });
 
 function initPage() {
-  loadPlayerData();
   if (PAGE === 'home') initHomePage();
   if (PAGE === 'lobby') initLobbyPage();
   if (PAGE === 'auction') initAuctionPage();
@@ -138,33 +151,64 @@ function initHomePage() {
    const closeBtn = document.getElementById('closeBrowseRooms');
    const roomsList = document.getElementById('roomsList');
    if (browseBtn && modal && closeBtn && roomsList) {
+     const closeBrowse = () => {
+       modal.style.display = 'none';
+       unsubscribeLobby();
+     };
      browseBtn.onclick = () => {
        modal.style.display = 'block';
-       fetchRoomsList();
+       subscribeLobby();
      };
-     closeBtn.onclick = () => { modal.style.display = 'none'; };
-     window.onclick = (e) => { if (e.target === modal) modal.style.display = 'none'; };
+     closeBtn.onclick = closeBrowse;
+     window.onclick = (e) => { if (e.target === modal) closeBrowse(); };
    }
 }
 
-function fetchRoomsList() {
-  // Open a temp websocket to fetch rooms
+// While the browse modal is open, one websocket stays subscribed to the lobby:
+// a first page of rooms, then batched added/changed/removed events
+let lobbySocket = null;
+let lobbyRooms = new Map();
+
+function subscribeLobby() {
+  unsubscribeLobby();
   const wsBrowse = new WebSocket(BACKEND_WS_URL);
+  lobbySocket = wsBrowse;
   wsBrowse.onopen = () => {
-    wsBrowse.send(JSON.stringify({ action: 'list_rooms' }));
+    wsBrowse.send(JSON.stringify({ action: 'subscribe_lobby' }));
   };
   wsBrowse.onmessage = (event) => {
     const data = JSON.parse(event.data);
-    if (data.type === 'room_list') {
-      renderRoomsList(data.rooms);
-      wsBrowse.close();
+    if (data.type === 'lobby_snapshot') {
+      lobbyRooms = new Map(data.rooms.map(r => [r.room_code, r]));
+    } else if (data.type === 'lobby_events') {
+      data.events.forEach(e => {
+        if (e.event === 'room_removed') {
+          lobbyRooms.delete(e.room_code);
+        } else if (e.event === 'room_added' && !lobbyRooms.has(e.room.room_code)) {
+          // Newest first
+          lobbyRooms = new Map([[e.room.room_code, e.room], ...lobbyRooms]);
+        } else {
+          lobbyRooms.set(e.room.room_code, e.room);
+        }
+      });
+    } else {
+      return;
     }
+    renderRoomsList([...lobbyRooms.values()]);
   };
   wsBrowse.onerror = () => {
     document.getElementById('roomsList').innerHTML = '<p style="color:red">Failed to fetch rooms.</p>';
   };
 }
 
+function unsubscribeLobby() {
+  if (lobbySocket) {
+    lobbySocket.onmessage = null;
+    lobbySocket.close();
+    lobbySocket = null;
+  }
+}
+
 function renderRoomsList(rooms) {
   if (!rooms.length) {
     document.getElementById('roomsList').innerHTML = '<p style="color:var(--text-dim);text-align:center;padding:20px;">No rooms found. Create one!</p>';
@@ -231,6 +275,9 @@ function initAuctionPage() {
   document.getElementById('chatInput')?.addEventListener('keypress', (e) => {
     if (e.key === 'Enter') sendChatMessage();
   });
+  document.getElementById('chatMessages')?.addEventListener('scroll', (e) => {
+    if (e.target.scrollTop === 0) loadOlderChat();
+  });
   document.getElementById('endAuctionBtn')?.addEventListener('click', endAuction);
   document.addEventListener('keydown', handleBidHotkey);
 }
@@ -272,61 +319,110 @@ function checkReady() {
 
 async function loadPlayerData() {
   try {
-    // Load both datasets
-    const respStats = await fetch('ipl_players_with_stats.json');
-    const respCategorized = await fetch('ipl_categorized_players.json');
-    playersData.withStats = await respStats.json();
-    playersData.categorized = await respCategorized.json();
-    console.log('Loaded players:', playersData);
+    const resp = await fetch(`${BACKEND_BASE_URL}/api/catalog`);
+    const data = await resp.json();
+    playerCatalog = data.players;
+    console.log('Loaded players:', playerCatalog.length);
   } catch(e) {
     console.error('Failed to load player data:', e);
     alert('Failed to load player data. Please refresh the page.');
   }
 }
 
-function connectWebSocket(isReconnecting = false) {
-  ws = new WebSocket(BACKEND_WS_URL);
+// The room code in the URL lets a sharded server route the connection to the
+// worker that owns the room
+function roomSocketUrl(code) {
+  return code ? `${BACKEND_WS_URL}?room=${encodeURIComponent(code)}` : BACKEND_WS_URL;
+}
+
+function connectWebSocket(isReconnecting = false, code = roomCode) {
+  ws = new WebSocket(roomSocketUrl(code));
 
   ws.onopen = () => {
     console.log('WebSocket connected');
     
-    // Handle reconnection if needed
+    // Handle reconnection if needed. With the room still in memory, the
+    // server only replays the updates missed while disconnected.
     if (isReconnecting && roomCode && playerId) {
       ws.send(JSON.stringify({
         action: 'reconnect',
         room_code: roomCode,
-        player_id: playerId
+        player_id: playerId,
+        resume_token: resumeToken,
+        last_seq: roomData ? roomData.version : null
       }));
     }
   };
 
   ws.onmessage = (event) => {
     const data = JSON.parse(event.data);
-    handleWebSocketMessage(data);
+    catalogReady.then(() => handleWebSocketMessage(data));
   };
 
   ws.onerror = (error) => {
     console.error('WebSocket error:', error);
   };
 
-  ws.onclose = () => {
+  ws.onclose = (event) => {
     console.log('WebSocket closed');
+    // 1012: the server restarted for a deploy and the room resumes on the new one
+    const restarting = event.code === 1012;
     setTimeout(() => {
       if (roomCode) {
-        alert('Connection lost. Reconnecting...');
-        connectWebSocket();
+        if (restarting) {
+          showToast('Server restarted, reconnecting...', 'info');
+        } else {
+          alert('Connection lost. Reconnecting...');
+        }
+        connectWebSocket(true);
       }
     }, 2000);
   };
 }
 
+// Apply a versioned room delta on top of the local snapshot. Returns false when
+// the delta is stale or a version was skipped; in the latter case a full
+// snapshot is requested from the server.
+function applyRoomDelta(data) {
+  if (!roomData) return false;
+  if (data.version <= roomData.version) return false;
+  if (data.version !== roomData.version + 1) {
+    requestSync();
+    return false;
+  }
+
+  data.delta.forEach(([op, path, value]) => {
+    let target = roomData;
+    for (let i = 0; i < path.length - 1; i++) target = target[path[i]];
+    const key = path[path.length - 1];
+    if (op === 'set') target[key] = value;
+    else if (op === 'append') {
+      target[key].push(value);
+      if (HISTORY_LIMITS[key] && target[key].length > HISTORY_LIMITS[key]) target[key].shift();
+    }
+    else if (op === 'del') delete target[key];
+  });
+  roomData.version = data.version;
+  return true;
+}
+
+function requestSync() {
+  if (ws && ws.readyState === WebSocket.OPEN) {
+    ws.send(JSON.stringify({ action: 'sync', version: roomData ? roomData.version : 0 }));
+  }
+}
+
 function handleWebSocketMessage(data) {
   console.log('Received:', data);
 
+  const serverTime = data.server_time || (data.room_data && data.room_data.server_time);
+  if (serverTime) clockOffset = serverTime - Date.now();
+
   switch(data.type) {
     case 'room_created':
       roomCode = data.room_code;
       playerId = data.player_id;
+      resumeToken = data.resume_token;
       roomData = data.room_data;
       isHost = true;
       showLobby();
@@ -335,15 +431,22 @@ function handleWebSocketMessage(data) {
     case 'joined_room':
       roomCode = data.room_code;
       playerId = data.player_id;
+      resumeToken = data.resume_token;
       roomData = data.room_data;
       isHost = false;
       showLobby();
       break;
     
+    case 'resumed':
+      // The missed updates follow as ordinary delta messages
+      console.log(`Resumed at version ${data.last_seq}, replaying ${data.replayed} update(s)`);
+      break;
+
     case 'reconnected':
+    case 'room_snapshot':
       roomData = data.room_data;
-      playerId = data.player_id;
-      roomCode = data.room_code;
+      if (data.player_id) playerId = data.player_id;
+      if (data.room_code) roomCode = data.room_code;
       isHost = playerId === roomData.host_id;
       auctionMode = roomData.auction_mode || 'mega';
       
@@ -365,7 +468,7 @@ function handleWebSocketMessage(data) {
           document.getElementById('timerControls').style.display = 'flex';
         }
 
-        if (roomData.auction_state.status === 'active' && isHost) {
+        if (roomData.auction_state.status === 'active') {
           startTimer();
         }
 
@@ -390,7 +493,7 @@ function handleWebSocketMessage(data) {
 
     case 'player_joined':
     case 'player_left':
-      roomData = data.room_data;
+      if (!applyRoomDelta(data)) break;
       updateLobby();
       if (data.type === 'player_left' && roomData && roomData.host_id === playerId) {
         isHost = true;
@@ -399,19 +502,19 @@ function handleWebSocketMessage(data) {
       break;
 
     case 'auction_started':
-      roomData = data.room_data;
+      if (!applyRoomDelta(data)) break;
       auctionMode = roomData.auction_mode || 'mega';
       localStorage.setItem('currentScreen', 'auction');
       showAuction();
       break;
 
     case 'bid_placed':
-      roomData = data.room_data;
+      if (!applyRoomDelta(data)) break;
       updateAuctionUI();
       break;
 
     case 'auction_paused':
-      roomData = data.room_data;
+      if (!applyRoomDelta(data)) break;
       document.getElementById('pausedOverlay').classList.add('show');
       document.getElementById('pauseBtn').style.display = 'none';
       document.getElementById('resumeBtn').style.display = 'block';
@@ -419,47 +522,58 @@ function handleWebSocketMessage(data) {
       break;
 
     case 'auction_resumed':
-      roomData = data.room_data;
+      if (!applyRoomDelta(data)) break;
       document.getElementById('pausedOverlay').classList.remove('show');
       document.getElementById('pauseBtn').style.display = 'block';
       document.getElementById('resumeBtn').style.display = 'none';
-      if (isHost && roomData.auction_state.status === 'active') {
+      if (roomData.auction_state.status === 'active') {
         startTimer();
       }
       break;
 
     case 'player_sold':
-      roomData = data.room_data;
+      if (!applyRoomDelta(data)) break;
       showSoldOverlay(data.winner_name, data.final_price);
       break;
 
-    case 'new_message':
-      addChatMessage(data.message.player_name, data.message.message, data.message.team);
+    case 'new_message': {
+      if (!applyRoomDelta(data)) break;
+      const msg = roomData.chat_messages[roomData.chat_messages.length - 1];
+      addChatMessage(msg.player_name, msg.message, msg.team);
       break;
+    }
 
     case 'timer_changed':
-      roomData = data.room_data;
+      if (!applyRoomDelta(data)) break;
       alert(`Timer duration changed to ${data.timer_duration}s by host`);
       syncTimerControls();
       updateTimerDisplay();
-      if (isHost && roomData?.auction_state?.status === 'active') {
+      if (roomData?.auction_state?.status === 'active') {
         startTimer();
       }
       break;
 
     case 'auction_ended':
-      roomData = data.room_data;
+      if (!applyRoomDelta(data)) break;
       if (timerInterval) clearInterval(timerInterval);
       
       // Show results directly - no re-auction
       showAuctionResults();
       break;
 
-    case 'timer_update':
-      if (roomData) {
-        roomData.auction_state.time_left = data.time_left;
-        updateTimerDisplay();
-      }
+    case 'bid_rejected':
+      // Usually a lost race for the same increment; the next delta will
+      // bring the current bid, so a toast is enough
+      showToast(data.message, 'warning');
+      break;
+
+    case 'history':
+      if (data.kind === 'chat') prependChatMessages(data.items, data.has_more);
+      break;
+
+    case 'server_draining':
+      // A restart is pending: running auctions finish first, then everyone reconnects
+      showToast('Server restart pending, your auction will continue', 'warning');
       break;
 
     case 'left_room':
@@ -507,7 +621,7 @@ function joinRoom() {
 
   resetSessionState();
 
-  connectWebSocket();
+  connectWebSocket(false, code);
 
   ws.onopen = () => {
     ws.send(JSON.stringify({
@@ -524,6 +638,7 @@ function showLobby() {
   localStorage.setItem('currentScreen', 'lobby');
   localStorage.setItem('roomCode', roomCode);
   localStorage.setItem('playerId', playerId);
+  localStorage.setItem('resumeToken', resumeToken);
 
   if (PAGE !== 'lobby') {
     navigateTo('lobby');
@@ -613,85 +728,20 @@ function leaveRoom() {
   localStorage.removeItem('currentScreen');
   localStorage.removeItem('roomCode');
   localStorage.removeItem('playerId');
+  localStorage.removeItem('resumeToken');
   roomCode = null;
   playerId = null;
+  resumeToken = null;
   navigateTo('home');
 }
 
 function startAuction() {
-  // Get auction mode from room data
-  auctionMode = roomData.auction_mode || 'mega';
-  
-  // Build auction queue based on auction mode
-  auctionQueue = [];
-  
-  const data = auctionMode === 'mega' ? playersData.categorized : playersData.withStats;
-  
-  if (data.batsmen) {
-    auctionQueue.push(...assignBasePrices(data.batsmen, 'batsman', auctionMode));
-  }
-  if (data.all_rounders) {
-    auctionQueue.push(...assignBasePrices(data.all_rounders, 'all_rounder', auctionMode));
-  }
-  if (data.bowlers) {
-    auctionQueue.push(...assignBasePrices(data.bowlers, 'bowler', auctionMode));
-  }
-
-  // Sort by role
-  auctionQueue.sort((a, b) => {
-    const order = { batsman: 1, all_rounder: 2, bowler: 3 };
-    return order[a.role] - order[b.role];
-  });
-
-  ws.send(JSON.stringify({
-    action: 'start_auction',
-    auction_queue: auctionQueue
-  }));
+  // The server builds the queue for the room's mode from its player catalog
+  ws.send(JSON.stringify({ action: 'start_auction' }));
 }
 
-function assignBasePrices(players, role, mode) {
-  if (mode === 'mega') {
-    // For Mega auction, parse price from categorized data
-    return players.map((p) => {
-      let basePrice = 0.5; // default
-      if (p.price) {
-        const priceStr = p.price.toLowerCase();
-        if (priceStr.includes('18') || priceStr.includes('14')) {
-          basePrice = 2;
-        } else if (priceStr.includes('10') || priceStr.includes('4')) {
-          basePrice = 1;
-        } else {
-          basePrice = 0.5;
-        }
-      }
-      return { 
-        ...p, 
-        basePrice, 
-        role,
-        isForeign: p.nationality && !p.nationality.toLowerCase().includes('india')
-      };
-    });
-  } else {
-    // For Legend auction, use stats-based pricing
-    let sorted = [...players];
-    
-    if (role === 'batsman') {
-      sorted.sort((a,b) => parseFloat(b.stats?.runs_or_wickets||0) - parseFloat(a.stats?.runs_or_wickets||0));
-    } else if (role === 'bowler') {
-      sorted.sort((a,b) => parseFloat(b.stats?.matches||0) - parseFloat(a.stats?.matches||0));
-    } else {
-      sorted.sort((a,b) => parseFloat(b.batting_stats?.matches||0) - parseFloat(a.batting_stats?.matches||0));
-    }
-    
-    const third = Math.ceil(sorted.length / 3);
-    return sorted.map((p, i) => {
-      let basePrice;
-      if (i < third) basePrice = 2;
-      else if (i < third * 2) basePrice = 1;
-      else basePrice = 0.5;
-      return { ...p, basePrice, role, isForeign: false };
-    });
-  }
+function playerById(id) {
+  return playerCatalog[id];
 }
 
 function showAuction() {
@@ -724,12 +774,14 @@ function showAuction() {
   if (isCurrentHost) {
     document.getElementById('endAuctionBtn').style.display = 'block';
     document.getElementById('timerControls').style.display = 'flex';
-    if (roomData.auction_state.status === 'active') startTimer();
   } else {
     document.getElementById('endAuctionBtn').style.display = 'none';
     document.getElementById('timerControls').style.display = 'none';
   }
 
+  if (roomData.auction_state.status === 'active') startTimer();
+
+  renderChat();
   updateAuctionUI();
 }
 
@@ -737,7 +789,7 @@ function updateAuctionUI() {
   if (!roomData || !roomData.auction_state) return;
 
   const state = roomData.auction_state;
-  const currentPlayer = state.auction_queue[state.current_player_idx];
+  const currentPlayer = playerById(state.auction_queue[state.current_player_idx]);
   
   if (!currentPlayer) return;
 
@@ -886,7 +938,7 @@ function renderPlayer(p) {
             <circle class="timer-progress" id="timerProgress" cx="50" cy="50" r="42"
               stroke-dasharray="264" stroke-dashoffset="0"></circle>
           </svg>
-          <div class="timer-text" id="timerText">${roomData.auction_state.time_left}</div>
+          <div class="timer-text" id="timerText">${Math.ceil(roomData.auction_state.time_left)}</div>
         </div>
       </div>
 
@@ -929,7 +981,7 @@ function renderUpcoming() {
   const start = state.current_player_idx + 1;
   const end = isExpanded ? state.auction_queue.length : Math.min(start + 5, state.auction_queue.length);
   
-  const upcoming = state.auction_queue.slice(start, end);
+  const upcoming = state.auction_queue.slice(start, end).map(playerById);
   
   document.getElementById('upcomingList').innerHTML = upcoming.map((p) => {
     const nameMatch = p.name.match(/^(.+?)\s*\(/);
@@ -963,11 +1015,12 @@ function renderTeams() {
         </div>
         <div class="team-players-list">
           ${p.players.length === 0 ? '<div class="no-players">No players yet</div>' : 
-            p.players.map(pl => {
+            p.players.map(entry => {
+              const pl = playerById(entry.id);
               const nm = pl.name.match(/^(.+?)\s*\(/);
               return `<div class="team-player-item">
                 <span class="team-player-name">${nm ? nm[1] : pl.name}</span>
-                <span class="team-player-price">${formatCrShort(pl.price)}</span>
+                <span class="team-player-price">${formatCrShort(entry.soldPrice)}</span>
               </div>`;
             }).join('')
           }
@@ -1027,33 +1080,30 @@ function placeBid() {
   }));
 }
 
+// The server owns the lot clock and settles the lot when it expires; this only
+// renders the countdown towards the server-provided deadline.
 function startTimer() {
   if (timerInterval) clearInterval(timerInterval);
 
-  timerInterval = setInterval(() => {
-    if (roomData.auction_state.status !== 'active') {
+  const tick = () => {
+    const state = roomData.auction_state;
+    if (state.status !== 'active') {
       clearInterval(timerInterval);
       return;
     }
-
-    roomData.auction_state.time_left--;
-    
-    ws.send(JSON.stringify({
-      action: 'timer_tick',
-      time_left: roomData.auction_state.time_left
-    }));
-
+    if (state.deadline) {
+      const remaining = (state.deadline - (Date.now() + clockOffset)) / 1000;
+      state.time_left = Math.max(0, Math.min(roomData.timer_duration, remaining));
+    }
     updateTimerDisplay();
+  };
 
-    if (roomData.auction_state.time_left <= 0) {
-      clearInterval(timerInterval);
-      soldPlayer();
-    }
-  }, 1000);
+  tick();
+  timerInterval = setInterval(tick, 250);
 }
 
 function updateTimerDisplay() {
-  const timeLeft = roomData.auction_state.time_left;
+  const timeLeft = Math.ceil(roomData.auction_state.time_left);
   const timerText = document.getElementById('timerText');
   if (timerText) timerText.textContent = timeLeft;
 
@@ -1067,27 +1117,12 @@ function updateTimerDisplay() {
   }
 }
 
-function soldPlayer() {
-  const state = roomData.auction_state;
-  const currentPlayer = state.auction_queue[state.current_player_idx];
-  
-  ws.send(JSON.stringify({
-    action: 'player_sold',
-    player_data: {
-      name: currentPlayer.name,
-      price: state.current_bid,
-      role: currentPlayer.role
-    },
-    final_price: state.current_bid
-  }));
-}
-
 function showSoldOverlay(winnerName, finalPrice) {
   const state = roomData.auction_state;
   const prevIdx = state.current_player_idx - 1;
   
   if (prevIdx >= 0 && prevIdx < state.auction_queue.length) {
-    const player = state.auction_queue[prevIdx];
+    const player = playerById(state.auction_queue[prevIdx]);
     const nameMatch = player.name.match(/^(.+?)\s*\(/);
     const name = nameMatch ? nameMatch[1] : player.name;
 
@@ -1124,7 +1159,7 @@ function showSoldOverlay(winnerName, finalPrice) {
       
       if (state.current_player_idx < state.auction_queue.length && state.status === 'active') {
         updateAuctionUI();
-        if (isHost) startTimer();
+        startTimer();
       }
     }, 2500);
   }
@@ -1170,8 +1205,7 @@ function sendChatMessage() {
   }
 }
 
-function addChatMessage(playerName, message, team) {
-  const chatMessages = document.getElementById('chatMessages');
+function chatMessageElement(playerName, message, team) {
   const teamInfo = TEAMS.find(t => t.abbr === team);
   const color = teamInfo ? teamInfo.color : '#666';
   
@@ -1181,10 +1215,46 @@ function addChatMessage(playerName, message, team) {
     <span class="chat-sender" style="color: ${color}">${playerName}:</span>
     <span class="chat-text">${escapeHtml(message)}</span>
   `;
-  chatMessages.appendChild(msgDiv);
+  return msgDiv;
+}
+
+function addChatMessage(playerName, message, team) {
+  const chatMessages = document.getElementById('chatMessages');
+  chatMessages.appendChild(chatMessageElement(playerName, message, team));
   chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
+// The snapshot only has the newest messages; scrolling to the top of the chat
+// fetches older pages from the server
+function renderChat() {
+  const chatMessages = document.getElementById('chatMessages');
+  if (!chatMessages) return;
+  chatMessages.innerHTML = '';
+  const messages = roomData.chat_messages || [];
+  messages.forEach(m => addChatMessage(m.player_name, m.message, m.team));
+  chatOldestId = messages.length ? messages[0].id : null;
+  chatHasMore = messages.length >= HISTORY_LIMITS.chat_messages;
+}
+
+function loadOlderChat() {
+  if (!chatHasMore || chatLoading || chatOldestId === null || !ws || ws.readyState !== WebSocket.OPEN) return;
+  chatLoading = true;
+  ws.send(JSON.stringify({ action: 'history', kind: 'chat', before: chatOldestId }));
+}
+
+function prependChatMessages(items, hasMore) {
+  chatLoading = false;
+  chatHasMore = hasMore;
+  const chatMessages = document.getElementById('chatMessages');
+  if (!chatMessages || !items.length) return;
+  const previousHeight = chatMessages.scrollHeight;
+  const fragment = document.createDocumentFragment();
+  items.forEach(m => fragment.appendChild(chatMessageElement(m.player_name, m.message, m.team)));
+  chatMessages.insertBefore(fragment, chatMessages.firstChild);
+  chatOldestId = items[0].id;
+  chatMessages.scrollTop = chatMessages.scrollHeight - previousHeight;
+}
+
 function addSoldPlayer(playerName, winnerName, price, role) {
   const soldList = document.getElementById('soldPlayersList');
   const count = document.getElementById('soldCount');
@@ -1293,7 +1363,7 @@ function showAuctionResults() {
   // Group unsold players by base price
   const unsoldByPrice = {};
   if (roomData.auction_state.unsold_players) {
-    roomData.auction_state.unsold_players.forEach(player => {
+    roomData.auction_state.unsold_players.map(u => playerById(u.id)).forEach(player => {
       const price = player.basePrice;
       if (!unsoldByPrice[price]) {
         unsoldByPrice[price] = [];
@@ -1355,7 +1425,8 @@ function showAuctionResults() {
                     </div>
                   </div>
                   <div class="result-players-list">
-                    ${p.players.length > 0 ? p.players.map(player => {
+                    ${p.players.length > 0 ? p.players.map(entry => {
+                      const player = { ...playerById(entry.id), soldPrice: entry.soldPrice };
                       const pName = player.name.match(/^(.+?)\s*\(/)?.[1] || player.name;
                       return `
                         <div class="result-player-item">
@@ -1468,7 +1539,7 @@ function showUnsoldSelection() {
   
   // Group unsold players by base price
   const unsoldByPrice = {};
-  roomData.auction_state.unsold_players.forEach(player => {
+  roomData.auction_state.unsold_players.map(u => playerById(u.id)).forEach(player => {
     const price = player.basePrice;
     if (!unsoldByPrice[price]) {
       unsoldByPrice[price] = [];
@@ -1498,11 +1569,10 @@ function showUnsoldSelection() {
           <div class="unsold-selection-grid">
             ${currentPlayers.map((player, idx) => {
               const pName = player.name.match(/^(.+?)\s*\(/)?.[1] || player.name;
-              const globalIdx = roomData.auction_state.unsold_players.indexOf(player);
               return `
                 <div class="unsold-select-card">
-                  <input type="checkbox" id="unsold-${globalIdx}" class="unsold-checkbox" data-player='${JSON.stringify(player)}'>
-                  <label for="unsold-${globalIdx}" class="unsold-card-label">
+                  <input type="checkbox" id="unsold-${player.id}" class="unsold-checkbox" data-player-id="${player.id}">
+                  <label for="unsold-${player.id}" class="unsold-card-label">
                     <div class="unsold-card-name">${pName}</div>
                     <div class="unsold-card-meta">
                       <span class="role-badge role-${player.role}">${player.role}</span>
@@ -1554,7 +1624,7 @@ function showUnsoldSelection() {
 
 function startReauction() {
   const checkboxes = document.querySelectorAll('.unsold-checkbox:checked');
-  const selectedPlayers = Array.from(checkboxes).map(cb => JSON.parse(cb.dataset.player));
+  const selectedPlayers = Array.from(checkboxes).map(cb => parseInt(cb.dataset.playerId, 10));
   
   if (selectedPlayers.length === 0) {
     alert('Please select at least one player to re-auction');
@@ -1568,7 +1638,7 @@ function startReauction() {
   // Send to server to restart auction with selected players
   ws.send(JSON.stringify({
     action: 'start_reauction',
-    selected_players: selectedPlayers
+    player_ids: selectedPlayers
   }));
 }
 
@@ -1,13 +1,202 @@
+import argparse
 import asyncio
-import json
+import collections
+import functools
+import hashlib
+import hmac
+import itertools
+import math
+import os
 import secrets
+import signal
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field, replace
 from datetime import datetime
-from aiohttp import web
+from aiohttp import WSCloseCode, web
 import aiohttp_cors
 
+import codec
+import fanout
+import metrics
+import sharding
+from bots import RISK_PROFILES, BotDriver
+from catalog import TEAM_ABBREVIATIONS, PlayerCatalog
+from codec import NUMBER, Field
+from fanout import Connection
+from journal import Journal
+from lobby import LobbyIndex, page_bounds, parse_filters
+from results import FORMATS, RoomSummary, stream_results
+from scheduler import Scheduler
+from sharding import Shard, SocketBus
+from spectators import SpectatorTier
+from static_assets import Asset, StaticAssets, asset_response
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def default_data_dir():
+    # Read at construction, so ServerConfig() honours AUCTION_DATA_DIR too
+    return os.environ.get('AUCTION_DATA_DIR', os.path.join(BASE_DIR, 'data'))
+
+@dataclass(slots=True)
+class ServerConfig:
+    host: str = '0.0.0.0'
+    port: int = 8080
+    workers: int = 1  # Worker processes; rooms are sharded across them by code
+    data_dir: str = field(default_factory=default_data_dir)
+    max_rooms: int = 1000  # Per worker; create_room is refused beyond this
+    max_message_size: int = 64 * 1024  # Largest client websocket frame, bytes
+    drain_timeout: float = 300  # Seconds live auctions may run on after SIGTERM
+    cors_origins: tuple = ('*',)  # Origins allowed to call the /api endpoints
+    preload: bool = True  # Load the catalog, valuations and static files right after startup
+    
+    @classmethod
+    def from_env(cls, env=os.environ):
+        defaults = cls()
+        return cls(
+            host=env.get('AUCTION_HOST', defaults.host),
+            port=int(env.get('AUCTION_PORT', defaults.port)),
+            workers=int(env.get('AUCTION_WORKERS', defaults.workers)),
+            data_dir=env.get('AUCTION_DATA_DIR', defaults.data_dir),
+            max_rooms=int(env.get('AUCTION_MAX_ROOMS', defaults.max_rooms)),
+            max_message_size=int(env.get('AUCTION_MAX_MESSAGE_SIZE', defaults.max_message_size)),
+            drain_timeout=float(env.get('AUCTION_DRAIN_TIMEOUT', defaults.drain_timeout)),
+            cors_origins=tuple(o.strip() for o in env.get('AUCTION_CORS_ORIGINS', '*').split(',') if o.strip()),
+            preload=env.get('AUCTION_PRELOAD', '1') != '0'
+        )
+    
+    @classmethod
+    def from_args(cls, argv=None):
+        # Command line over environment over defaults
+        config = cls.from_env()
+        parser = argparse.ArgumentParser(description='IPL Auction Server')
+        parser.add_argument('--host', default=config.host)
+        parser.add_argument('--port', type=int, default=config.port)
+        parser.add_argument('--workers', type=int, default=config.workers,
+                            help='worker processes; rooms are sharded across them by room code')
+        parser.add_argument('--data-dir', default=config.data_dir)
+        parser.add_argument('--max-rooms', type=int, default=config.max_rooms)
+        parser.add_argument('--max-message-size', type=int, default=config.max_message_size)
+        parser.add_argument('--drain-timeout', type=float, default=config.drain_timeout,
+                            help='seconds live auctions may run on after SIGTERM before the server exits')
+        args = parser.parse_args(argv)
+        for name, value in vars(args).items():
+            setattr(config, name, value)
+        return config
+
+class Lazy:
+    # A resource built on first use rather than at import, so starting a
+    # process (or a worker) stays fast. Attribute access goes through to the
+    # built object. Thread-safe, so it can be warmed from an executor.
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+    
+    def load(self):
+        if self._value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+        return self._value
+    
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+# Set by create_app()
+config = ServerConfig.from_env()
+
 # Store active rooms
 rooms = {}
 
+# Write-behind log + snapshots of every room, replayed on startup
+journal = Journal(config.data_dir)
+
+# Which rooms this process owns; replaced per worker in sharded mode (--workers)
+shard = Shard()
+
+# Lobby summaries of every room (other shards' included), pushed to subscribers
+lobby = LobbyIndex()
+
+# Every auctionable player, loaded once; rooms only hold player ids
+catalog = Lazy(PlayerCatalog.load)
+catalog_asset = Lazy(lambda: Asset('catalog.json', catalog.payload, None))
+
+def load_valuations():
+    # NumPy is only imported here
+    from analytics import Valuations
+    return Valuations(catalog.load())
+
+# Stats-based ratings and suggested prices for the catalog, with cached rankings
+valuations = Lazy(load_valuations)
+
+# Pages, script, styles and data files held in memory, precompressed.
+# AUCTION_DEV=1 reloads them when files change on disk.
+static_assets = Lazy(lambda: StaticAssets(BASE_DIR, dev=os.environ.get('AUCTION_DEV') == '1'))
+
+# Set on SIGTERM: no new rooms, live auctions run on until drained
+draining = False
+
+# Shared clock driver for every room's lot timer
+scheduler = Scheduler()
+
+# Task evicting abandoned rooms, started with the app
+room_sweeper = None
+
+# Loop-lag monitor (and trace writer), started with the app
+metrics_monitor = None
+
+# Hot-path instrumentation, served at /metrics. Connection-level actions are
+# timed in handle_websocket, room commands on the room's actor.
+action_seconds = metrics.histogram('auction_action_seconds', 'Handling one client message', label='action')
+batch_seconds = metrics.histogram(
+    'auction_room_batch_seconds', 'Applying, committing and broadcasting one batch of room commands')
+batch_commands = metrics.histogram('auction_room_batch_commands', 'Commands per room batch', metrics.COUNT_BUCKETS)
+errors = metrics.counter('auction_errors_total', 'Client messages that failed, by action', label='action')
+reconnects = metrics.counter('auction_reconnects_total', 'Reconnects by outcome: replayed, snapshot or rejected',
+                             label='outcome')
+
+# Lot clocks run this many times faster than real time; for soak tests
+TIME_SCALE = float(os.environ.get('AUCTION_TIME_SCALE', 1))
+
+# Gap between a lot being settled and the next lot's clock starting,
+# long enough for clients to show the SOLD/UNSOLD overlay
+LOT_INTERMISSION = 3
+
+# Chat and bid history are ring buffers. Snapshots carry only the newest
+# entries; older ones still in the ring are fetched a page at a time.
+CHAT_CAPACITY = 200
+CHAT_WINDOW = 50
+BID_HISTORY_CAPACITY = 100
+BID_HISTORY_WINDOW = 20
+HISTORY_PAGE_MAX = 100
+MAX_CHAT_LENGTH = 200
+
+# Recent broadcasts kept per room, so a client that reconnects (or detects a
+# gap) gets just the events it missed instead of a full snapshot
+REPLAY_CAPACITY = 32
+
+# Rooms with nobody connected are evicted (archived when journaling) after
+# this many seconds without a player command
+ROOM_TTL = int(os.environ.get('AUCTION_ROOM_TTL', 30 * 60))
+SWEEP_INTERVAL = 60
+
+# While draining for a restart, rooms in these states with anyone connected
+# are left to finish
+LIVE_STATUSES = ('active', 'paused')
+DRAIN_POLL_INTERVAL = 0.5
+
+# Sent to the client when a handler fails unexpectedly; the details are logged
+INTERNAL_ERROR = 'Something went wrong, please try again'
+
+def log_error(action, room_code):
+    print(f"Error handling {action_label(action)} in room {room_code}:")
+    traceback.print_exc()
+
+def now_ms():
+    return int(time.time() * 1000)
+
 def normalize_timer_duration(value, default=15, min_value=5, max_value=30):
     try:
         parsed = int(value)
@@ -15,7 +204,65 @@ def normalize_timer_duration(value, default=15, min_value=5, max_value=30):
         parsed = default
     return max(min_value, min(max_value, parsed))
 
+def next_bid_amount(current_bid):
+    # Same increments as the client: +10 Lakh under 5 Cr, +25 Lakh above
+    if current_bid < 5:
+        return round(current_bid + 0.10, 2)
+    return round(current_bid + 0.25, 2)
+
+def compact_ops(ops):
+    # Drop 'set' ops that a later 'set' of the same path overwrites, unless an
+    # op in between works inside that path and so depends on the earlier value.
+    # Walks backwards keeping the set of paths overwritten further ahead.
+    kept = []
+    overwritten = set()
+    for op in reversed(ops):
+        path = tuple(op[1])
+        if op[0] == 'set' and path in overwritten:
+            continue
+        for i in range(1, len(path) + 1):
+            overwritten.discard(path[:i])
+        if op[0] == 'set':
+            overwritten.add(path)
+        kept.append(op)
+    kept.reverse()
+    return kept
+
+# Spectators of each room, fed merged deltas on a fixed tick
+spectators = SpectatorTier(rooms.get, compact_ops)
+
+# Computer-controlled teams; they look at a room after each command batch
+bots = BotDriver(catalog, valuations, next_bid_amount, TIME_SCALE)
+
+@dataclass(slots=True)
+class Team:
+    name: str
+    team: str
+    purse: float = 120
+    players: list = field(default_factory=list)  # [{'id', 'soldPrice'}]
+    foreign_count: int = 0
+    bot: str = None  # Risk profile of a computer-controlled team
+    
+    def to_dict(self):
+        entry = {
+            'name': self.name,
+            'team': self.team,
+            'purse': self.purse,
+            'players': list(self.players),
+            'foreign_count': self.foreign_count
+        }
+        if self.bot:
+            entry['bot'] = self.bot
+        return entry
+
 class AuctionRoom:
+    __slots__ = (
+        'room_code', 'host_id', 'auction_mode', 'max_players_per_team', 'max_foreign_players',
+        'timer_duration', 'players', 'teams', 'auction_state', 'chat_messages', 'history_seq',
+        'websockets', 'last_active', 'version', '_ops', '_deadline_at', 'commands', '_actor',
+        'secret', 'replay', 'summary'
+    )
+    
     def __init__(self, room_code, host_name, auction_mode, timer_duration):
         self.room_code = room_code
         self.host_id = None
@@ -23,7 +270,7 @@ class AuctionRoom:
         self.max_players_per_team = 25  # Fixed at 25 players per team
         self.max_foreign_players = 8  # Max 8 foreign players in mega auction
         self.timer_duration = timer_duration
-        self.players = {}
+        self.players = {}  # player_id -> Team
         self.teams = {}
         self.auction_state = {
             'status': 'waiting',  # waiting, active, paused, ended
@@ -31,457 +278,1304 @@ class AuctionRoom:
             'current_bid': 0,
             'current_bidder_id': None,
             'time_left': timer_duration,
-            'bid_history': [],
+            'bid_history': collections.deque(maxlen=BID_HISTORY_CAPACITY),
             'auction_queue': [],
             'sold_players': [],
             'unsold_players': [],
-            'paused_by': None
+            'paused_by': None,
+            'deadline': None  # Wall-clock ms when the current lot closes
         }
-        self.chat_messages = []
+        self.chat_messages = collections.deque(maxlen=CHAT_CAPACITY)
+        self.history_seq = 0  # Ids for chat and bid entries, used as page cursors
         self.websockets = {}
-        
-    def add_player(self, player_id, player_data):
+        self.last_active = time.monotonic()
+        # Monotonic state version; every committed change bumps it by one
+        self.version = 0
+        self._ops = []
+        self._deadline_at = None  # Monotonic twin of auction_state['deadline']
+        self.commands = None
+        self._actor = None
+        # Resume tokens are derived from this; persisted, never sent to clients
+        self.secret = secrets.token_hex(16)
+        self.replay = collections.deque(maxlen=REPLAY_CAPACITY)  # (version, JSON frame)
+        self.summary = RoomSummary()  # Results so far, kept current by settle_lot
+    
+    @classmethod
+    def from_dict(cls, state):
+        # Rebuild a room from a journal snapshot (to_dict() shape)
+        room = cls(state['room_code'], None, state['auction_mode'], state['timer_duration'])
+        room.version = state['version']
+        room.host_id = state['host_id']
+        room.max_players_per_team = state['max_players_per_team']
+        room.max_foreign_players = state['max_foreign_players']
+        room.players = {pid: Team(**team) for pid, team in state['players'].items()}
+        room.teams = state['teams']
+        room.auction_state = state['auction_state']
+        history = state['auction_state']['bid_history']
+        room.auction_state['bid_history'] = collections.deque(history, maxlen=BID_HISTORY_CAPACITY)
+        room.chat_messages = collections.deque(state['chat_messages'], maxlen=CHAT_CAPACITY)
+        ids = [entry.get('id', 0) for entry in room.chat_messages] + [entry.get('id', 0) for entry in history]
+        room.history_seq = max(ids, default=0)
+        # Rooms journaled before resume tokens get a fresh secret; their
+        # players rejoin through the snapshot path once
+        room.secret = state.get('secret') or room.secret
+        room.summary = RoomSummary.from_state(room.auction_state, catalog)
+        return room
+    
+    # Delta recording: each mutation below also records a patch op against
+    # the to_dict() shape so broadcasts only carry what actually changed.
+    # Paths step through dicts by key and through the room / Team by attribute.
+    def set_field(self, path, value):
+        target = self._resolve(path[:-1])
+        if isinstance(target, dict):
+            target[path[-1]] = value
+        else:
+            setattr(target, path[-1], value)
+        self._ops.append(['set', path, value])
+    
+    def append_field(self, path, item):
+        self._resolve(path).append(item)
+        self._ops.append(['append', path, item])
+    
+    def delete_field(self, path):
+        target = self._resolve(path[:-1])
+        target.pop(path[-1], None)
+        self._ops.append(['del', path])
+    
+    def set_state(self, key, value):
+        self.set_field(['auction_state', key], value)
+    
+    def clear_bids(self):
+        self.auction_state['bid_history'].clear()
+        self._ops.append(['set', ['auction_state', 'bid_history'], []])
+    
+    def next_history_id(self):
+        self.history_seq += 1
+        return self.history_seq
+    
+    def _resolve(self, path):
+        target = self
+        for key in path:
+            target = target[key] if isinstance(target, dict) else getattr(target, key)
+        return target
+    
+    # Resumable sessions
+    def resume_token(self, player_id):
+        return hmac.new(self.secret.encode(), player_id.encode(), hashlib.sha256).hexdigest()[:32]
+    
+    def remember(self, version, frame):
+        self.replay.append((version, frame))
+    
+    def replay_since(self, seq):
+        # Frames for every version after seq, or None unless all of them are
+        # still buffered (some commits, like room creation, are never broadcast)
+        missed = self.version - seq
+        if missed < 0 or missed > len(self.replay):
+            return None
+        entries = list(itertools.islice(self.replay, len(self.replay) - missed, None))
+        if entries and entries[0][0] != seq + 1:
+            return None
+        return [frame for _, frame in entries]
+    
+    def commit(self, event=None):
+        # Close the current change set, journal it and return (version, ops)
+        ops = compact_ops(self._ops)
+        self._ops = []
+        self.version += 1
+        journal.append(self.room_code, self.version, event, ops)
+        if lobby_relevant(ops):
+            lobby.update(room_summary(self))
+        return self.version, ops
+    
+    # Command queue: every mutation of a live room runs on this one task, in
+    # arrival order, so handlers never interleave.
+    def start(self):
+        self.commands = asyncio.Queue()
+        self._actor = asyncio.get_running_loop().create_task(self._run())
+    
+    def stop(self):
+        if self._actor:
+            self._actor.cancel()
+            self._actor = None
+        # Nobody may be left waiting on a command that will never run
+        while self.commands is not None and not self.commands.empty():
+            future = self.commands.get_nowait()[-1]
+            if future and not future.done():
+                future.set_result(None)
+    
+    def submit(self, action, player_id, conn, data, future=None):
+        self.commands.put_nowait((action, player_id, conn, data, future))
+    
+    async def _run(self):
+        while True:
+            batch = [await self.commands.get()]
+            # Yield once so commands from the same scheduling slice (typically
+            # a burst of near-simultaneous bids) land in this batch
+            await asyncio.sleep(0)
+            while not self.commands.empty():
+                batch.append(self.commands.get_nowait())
+            process_commands(self, batch)
+    
+    def add_player(self, player_id, name, team, bot=None):
         if len(self.players) >= 10:  # Max 10 teams
             return False
         
         if len(self.players) == 0:
-            self.host_id = player_id
-            
-        self.players[player_id] = player_data
-        self.players[player_id]['foreign_count'] = 0  # Track foreign players
+            self.set_field(['host_id'], player_id)
+        
+        entry = Team(name, team, bot=bot)
+        self.players[player_id] = entry
+        self._ops.append(['set', ['players', player_id], entry.to_dict()])
         return True
     
+    def attach(self, player_id, conn):
+        # Route this player's broadcasts to conn; a lagging conn gets a fresh
+        # snapshot instead of its backlog of deltas
+        spectators.unwatch(conn)
+        conn.snapshot = lambda: {'type': 'room_snapshot', 'room_data': self.to_dict()}
+        self.websockets[player_id] = conn
+        self.last_active = time.monotonic()
+    
     def remove_player(self, player_id):
         if player_id in self.players:
-            del self.players[player_id]
+            self.delete_field(['players', player_id])
         if player_id in self.websockets:
             del self.websockets[player_id]
         
-        # If host leaves, assign new host
+        # If host leaves, assign new host, a human one if any are left
         if player_id == self.host_id and len(self.players) > 0:
-            self.host_id = list(self.players.keys())[0]
+            humans = [pid for pid, team in self.players.items() if not team.bot]
+            self.set_field(['host_id'], (humans or list(self.players))[0])
     
-    def to_dict(self):
+    # Lot clock: the server owns time_left. Clients receive a wall-clock
+    # deadline and count down locally; expiry settles the lot server-side.
+    def start_clock(self, seconds):
+        real_seconds = seconds / TIME_SCALE
+        self._deadline_at = scheduler.schedule(self.room_code, real_seconds, lambda: on_lot_expired(self))
+        self.set_state('time_left', min(seconds, self.timer_duration))
+        self.set_state('deadline', now_ms() + int(real_seconds * 1000))
+    
+    def pause_clock(self):
+        remaining = self.time_left()
+        self.stop_clock()
+        self.set_state('time_left', remaining)
+    
+    def stop_clock(self):
+        scheduler.cancel(self.room_code)
+        self._deadline_at = None
+        self.set_state('deadline', None)
+    
+    def time_left(self):
+        if self._deadline_at is None:
+            return self.auction_state['time_left']
+        remaining = (self._deadline_at - scheduler.clock()) * TIME_SCALE
+        return round(max(0, min(self.timer_duration, remaining)), 1)
+    
+    def intermission_left(self):
+        # After a sale the clock runs timer_duration + LOT_INTERMISSION; the
+        # lot opens for bids once no more than timer_duration remains
+        if self._deadline_at is None:
+            return 0
+        remaining = (self._deadline_at - scheduler.clock()) * TIME_SCALE
+        return max(0, remaining - self.timer_duration)
+    
+    def clock_expired(self):
+        return self._deadline_at is not None and scheduler.clock() >= self._deadline_at
+    
+    def to_dict(self, chat_window=CHAT_WINDOW, bid_window=BID_HISTORY_WINDOW):
+        # Client snapshot: only the newest chat and bid entries
+        self.auction_state['time_left'] = self.time_left()
+        bids = self.auction_state['bid_history']
         return {
             'room_code': self.room_code,
+            'version': self.version,
             'host_id': self.host_id,
             'auction_mode': self.auction_mode,
             'max_players_per_team': self.max_players_per_team,
             'max_foreign_players': self.max_foreign_players,
             'timer_duration': self.timer_duration,
-            'players': self.players,
+            'players': {pid: team.to_dict() for pid, team in self.players.items()},
             'teams': self.teams,
-            'auction_state': self.auction_state,
-            'chat_messages': self.chat_messages
+            'auction_state': dict(self.auction_state, bid_history=list(bids)[-bid_window:]),
+            'chat_messages': list(self.chat_messages)[-chat_window:],
+            'server_time': now_ms()
         }
+    
+    def state(self):
+        # Persisted form: everything, including the full history rings
+        state = self.to_dict(CHAT_CAPACITY, BID_HISTORY_CAPACITY)
+        del state['server_time']
+        state['secret'] = self.secret
+        return state
+
+class Session:
+    # Which room and player one websocket speaks for, once it has created,
+    # joined or reconnected to a room
+    __slots__ = ('conn', 'room_code', 'player_id')
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self.room_code = None
+        self.player_id = None
 
 async def handle_websocket(request):
-    ws = web.WebSocketResponse()
+    ws = web.WebSocketResponse(protocols=codec.PROTOCOLS, compress=codec.DEFLATE,
+                               max_msg_size=config.max_message_size)
     await ws.prepare(request)
-    
-    player_id = None
-    room_code = None
+    conn = Connection(ws, codec=codec.for_protocol(ws.ws_protocol))
+    session = Session(conn)
     
     async for msg in ws:
-        if msg.type == web.WSMsgType.TEXT:
+        if msg.type in (web.WSMsgType.TEXT, web.WSMsgType.BINARY):
+            action = started = None
             try:
-                data = json.loads(msg.data)
-                action = data.get('action')
+                data = codec.decode_frame(msg.data, msg.type == web.WSMsgType.BINARY)
+                action = data['action']
+                if action not in ROOM_COMMANDS:
+                    started = action_seconds.start()
                 
-                if action == 'reconnect':
-                    # Handle reconnection
-                    room_code = data.get('room_code')
-                    player_id = data.get('player_id')
-                    
-                    if room_code in rooms and player_id in rooms[room_code].players:
-                        room = rooms[room_code]
-                        room.websockets[player_id] = ws
-                        
-                        await ws.send_json({
-                            'type': 'reconnected',
-                            'room_code': room_code,
-                            'player_id': player_id,
-                            'room_data': room.to_dict()
-                        })
-                    else:
-                        await ws.send_json({'type': 'error', 'message': 'Room not found or player not in room'})
+                handler = CONNECTION_COMMANDS.get(action)
+                if handler is None and action not in ROOM_COMMANDS:
+                    raise codec.ProtocolError(f'Unknown action: {action[:40]}')
+                # Rejected here, before any room sees the command
+                codec.validate(SCHEMAS.get(action, {}), data)
                 
-                elif action == 'create_room':
-                    room_code = secrets.token_hex(3).upper()
-                    while room_code in rooms:
-                        room_code = secrets.token_hex(3).upper()
-                    
-                    timer_duration = normalize_timer_duration(data.get('timer_duration', 15))
-                    room = AuctionRoom(
-                        room_code,
-                        data['player_name'],
-                        data.get('auction_mode', 'mega'),
-                        timer_duration
-                    )
-                    
-                    player_id = secrets.token_hex(8)
-                    room.add_player(player_id, {
-                        'name': data['player_name'],
-                        'team': data['team'],
-                        'purse': 120,
-                        'players': []
-                    })
-                    
-                    room.websockets[player_id] = ws
-                    rooms[room_code] = room
-                    
-                    await ws.send_json({
-                        'type': 'room_created',
-                        'room_code': room_code,
-                        'player_id': player_id,
-                        'room_data': room.to_dict()
-                    })
-                
-                elif action == 'join_room':
-                    room_code = data['room_code']
-                    if room_code not in rooms:
-                        await ws.send_json({'type': 'error', 'message': 'Room not found'})
-                        continue
-                    
-                    room = rooms[room_code]
-                    player_id = secrets.token_hex(8)
-                    
-                    # Check if player name already exists
-                    existing_names = [p['name'] for p in room.players.values()]
-                    if data['player_name'] in existing_names:
-                        await ws.send_json({'type': 'error', 'message': 'Player name already exists in this room'})
-                        continue
-                    
-                    # Check if team is already taken
-                    taken_teams = [p['team'] for p in room.players.values()]
-                    if data['team'] in taken_teams:
-                        await ws.send_json({'type': 'error', 'message': 'Team already taken'})
-                        continue
-                    
-                    if room.add_player(player_id, {
-                        'name': data['player_name'],
-                        'team': data['team'],
-                        'purse': 120,
-                        'players': []
-                    }):
-                        room.websockets[player_id] = ws
-                        
-                        # Notify player
-                        await ws.send_json({
-                            'type': 'joined_room',
-                            'room_code': room_code,
-                            'player_id': player_id,
-                            'room_data': room.to_dict()
-                        })
-                        
-                        # Broadcast to all players
-                        await broadcast_to_room(room_code, {
-                            'type': 'player_joined',
-                            'room_data': room.to_dict()
-                        })
-                    else:
-                        await ws.send_json({'type': 'error', 'message': 'Room is full'})
-                
-                elif action == 'leave_room':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        room.remove_player(player_id)
-                        
-                        if len(room.players) == 0:
-                            del rooms[room_code]
-                        else:
-                            await broadcast_to_room(room_code, {
-                                'type': 'player_left',
-                                'room_data': room.to_dict()
-                            })
-                        
-                        await ws.send_json({'type': 'left_room'})
-                
-                elif action == 'start_auction':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        if player_id == room.host_id:
-                            room.auction_state['status'] = 'active'
-                            room.auction_state['auction_queue'] = data['auction_queue']
-                            room.auction_state['current_player_idx'] = 0
-                            room.auction_state['time_left'] = room.timer_duration
-                            
-                            if len(room.auction_state['auction_queue']) > 0:
-                                player = room.auction_state['auction_queue'][0]
-                                room.auction_state['current_bid'] = player['basePrice']
-                            
-                            await broadcast_to_room(room_code, {
-                                'type': 'auction_started',
-                                'room_data': room.to_dict()
-                            })
-                
-                elif action == 'start_reauction':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        # Any player can start re-auction, not just host
-                        # Mark as re-auction to prevent showing unsold selection again
-                        room.auction_state['is_reauction'] = True
-                        room.auction_state['status'] = 'active'
-                        room.auction_state['auction_queue'] = data['selected_players']
-                        room.auction_state['current_player_idx'] = 0
-                        room.auction_state['time_left'] = room.timer_duration
-                        
-                        if len(room.auction_state['auction_queue']) > 0:
-                            player = room.auction_state['auction_queue'][0]
-                            room.auction_state['current_bid'] = player['basePrice']
-                        
-                        await broadcast_to_room(room_code, {
-                            'type': 'auction_started',
-                            'room_data': room.to_dict()
-                        })
-                
-                elif action == 'place_bid':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        if room.auction_state['status'] == 'active':
-                            room.auction_state['current_bid'] = data['bid_amount']
-                            room.auction_state['current_bidder_id'] = player_id
-                            room.auction_state['time_left'] = room.timer_duration
-                            room.auction_state['bid_history'].append({
-                                'player_id': player_id,
-                                'player_name': room.players[player_id]['name'],
-                                'amount': data['bid_amount'],
-                                'timestamp': datetime.now().isoformat()
-                            })
-                            
-                            await broadcast_to_room(room_code, {
-                                'type': 'bid_placed',
-                                'room_data': room.to_dict()
-                            })
-                
-                elif action == 'pause_auction':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        room.auction_state['status'] = 'paused'
-                        room.auction_state['paused_by'] = player_id
-                        
-                        await broadcast_to_room(room_code, {
-                            'type': 'auction_paused',
-                            'paused_by': room.players[player_id]['name'],
-                            'room_data': room.to_dict()
-                        })
-                
-                elif action == 'resume_auction':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        room.auction_state['status'] = 'active'
-                        room.auction_state['paused_by'] = None
-                        
-                        await broadcast_to_room(room_code, {
-                            'type': 'auction_resumed',
-                            'room_data': room.to_dict()
-                        })
-                
-                elif action == 'list_rooms':
-                    # Return all rooms and their status
-                    room_list = []
-                    for code, room in rooms.items():
-                        room_list.append({
-                            'room_code': code,
-                            'status': room.auction_state['status'],
-                            'players': [p['name'] for p in room.players.values()],
-                            'auction_mode': room.auction_mode,
-                            'timer_duration': room.timer_duration,
-                            'host': room.players[room.host_id]['name'] if room.host_id in room.players else None
-                        })
-                    await ws.send_json({
-                        'type': 'room_list',
-                        'rooms': room_list
-                    })
-                
-                elif action == 'send_message':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        message = {
-                            'player_id': player_id,
-                            'player_name': room.players[player_id]['name'],
-                            'team': room.players[player_id]['team'],
-                            'message': data['message'],
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        room.chat_messages.append(message)
-                        
-                        await broadcast_to_room(room_code, {
-                            'type': 'new_message',
-                            'message': message
-                        })
-                
-                elif action == 'change_timer':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        if player_id == room.host_id:
-                            timer_duration = normalize_timer_duration(data.get('timer_duration', room.timer_duration))
-                            room.timer_duration = timer_duration
-                            room.auction_state['time_left'] = timer_duration
-                            
-                            await broadcast_to_room(room_code, {
-                                'type': 'timer_changed',
-                                'timer_duration': timer_duration,
-                                'room_data': room.to_dict()
-                            })
-                
-                elif action == 'end_auction':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        if player_id == room.host_id:
-                            room.auction_state['status'] = 'ended'
-                            
-                            await broadcast_to_room(room_code, {
-                                'type': 'auction_ended',
-                                'room_data': room.to_dict()
-                            })
-                
-                elif action == 'player_sold':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        if player_id == room.host_id or room.auction_state['status'] == 'active':
-                            player_data = data['player_data']
-                            winner_id = room.auction_state['current_bidder_id']
-                            final_price = data['final_price']
-                            winner_name = 'UNSOLD'
-                            
-                            if winner_id and winner_id in room.players:
-                                # Check foreign player limit in mega auction
-                                is_foreign = player_data.get('isForeign', False)
-                                if room.auction_mode == 'mega' and is_foreign:
-                                    if room.players[winner_id].get('foreign_count', 0) >= room.max_foreign_players:
-                                        await ws.send_json({
-                                            'type': 'error',
-                                            'message': 'Foreign player limit reached (8 max)'
-                                        })
-                                        continue
-                                
-                                # Check max players limit
-                                if len(room.players[winner_id]['players']) >= room.max_players_per_team:
-                                    await ws.send_json({
-                                        'type': 'error',
-                                        'message': f'Max {room.max_players_per_team} players limit reached'
-                                    })
-                                    continue
-                                
-                                room.players[winner_id]['purse'] -= final_price
-                                # Add final price to player data before storing
-                                player_data['soldPrice'] = final_price
-                                room.players[winner_id]['players'].append(player_data)
-                                winner_name = room.players[winner_id]['name']
-                                
-                                # Increment foreign count if foreign player
-                                if is_foreign:
-                                    room.players[winner_id]['foreign_count'] = room.players[winner_id].get('foreign_count', 0) + 1
-                                
-                                # Add to sold players list
-                                room.auction_state['sold_players'].append({
-                                    'name': player_data['name'],
-                                    'price': final_price,
-                                    'winner': winner_name,
-                                    'winner_team': room.players[winner_id]['team'],
-                                    'role': player_data['role']
-                                })
-                            else:
-                                # No bids - mark as UNSOLD
-                                room.auction_state['unsold_players'].append({
-                                    'name': player_data['name'],
-                                    'basePrice': player_data.get('basePrice', 0),
-                                    'role': player_data['role']
-                                })
-                                winner_name = 'UNSOLD'
-                                final_price = 0  # No price paid for unsold players
-                            
-                            # Move to next player
-                            room.auction_state['current_player_idx'] += 1
-                            room.auction_state['bid_history'] = []
-                            room.auction_state['current_bidder_id'] = None
-                            room.auction_state['time_left'] = room.timer_duration
-                            
-                            if room.auction_state['current_player_idx'] < len(room.auction_state['auction_queue']):
-                                next_player = room.auction_state['auction_queue'][room.auction_state['current_player_idx']]
-                                room.auction_state['current_bid'] = next_player['basePrice']
-                            else:
-                                room.auction_state['status'] = 'ended'
-                            
-                            await broadcast_to_room(room_code, {
-                                'type': 'player_sold',
-                                'winner_name': winner_name,
-                                'final_price': final_price,
-                                'player_name': player_data['name'],
-                                'room_data': room.to_dict()
-                            })
-                
-                elif action == 'timer_tick':
-                    if room_code and room_code in rooms:
-                        room = rooms[room_code]
-                        if room.auction_state['status'] == 'active':
-                            room.auction_state['time_left'] = data['time_left']
-                            
-                            await broadcast_to_room(room_code, {
-                                'type': 'timer_update',
-                                'time_left': data['time_left']
-                            }, exclude_id=player_id)
-                            
-            except Exception as e:
-                print(f"Error: {e}")
-                await ws.send_json({'type': 'error', 'message': str(e)})
+                if handler is not None:
+                    await handler(session, data)
+                elif session.room_code in rooms:
+                    rooms[session.room_code].submit(action, session.player_id, conn, data)
+            
+            except codec.ProtocolError as e:
+                errors.inc(action_label(action))
+                conn.send_json({'type': 'error', 'message': str(e), 'action': action})
+            except Exception:
+                log_error(action, session.room_code)
+                errors.inc(action_label(action))
+                conn.send_json({'type': 'error', 'message': INTERNAL_ERROR, 'action': action})
+            finally:
+                action_seconds.stop(started, action_label(action), room=session.room_code)
         
         elif msg.type == web.WSMsgType.ERROR:
             print(f'WebSocket error: {ws.exception()}')
+            errors.inc('websocket')
+    
+    lobby.unsubscribe(conn)
+    spectators.unwatch(conn)
     
     # Clean up on disconnect - just remove websocket, keep player data
     # This allows reconnection during page navigation
+    room_code, player_id = session.room_code, session.player_id
     if room_code and room_code in rooms and player_id:
         room = rooms[room_code]
-        if player_id in room.websockets:
+        if room.websockets.get(player_id) is conn:
             del room.websockets[player_id]
+            room.last_active = time.monotonic()
             print(f"Player {player_id} websocket disconnected from room {room_code}")
     
+    await conn.close()
     return ws
 
-async def broadcast_to_room(room_code, message, exclude_id=None):
+# Actions a connection handles itself, outside any room's queue
+
+async def conn_reconnect(session, data):
+    # Authenticated by the player's resume token. A client that says which
+    # version it last saw gets only the broadcasts since then, when the room
+    # still has them all; otherwise a full snapshot.
+    conn = session.conn
+    room_code = data['room_code']
+    player_id = data['player_id']
+    room = rooms.get(room_code)
+    
+    if not shard.owns(room_code):
+        conn.send_json({'type': 'error', 'message': wrong_shard_message(room_code)})
+    elif (room is None or player_id not in room.players
+            or not hmac.compare_digest(room.resume_token(player_id), data.get('resume_token') or '')):
+        reconnects.inc('rejected')
+        conn.send_json({'type': 'error', 'message': 'Room not found or player not in room'})
+    else:
+        session.room_code, session.player_id = room_code, player_id
+        last_seq = data.get('last_seq')
+        frames = room.replay_since(last_seq) if last_seq is not None else None
+        # No await from here on: the replay is queued ahead of any new broadcast
+        room.attach(player_id, conn)
+        
+        if frames is None:
+            reconnects.inc('snapshot')
+            conn.send_json({
+                'type': 'reconnected',
+                'room_code': room_code,
+                'player_id': player_id,
+                'room_data': room.to_dict()
+            })
+        else:
+            reconnects.inc('replayed')
+            conn.send_json({
+                'type': 'resumed',
+                'room_code': room_code,
+                'player_id': player_id,
+                'last_seq': last_seq,
+                'replayed': len(frames),
+                'server_time': now_ms()
+            })
+            replay(conn, frames)
+
+def replay(conn, frames):
+    for frame in frames:
+        if conn.codec is not codec.JSON:
+            frame = conn.codec.encode(codec.JSON.decode(frame))
+        conn.send_frame(frame, state=True)
+
+async def conn_create_room(session, data):
+    if draining:
+        session.conn.send_json({'type': 'error', 'message': 'Server is restarting, try again in a moment'})
+        return
+    if len(rooms) >= config.max_rooms:
+        session.conn.send_json({'type': 'error', 'message': 'Server is full, try again later'})
+        return
+    room_code = shard.new_room_code(rooms)
+    
+    timer_duration = normalize_timer_duration(data.get('timer_duration', 15))
+    room = AuctionRoom(
+        room_code,
+        data['player_name'],
+        data.get('auction_mode') or 'mega',
+        timer_duration
+    )
+    journal.record_state(room_code, room.version, room.state())
+    
+    player_id = secrets.token_hex(8)
+    room.add_player(player_id, data['player_name'], data['team'])
+    room.commit('room_created')
+    
+    room.attach(player_id, session.conn)
+    rooms[room_code] = room
+    room.start()
+    session.room_code, session.player_id = room_code, player_id
+    
+    session.conn.send_json({
+        'type': 'room_created',
+        'room_code': room_code,
+        'player_id': player_id,
+        'resume_token': room.resume_token(player_id),
+        'room_data': room.to_dict()
+    })
+
+async def conn_join_room(session, data):
+    room_code = data['room_code']
+    if not shard.owns(room_code):
+        session.conn.send_json({'type': 'error', 'message': wrong_shard_message(room_code)})
+        return
     if room_code not in rooms:
+        session.conn.send_json({'type': 'error', 'message': 'Room not found'})
         return
     
-    room = rooms[room_code]
-    for pid, ws in room.websockets.items():
-        if exclude_id and pid == exclude_id:
-            continue
+    # Joining mutates the room, so it goes through the room's queue
+    future = asyncio.get_running_loop().create_future()
+    rooms[room_code].submit('join_room', None, session.conn, data, future)
+    joined_id = await future
+    if joined_id:
+        session.room_code, session.player_id = room_code, joined_id
+
+async def conn_leave_room(session, data):
+    # Like joining, leaving goes through the room's queue; once it has, this
+    # socket no longer speaks for the player
+    room = rooms.get(session.room_code)
+    if room is None:
+        return
+    future = asyncio.get_running_loop().create_future()
+    room.submit('leave_room', session.player_id, session.conn, data, future)
+    if await future:
+        session.room_code, session.player_id = None, None
+
+async def conn_list_rooms(session, data):
+    # One page of rooms (all shards), newest first
+    offset, limit = page_bounds(data)
+    page, total = lobby.query(parse_filters(data), offset, limit)
+    session.conn.send_json({
+        'type': 'room_list',
+        'rooms': page,
+        'total': total,
+        'offset': offset
+    })
+
+async def conn_subscribe_lobby(session, data):
+    # First page now, then batched lobby_events for rooms matching the filters
+    filters = parse_filters(data)
+    offset, limit = page_bounds(data)
+    page, total = lobby.query(filters, offset, limit)
+    lobby.subscribe(session.conn, filters)
+    session.conn.send_json({
+        'type': 'lobby_snapshot',
+        'rooms': page,
+        'total': total,
+        'offset': offset
+    })
+
+async def conn_unsubscribe_lobby(session, data):
+    lobby.unsubscribe(session.conn)
+
+async def conn_watch_room(session, data):
+    # Read-only: a snapshot at the next spectator flush, then room_update
+    # frames at most every FRAME_INTERVAL
+    room_code = data['room_code']
+    if session.room_code is not None:
+        session.conn.send_json({'type': 'error', 'message': 'Players cannot also spectate'})
+    elif not shard.owns(room_code):
+        session.conn.send_json({'type': 'error', 'message': wrong_shard_message(room_code)})
+    elif room_code not in rooms:
+        session.conn.send_json({'type': 'error', 'message': 'Room not found'})
+    elif not spectators.watch(rooms[room_code], session.conn):
+        session.conn.send_json({'type': 'error', 'message': 'Too many spectators in this room'})
+
+async def conn_stop_watching(session, data):
+    spectators.unwatch(session.conn)
+
+CONNECTION_COMMANDS = {
+    'reconnect': conn_reconnect,
+    'create_room': conn_create_room,
+    'join_room': conn_join_room,
+    'leave_room': conn_leave_room,
+    'list_rooms': conn_list_rooms,
+    'subscribe_lobby': conn_subscribe_lobby,
+    'unsubscribe_lobby': conn_unsubscribe_lobby,
+    'watch_room': conn_watch_room,
+    'stop_watching': conn_stop_watching
+}
+
+def wrong_shard_message(room_code):
+    return f'Room {room_code} is hosted by another worker; connect to /ws?room={room_code}'
+
+def room_summary(room):
+    return {
+        'room_code': room.room_code,
+        'status': room.auction_state['status'],
+        'players': [team.name for team in room.players.values()],
+        'auction_mode': room.auction_mode,
+        'timer_duration': room.timer_duration,
+        'host': room.players[room.host_id].name if room.host_id in room.players else None
+    }
+
+def lobby_relevant(ops):
+    # Whether a change set alters what the lobby shows for the room
+    for op in ops:
+        path = op[1]
+        if path[0] in ('host_id', 'timer_duration'):
+            return True
+        if path[0] == 'players' and len(path) == 2:
+            return True
+        if path[:2] == ['auction_state', 'status']:
+            return True
+    return False
+
+def process_commands(room, batch):
+    # Runs on the room's actor task. Consecutive bids are applied one by one
+    # but committed and broadcast as a single state change.
+    batch_started = batch_seconds.start()
+    pending_bids = 0
+    for action, player_id, conn, data, future in batch:
+        if conn is not None:
+            room.last_active = time.monotonic()
+        if pending_bids and action != 'place_bid':
+            broadcast_changes(room, 'bid_placed')
+            pending_bids = 0
+        started = action_seconds.start()
         try:
-            await ws.send_json(message)
-        except:
-            pass
+            handler = ROOM_COMMANDS.get(action) or INTERNAL_COMMANDS[action]
+            result = handler(room, player_id, conn, data)
+            if action == 'place_bid' and result:
+                pending_bids += 1
+            if future:
+                future.set_result(result)
+        except Exception as e:
+            log_error(action, room.room_code)
+            errors.inc(action_label(action))
+            if room._ops:
+                # Covers any bids still pending in this batch too
+                resync_room(room)
+                pending_bids = 0
+            if future:
+                future.set_exception(e)
+            elif conn:
+                conn.send_json({'type': 'error', 'message': INTERNAL_ERROR, 'action': action})
+        action_seconds.stop(started, action_label(action), room=room.room_code)
+    
+    if pending_bids:
+        broadcast_changes(room, 'bid_placed')
+    bots.react(room)
+    if batch_seconds.stop(batch_started, room=room.room_code, commands=len(batch)) is not None:
+        batch_commands.observe(len(batch), weight=metrics.SAMPLE_EVERY)
+
+def resync_room(room):
+    # A handler failed part way through. What it already applied is
+    # committed as its own version, so the journal keeps matching memory,
+    # and everyone in the room gets a full snapshot rather than a delta of
+    # a half-finished change. Spectators see the version gap and resync.
+    room.commit('resync')
+    snapshot = {'type': 'room_snapshot', 'room_data': room.to_dict()}
+    fanout.broadcast(list(room.websockets.values()), snapshot)
+
+def cmd_join_room(room, player_id, conn, data):
+    # Check if player name already exists
+    existing_names = [team.name for team in room.players.values()]
+    if data['player_name'] in existing_names:
+        conn.send_json({'type': 'error', 'message': 'Player name already exists in this room'})
+        return None
+    
+    # Check if team is already taken
+    taken_teams = [team.team for team in room.players.values()]
+    if data['team'] in taken_teams:
+        conn.send_json({'type': 'error', 'message': 'Team already taken'})
+        return None
+    
+    player_id = secrets.token_hex(8)
+    if not room.add_player(player_id, data['player_name'], data['team']):
+        conn.send_json({'type': 'error', 'message': 'Room is full'})
+        return None
+    
+    version, ops = room.commit('player_joined')
+    room.attach(player_id, conn)
+    
+    # Notify player
+    conn.send_json({
+        'type': 'joined_room',
+        'room_code': room.room_code,
+        'player_id': player_id,
+        'resume_token': room.resume_token(player_id),
+        'room_data': room.to_dict()
+    })
+    
+    # Broadcast to all players
+    broadcast_to_room(room.room_code, {
+        'type': 'player_joined',
+        'version': version,
+        'delta': ops
+    }, exclude_id=player_id)
+    return player_id
+
+def cmd_sync(room, player_id, conn, data):
+    # Client detected a gap in the delta stream - replay what it missed, or
+    # resend a full snapshot
+    if player_id not in room.players:
+        return
+    version = data.get('version')
+    frames = room.replay_since(version) if version is not None else None
+    if frames:
+        replay(conn, frames)
+        return
+    conn.send_json({
+        'type': 'room_snapshot',
+        'room_data': room.to_dict()
+    })
+
+def cmd_history(room, player_id, conn, data):
+    # Page backwards through a history ring: entries with id < 'before'
+    if player_id not in room.players:
+        return
+    kind = data.get('kind', 'chat')
+    ring = room.chat_messages if kind == 'chat' else room.auction_state['bid_history']
+    before = data.get('before')
+    limit = max(1, min(HISTORY_PAGE_MAX, int(data.get('limit', CHAT_WINDOW))))
+    older = [entry for entry in ring if before is None or entry['id'] < before]
+    conn.send_json({
+        'type': 'history',
+        'kind': kind,
+        'items': older[-limit:],
+        'has_more': len(older) > limit
+    })
+
+def cmd_leave_room(room, player_id, conn, data):
+    if player_id not in room.players:
+        return False
+    room.remove_player(player_id)
+    
+    if len(room.players) == 0:
+        if close_room(room):
+            journal.drop(room.room_code)
+    else:
+        broadcast_changes(room, 'player_left')
+    
+    conn.send_json({'type': 'left_room'})
+    return True
+
+def cmd_add_bot(room, player_id, conn, data):
+    # Host fills an empty team slot with a computer-controlled team
+    if player_id != room.host_id:
+        return
+    taken = {team.team for team in room.players.values()}
+    team = data.get('team') or next((t for t in TEAM_ABBREVIATIONS.values() if t not in taken), None)
+    if team is None or team in taken:
+        conn.send_json({'type': 'error', 'message': 'Team already taken'})
+        return
+    if not room.add_player('bot-' + secrets.token_hex(6), f'{team} Bot', team, bot=data.get('risk') or 'balanced'):
+        conn.send_json({'type': 'error', 'message': 'Room is full'})
+        return
+    broadcast_changes(room, 'player_joined')
+
+def cmd_remove_bot(room, player_id, conn, data):
+    team = room.players.get(data['player_id'])
+    if player_id != room.host_id or team is None or not team.bot:
+        return
+    room.remove_player(data['player_id'])
+    broadcast_changes(room, 'player_left')
+
+def cmd_start_auction(room, player_id, conn, data):
+    if player_id != room.host_id:
+        return
+    # Without an explicit selection the whole pool for the room's mode goes
+    # up, or with a size its best-rated players (the whole pool if no player
+    # is rated)
+    player_ids = data.get('player_ids')
+    if not player_ids and data.get('size'):
+        player_ids = valuations.auction_queue(room.auction_mode, data['size'])
+    if not player_ids:
+        player_ids = catalog.default_queue(room.auction_mode)
+    start_queue(room, player_ids)
+    broadcast_changes(room, 'auction_started')
+
+def cmd_start_reauction(room, player_id, conn, data):
+    # Any player can start re-auction, not just host
+    # Mark as re-auction to prevent showing unsold selection again
+    if player_id not in room.players:
+        return
+    room.set_state('is_reauction', True)
+    start_queue(room, data['player_ids'])
+    broadcast_changes(room, 'auction_started')
+
+def start_queue(room, player_ids):
+    auction_queue = catalog.validate_queue(player_ids, room.auction_mode)
+    room.set_state('status', 'active')
+    room.set_state('auction_queue', auction_queue)
+    room.set_state('current_player_idx', 0)
+    room.set_state('current_bidder_id', None)
+    room.clear_bids()
+    
+    if len(auction_queue) > 0:
+        room.set_state('current_bid', catalog.get(auction_queue[0])['basePrice'])
+        room.start_clock(room.timer_duration)
+
+def validate_bid(room, player_id, amount):
+    state = room.auction_state
+    team = room.players.get(player_id)
+    if state['status'] != 'active':
+        return 'Auction is not active'
+    if team is None:
+        return 'You are not bidding in this room'
+    if state['current_player_idx'] >= len(state['auction_queue']):
+        return 'No player is up for auction'
+    if room.intermission_left() > 0:
+        return 'Bidding on this player has not opened yet'
+    if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not math.isfinite(amount):
+        return 'Invalid bid amount'
+    if player_id == state['current_bidder_id']:
+        return 'You already hold the highest bid'
+    if amount < next_bid_amount(state['current_bid']) - 1e-9:
+        return 'Bid is below the next increment'
+    if len(team.players) >= room.max_players_per_team:
+        return f'Max {room.max_players_per_team} players limit reached'
+    if amount > team.purse + 1e-9:
+        return 'Not enough purse remaining'
+    
+    lot = catalog.get(state['auction_queue'][state['current_player_idx']])
+    if room.auction_mode == 'mega' and lot['isForeign']:
+        if team.foreign_count >= room.max_foreign_players:
+            return 'Foreign player limit reached (8 max)'
+    return None
+
+def cmd_place_bid(room, player_id, conn, data):
+    amount = data.get('bid_amount')
+    error = validate_bid(room, player_id, amount)
+    if error:
+        # Bots (no conn) just lose the race
+        if conn:
+            conn.send_json({'type': 'bid_rejected', 'message': error})
+        return False
+    
+    amount = round(amount, 2)
+    room.set_state('current_bid', amount)
+    room.set_state('current_bidder_id', player_id)
+    room.start_clock(room.timer_duration)
+    room.append_field(['auction_state', 'bid_history'], {
+        'id': room.next_history_id(),
+        'player_id': player_id,
+        'player_name': room.players[player_id].name,
+        'amount': amount,
+        'timestamp': datetime.now().isoformat()
+    })
+    return True
+
+def cmd_pause_auction(room, player_id, conn, data):
+    if player_id not in room.players or room.auction_state['status'] != 'active':
+        return
+    room.set_state('status', 'paused')
+    room.set_state('paused_by', player_id)
+    room.pause_clock()
+    
+    broadcast_changes(room, 'auction_paused', paused_by=room.players[player_id].name)
+
+def cmd_resume_auction(room, player_id, conn, data):
+    if player_id not in room.players or room.auction_state['status'] != 'paused':
+        return
+    room.set_state('status', 'active')
+    room.set_state('paused_by', None)
+    room.start_clock(room.auction_state['time_left'])
+    
+    broadcast_changes(room, 'auction_resumed')
+
+def cmd_send_message(room, player_id, conn, data):
+    if player_id not in room.players:
+        return
+    message = {
+        'id': room.next_history_id(),
+        'player_id': player_id,
+        'player_name': room.players[player_id].name,
+        'team': room.players[player_id].team,
+        'message': str(data['message'])[:MAX_CHAT_LENGTH],
+        'timestamp': datetime.now().isoformat()
+    }
+    room.append_field(['chat_messages'], message)
+    
+    broadcast_changes(room, 'new_message')
+
+def cmd_change_timer(room, player_id, conn, data):
+    if player_id != room.host_id:
+        return
+    timer_duration = normalize_timer_duration(data.get('timer_duration', room.timer_duration))
+    room.set_field(['timer_duration'], timer_duration)
+    if room.auction_state['status'] == 'active':
+        room.start_clock(timer_duration)
+    else:
+        room.set_state('time_left', timer_duration)
+    
+    broadcast_changes(room, 'timer_changed', timer_duration=timer_duration)
+
+def cmd_end_auction(room, player_id, conn, data):
+    if player_id != room.host_id:
+        return
+    room.set_state('status', 'ended')
+    room.stop_clock()
+    
+    broadcast_changes(room, 'auction_ended')
+
+def cmd_player_sold(room, player_id, conn, data):
+    # Host hammer: settle the current lot immediately. Normal sales happen
+    # server-side when the lot clock expires.
+    lot = data.get('lot', room.auction_state['current_player_idx'])
+    if (player_id == room.host_id
+            and room.auction_state['status'] == 'active'
+            and lot == room.auction_state['current_player_idx']):
+        settle_lot(room)
+
+def cmd_lot_expired(room, player_id, conn, data):
+    # A bid queued ahead of this command may have pushed the deadline back
+    if room.auction_state['status'] == 'active' and room.clock_expired():
+        settle_lot(room)
+
+ROOM_COMMANDS = {
+    'join_room': cmd_join_room,
+    'add_bot': cmd_add_bot,
+    'remove_bot': cmd_remove_bot,
+    'sync': cmd_sync,
+    'leave_room': cmd_leave_room,
+    'start_auction': cmd_start_auction,
+    'start_reauction': cmd_start_reauction,
+    'place_bid': cmd_place_bid,
+    'pause_auction': cmd_pause_auction,
+    'resume_auction': cmd_resume_auction,
+    'send_message': cmd_send_message,
+    'history': cmd_history,
+    'change_timer': cmd_change_timer,
+    'end_auction': cmd_end_auction,
+    'player_sold': cmd_player_sold
+}
+
+# Internal commands that clients may not submit directly
+INTERNAL_COMMANDS = {
+    'lot_expired': cmd_lot_expired
+}
+
+# What each client action may carry; checked before the action is dispatched.
+# Keys not listed are ignored.
+NAME = Field(str, required=True, max_length=40)
+ROOM_CODE = Field(str, required=True, max_length=16)
+TEAM = Field(str, required=True, max_length=8)
+AUCTION_MODE = Field(str, choices=('mega', 'legend'))
+LOBBY_PAGE = {
+    'auction_mode': AUCTION_MODE,
+    'status': Field(str, max_length=16),
+    'offset': Field(int),
+    'limit': Field(int)
+}
+SCHEMAS = {
+    'reconnect': {
+        'room_code': ROOM_CODE,
+        'player_id': Field(str, required=True, max_length=32),
+        'resume_token': Field(str, max_length=64),
+        'last_seq': Field(int)
+    },
+    'create_room': {'player_name': NAME, 'team': TEAM, 'auction_mode': AUCTION_MODE, 'timer_duration': Field(NUMBER)},
+    'join_room': {'room_code': ROOM_CODE, 'player_name': NAME, 'team': TEAM},
+    'list_rooms': LOBBY_PAGE,
+    'subscribe_lobby': LOBBY_PAGE,
+    'watch_room': {'room_code': ROOM_CODE},
+    'add_bot': {'team': Field(str, max_length=8), 'risk': Field(str, choices=tuple(RISK_PROFILES))},
+    'remove_bot': {'player_id': Field(str, required=True, max_length=32)},
+    'sync': {'version': Field(int)},
+    'history': {'kind': Field(str, choices=('chat', 'bids')), 'before': Field(int), 'limit': Field(int)},
+    'start_auction': {'player_ids': Field(list, items=int), 'size': Field(int, minimum=1)},
+    'start_reauction': {'player_ids': Field(list, required=True, items=int)},
+    'place_bid': {'bid_amount': Field(NUMBER, required=True)},
+    'send_message': {'message': Field(str, required=True)},
+    'change_timer': {'timer_duration': Field(NUMBER)},
+    'player_sold': {'lot': Field(int)}
+}
+
+ACTION_LABELS = frozenset(CONNECTION_COMMANDS) | frozenset(ROOM_COMMANDS) | frozenset(INTERNAL_COMMANDS)
+
+def action_label(action):
+    # Metric label for an action; client-chosen strings must not add series
+    return action if action in ACTION_LABELS else 'invalid'
+
+async def on_lot_expired(room):
+    # Scheduler callback: hand the expiry to the room's command queue so it is
+    # ordered against bids that are already waiting
+    if rooms.get(room.room_code) is room:
+        room.submit('lot_expired', None, None, {})
+
+def settle_lot(room):
+    state = room.auction_state
+    idx = state['current_player_idx']
+    if idx >= len(state['auction_queue']):
+        return
+    
+    lot_id = state['auction_queue'][idx]
+    player_data = catalog.get(lot_id)
+    winner_id = state['current_bidder_id']
+    final_price = state['current_bid']
+    winner = room.players.get(winner_id) if winner_id else None
+    is_foreign = player_data['isForeign']
+    
+    # A team that can no longer take the player forfeits the lot
+    if winner and room.auction_mode == 'mega' and is_foreign:
+        if winner.foreign_count >= room.max_foreign_players:
+            winner = None
+    if winner and len(winner.players) >= room.max_players_per_team:
+        winner = None
+    
+    if winner:
+        room.set_field(['players', winner_id, 'purse'], round(winner.purse - final_price, 2))
+        room.append_field(['players', winner_id, 'players'], {'id': lot_id, 'soldPrice': final_price})
+        winner_name = winner.name
+        
+        # Increment foreign count if foreign player
+        if is_foreign:
+            room.set_field(['players', winner_id, 'foreign_count'], winner.foreign_count + 1)
+        
+        # Add to sold players list
+        room.append_field(['auction_state', 'sold_players'], {
+            'id': lot_id,
+            'price': final_price,
+            'winner': winner_name,
+            'winner_team': winner.team
+        })
+        room.summary.record_sale(player_data, final_price, winner_name, winner.team)
+    else:
+        # No bids - mark as UNSOLD
+        room.append_field(['auction_state', 'unsold_players'], {'id': lot_id})
+        room.summary.record_unsold()
+        winner_name = 'UNSOLD'
+        final_price = 0  # No price paid for unsold players
+    
+    # Move to next player
+    room.set_state('current_player_idx', idx + 1)
+    room.clear_bids()
+    room.set_state('current_bidder_id', None)
+    
+    if idx + 1 < len(state['auction_queue']):
+        next_player = catalog.get(state['auction_queue'][idx + 1])
+        room.set_state('current_bid', next_player['basePrice'])
+        room.start_clock(room.timer_duration + LOT_INTERMISSION)
+    else:
+        room.set_state('status', 'ended')
+        room.stop_clock()
+    
+    broadcast_changes(
+        room,
+        'player_sold',
+        winner_name=winner_name,
+        final_price=final_price,
+        player_name=player_data['name']
+    )
+
+def close_room(room):
+    # Returns True if the room was still registered
+    room.stop_clock()
+    room.stop()
+    if rooms.get(room.room_code) is room:
+        del rooms[room.room_code]
+        lobby.remove(room.room_code)
+        spectators.close(room.room_code, {'type': 'room_closed', 'room_code': room.room_code})
+        bots.forget(room.room_code)
+        return True
+    return False
+
+async def sweep_idle_rooms():
+    # Room lifecycle: a room nobody is connected to and that has seen no
+    # player command for ROOM_TTL is closed; with the journal running its
+    # final state is archived instead of just dropped
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        cutoff = time.monotonic() - ROOM_TTL
+        idle = [room for room in rooms.values() if not room.websockets and room.last_active < cutoff]
+        for room in idle:
+            state = room.state()
+            if close_room(room) and journal.running:
+                await journal.archive(room.room_code, state)
+        if idle:
+            print(f"Evicted {len(idle)} idle room(s)")
+
+def broadcast_changes(room, message_type, **extra):
+    # Commit pending ops and broadcast them as a single versioned delta
+    version, ops = room.commit(message_type)
+    message = {'type': message_type, 'version': version, 'delta': ops, 'server_time': now_ms()}
+    message.update(extra)
+    broadcast_to_room(room.room_code, message)
+
+def broadcast_to_room(room_code, message, exclude_id=None):
+    if room_code not in rooms:
+        return
+    
+    room = rooms[room_code]
+    recipients = [conn for pid, conn in room.websockets.items() if pid != exclude_id]
+    # Versioned deltas can be coalesced into a snapshot for slow consumers,
+    # and are kept for replay to reconnecting clients
+    versioned = 'version' in message
+    frames = fanout.broadcast(recipients, message, state=versioned)
+    if versioned:
+        frame = frames.get(codec.JSON) or codec.JSON.encode(message)
+        room.remember(message['version'], frame)
+        spectators.publish(room_code, message['version'], frame)
+
+async def handle_stats(request):
+    return web.json_response({
+        'rooms': len(rooms),
+        'fanout': fanout.report(),
+        'journal': journal.stats,
+        'shard': {'index': shard.index, 'count': shard.count}
+    })
+
+async def handle_metrics(request):
+    # Prometheus text format. With --workers, each scrape reaches one worker;
+    # scrape /metrics?shard=N for every N.
+    return web.Response(body=metrics.render().encode('utf-8'),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+metrics.gauge_func('auction_rooms', 'Rooms hosted by this process', lambda: len(rooms))
+metrics.gauge_func('auction_connections', 'Open websocket connections', lambda: len(fanout.connections))
+metrics.gauge_func('auction_spectators', 'Connections spectating a room', lambda: len(spectators))
+metrics.gauge_func('auction_lobby_subscribers', 'Connections subscribed to lobby events', lambda: len(lobby.subscribers))
+metrics.gauge_func('auction_outbound_backlog_frames', 'Frames queued across all connections',
+                   lambda: fanout.report()['backlog_total'])
+metrics.gauge_func('auction_outbound_backlog_max_frames', 'Deepest single connection queue',
+                   lambda: fanout.report()['backlog_max'])
+metrics.gauge_func('auction_room_queue_commands', 'Room commands waiting on room actors',
+                   lambda: sum(room.commands.qsize() for room in rooms.values() if room.commands is not None))
+metrics.gauge_func('auction_draining', '1 while the server is draining for a restart', lambda: int(draining))
+metrics.gauge_func('auction_journal_pending_records', 'Journal records not yet written', lambda: journal.pending)
+for key in fanout.stats:
+    metrics.counter_func(f'auction_fanout_{key}_total', f'Fan-out {key.replace("_", " ")}',
+                         lambda key=key: fanout.stats[key])
+for key in ('records', 'flushes', 'snapshots', 'bytes'):
+    metrics.counter_func(f'auction_journal_{key}_total', f'Journal {key} written',
+                         lambda key=key: journal.stats[key])
+
+def restore_rooms():
+    # Rebuild every room from the journal and put live ones back on the clock
+    for room_code, state in journal.restore().items():
+        if not shard.owns(room_code):
+            # check_data_layout keeps this from happening
+            raise RuntimeError(f'{journal.directory} holds room {room_code} of another worker')
+        room = AuctionRoom.from_dict(state)
+        rooms[room_code] = room
+        lobby.update(room_summary(room))
+        room.start()
+        deadline = room.auction_state['deadline']
+        if room.auction_state['status'] == 'active' and deadline is not None:
+            # Everyone was disconnected by the restart, so the lot gets at
+            # least a full clock for bidders to reconnect
+            remaining = (deadline - now_ms()) / 1000
+            room.start_clock(max(remaining, room.timer_duration))
+            room.commit('clock_restored')
+    journal.start(rooms)
+    print(f"Restored {len(rooms)} room(s) from {journal.directory}")
+
+async def on_startup(app):
+    global room_sweeper, metrics_monitor
+    metrics_monitor = asyncio.get_running_loop().create_task(metrics.monitor())
+    restore_rooms()
+    lobby.start()
+    spectators.start()
+    shard.start(lobby.local_summaries, lambda index, summaries: lobby.replace_shard(index, summaries))
+    room_sweeper = asyncio.get_running_loop().create_task(sweep_idle_rooms())
+
+async def on_cleanup(app):
+    room_sweeper.cancel()
+    metrics_monitor.cancel()
+    lobby.stop()
+    spectators.stop()
+    await shard.stop()
+    await journal.close()
+
+async def handle_catalog(request):
+    # Immutable for the life of the process, so clients can cache it
+    return asset_response(request, catalog_asset, 'public, max-age=3600')
+
+async def handle_rankings(request):
+    # Top players by valuation score: ?mode=&role=&band=&k=
+    query = request.query
+    try:
+        k = int(query.get('k', 20))
+        band = float(query['band']) if 'band' in query else None
+    except ValueError:
+        raise web.HTTPBadRequest(text='k and band must be numbers')
+    try:
+        ids = valuations.top(k, query.get('mode'), query.get('role'), band)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    return web.json_response({'players': [valuations.describe(pid) for pid in ids]})
+
+def export_format(request):
+    fmt = request.query.get('format', 'csv')
+    if fmt not in FORMATS:
+        raise web.HTTPBadRequest(text='format must be csv or ndjson')
+    return fmt
+
+def hosted_room(request):
+    room = rooms.get(request.match_info['room_code'])
+    if room is None:
+        raise web.HTTPNotFound(text='Room not found')
+    return room
+
+async def handle_room_summary(request):
+    room = hosted_room(request)
+    return web.json_response(dict(room.summary.as_dict(room.players), room_code=room.room_code,
+                                  status=room.auction_state['status']))
+
+async def handle_room_results(request):
+    room = hosted_room(request)
+    fmt = export_format(request)
+
+    async def results():
+        yield room.room_code, room.auction_state
+    return await stream_results(request, results(), catalog, fmt)
+
+async def handle_results(request):
+    # Every ended room on this worker, live ones first, then the archive.
+    # With several workers ?shard=N is required: without it the front would
+    # route to any worker, and a partial export would look complete
+    fmt = export_format(request)
+    if shard.count > 1 and request.query.get('shard') != str(shard.index):
+        raise web.HTTPBadRequest(text=f'{shard.count} workers: request /api/results?shard=N for N in 0-{shard.count - 1}')
+
+    async def results():
+        for room in [room for room in rooms.values() if room.auction_state['status'] == 'ended']:
+            yield room.room_code, room.auction_state
+        for path in journal.archived():
+            state = await journal.read_archived(path)
+            if state['auction_state']['status'] == 'ended':
+                yield state['room_code'], state['auction_state']
+    return await stream_results(request, results(), catalog, fmt)
 
 async def serve_static(request):
     path = request.match_info.get('path', 'index.html')
     if path == '':
         path = 'index.html'
     
-    try:
-        return web.FileResponse(f'./{path}')
-    except:
-        return web.Response(status=404, text='Not found')
-
-app = web.Application()
-
-# Configure CORS
-cors = aiohttp_cors.setup(app, defaults={
-    "*": aiohttp_cors.ResourceOptions(
-        allow_credentials=True,
-        expose_headers="*",
-        allow_headers="*",
-        allow_methods="*"
+    return static_assets.response(request, path)
+
+async def drain(timeout, abort=None):
+    # Graceful shutdown: refuse new rooms, tell every client, and give live
+    # auctions (someone connected, lot on the clock or paused) until they end
+    # or `timeout` runs out. abort (an asyncio.Event) cuts the wait short.
+    # Then every websocket is closed as a restart; on_cleanup writes the
+    # journal snapshot the next process restores, and clients resume there.
+    global draining
+    draining = True
+    deadline = time.monotonic() + timeout
+    notice = {'type': 'server_draining', 'deadline': now_ms() + int(timeout * 1000)}
+    for conn in list(fanout.connections):
+        conn.send_json(notice)
+    live = [room for room in rooms.values() if room.websockets and room.auction_state['status'] in LIVE_STATUSES]
+    print(f"Draining: {len(live)} live auction(s), {len(fanout.connections)} connection(s)")
+    
+    while time.monotonic() < deadline and not (abort is not None and abort.is_set()):
+        if not any(room.websockets and room.auction_state['status'] in LIVE_STATUSES for room in rooms.values()):
+            break
+        await asyncio.sleep(DRAIN_POLL_INTERVAL)
+    
+    await asyncio.gather(*(conn.ws.close(code=WSCloseCode.SERVICE_RESTART, message=b'Server restarting')
+                           for conn in list(fanout.connections)), return_exceptions=True)
+
+def preload():
+    # Runs in an executor right after startup, so the first requests find
+    # everything built
+    catalog_asset.load()
+    valuations.load()
+    static_assets.load()
+
+def preload_done(future):
+    # Whatever failed is built again, and fails loudly, on first use
+    if not future.cancelled() and future.exception() is not None:
+        print("Preload failed:")
+        traceback.print_exception(future.exception())
+
+async def warm_up(app):
+    if config.preload:
+        asyncio.get_running_loop().run_in_executor(None, preload).add_done_callback(preload_done)
+
+async def close_after_response(request, response):
+    # Behind the front, a socket reaches a worker chosen from its first request
+    # line only; kept alive, later requests on it (another room, ?shard=N)
+    # would land on the same worker
+    if not isinstance(response, web.WebSocketResponse):
+        response.force_close()
+
+def create_app(server_config=None):
+    global config, journal
+    if server_config is not None:
+        config = server_config
+    if journal.directory != config.data_dir and not journal.running:
+        journal = Journal(config.data_dir)
+    
+    app = web.Application()
+    app.on_startup.append(on_startup)
+    app.on_startup.append(warm_up)
+    app.on_cleanup.append(on_cleanup)
+    if config.workers > 1:
+        app.on_response_prepare.append(close_after_response)
+    
+    app.router.add_get('/ws', handle_websocket)
+    app.router.add_get('/stats', handle_stats)
+    app.router.add_get('/metrics', handle_metrics)
+    api = [
+        app.router.add_get('/api/catalog', handle_catalog),
+        app.router.add_get('/api/rankings', handle_rankings),
+        app.router.add_get('/api/rooms/{room_code}/summary', handle_room_summary),
+        app.router.add_get('/api/rooms/{room_code}/results', handle_room_results),
+        app.router.add_get('/api/results', handle_results)
+    ]
+    app.router.add_get('/{path:.*}', serve_static)
+    
+    # CORS only for the read-only JSON API; pages, /ws and the metrics
+    # endpoints are same-origin
+    options = aiohttp_cors.ResourceOptions(
+        allow_credentials=False,
+        expose_headers=('ETag', 'Content-Disposition'),
+        allow_headers=('Accept', 'If-None-Match'),
+        allow_methods=('GET',),
+        max_age=3600
     )
-})
+    cors = aiohttp_cors.setup(app, defaults={origin: options for origin in config.cors_origins})
+    for route in api:
+        cors.add(route)
+    return app
+
+def shard_dirs(data_dir, workers):
+    # Where each worker journals: the data directory itself for one worker,
+    # data/shard-N otherwise
+    if workers == 1:
+        return [data_dir]
+    return [os.path.join(data_dir, f'shard-{index}') for index in range(workers)]
+
+def check_data_layout(data_dir, workers):
+    # A room is journaled by the worker its code hashes to, so changing the
+    # worker count would restore rooms on workers that don't own them (or
+    # not at all). Refuse to start while another layout still holds rooms;
+    # the count used last is kept in data/workers.
+    path = os.path.join(data_dir, 'workers')
+    try:
+        with open(path) as f:
+            previous = int(f.read())
+    except (OSError, ValueError):
+        # Written before the marker existed: infer from the files
+        shards = [name for name in os.listdir(data_dir) if name.startswith('shard-')] if os.path.isdir(data_dir) else []
+        previous = len(shards) or 1
+    if previous != workers:
+        stranded = sum(len(Journal(directory).restore())
+                       for directory in shard_dirs(data_dir, previous) if os.path.isdir(directory))
+        if stranded:
+            raise SystemExit(f"{data_dir} holds {stranded} room(s) journaled by {previous} worker(s); "
+                             f"restart with --workers {previous}, or move the directory aside")
+    os.makedirs(data_dir, exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(str(workers))
+
+async def serve(server_config):
+    # Single process. The first SIGTERM or SIGINT drains, with the listener
+    # still open so players of live rooms can reconnect; a second one cuts
+    # the drain short.
+    runner = web.AppRunner(create_app(server_config), handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, server_config.host, server_config.port, backlog=1024).start()
+    
+    loop = asyncio.get_running_loop()
+    stop, abort = asyncio.Event(), asyncio.Event()
+    
+    def on_signal():
+        (abort if stop.is_set() else stop).set()
+    
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, on_signal)
+    try:
+        await stop.wait()
+        await drain(server_config.drain_timeout, abort)
+    finally:
+        await runner.cleanup()
 
-app.router.add_get('/ws', handle_websocket)
-app.router.add_get('/{path:.*}', serve_static)
+def run_shard(server_config, index, count, run_dir):
+    # Entry point of one worker process in sharded mode; Ctrl-C is handled
+    # by the front process, which passes SIGTERM on to the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(serve_shard(server_config, index, count, run_dir))
+
+async def serve_shard(server_config, index, count, run_dir):
+    global shard
+    app = create_app(replace(server_config, data_dir=shard_dirs(server_config.data_dir, count)[index]))
+    bus = SocketBus(sharding.bus_path(run_dir))
+    await bus.connect()
+    shard = Shard(index, count, bus)
+    
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    loop = asyncio.get_running_loop()
+    stop, abort = asyncio.Event(), asyncio.Event()
+    
+    def on_signal():
+        (abort if stop.is_set() else stop).set()
+    
+    loop.add_signal_handler(signal.SIGTERM, on_signal)
+    # Handed-off connections keep arriving while draining, so players of
+    # live rooms on this worker can reconnect
+    handoffs = loop.create_task(sharding.accept_handoffs(runner.server, sharding.handoff_path(run_dir, index)))
+    stopping = loop.create_task(stop.wait())
+    try:
+        await asyncio.wait((handoffs, stopping), return_when=asyncio.FIRST_COMPLETED)
+        await drain(server_config.drain_timeout, abort)
+    finally:
+        handoffs.cancel()
+        stopping.cancel()
+        await runner.cleanup()
 
-# Add CORS to all routes
-for route in list(app.router.routes()):
-    cors.add(route)
+def main(argv=None):
+    server_config = ServerConfig.from_args(argv)
+    print(f"IPL Auction Server starting on http://{server_config.host}:{server_config.port} "
+          f"({server_config.workers} worker(s))")
+    check_data_layout(server_config.data_dir, server_config.workers)
+    if server_config.workers > 1:
+        # Workers get a little longer than the drain before the front gives up on them
+        sharding.run_front(server_config.host, server_config.port, server_config.workers,
+                           functools.partial(run_shard, server_config), server_config.drain_timeout + 15)
+    else:
+        asyncio.run(serve(server_config))
 
 if __name__ == '__main__':
-    print("IPL Auction Server starting on http://localhost:8080")
-    web.run_app(app, host='0.0.0.0', port=8080)
+    main()
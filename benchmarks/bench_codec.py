@@ -0,0 +1,129 @@
+"""Per-message cost of decoding, dispatching and encoding.
+
+Compares the path this server used to take (stdlib json.loads, an if/elif
+chain over the action name, json.dumps) with the codec layer: decode,
+schema check, dict dispatch and encode, for each available codec (stdlib
+json, orjson, msgpack). Inbound frames are typical client commands;
+outbound messages are a bid delta, a chat delta and a full room snapshot
+built through the real handlers.
+
+Usage: python benchmarks/bench_codec.py [--iterations 20000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auction_server as server
+import codec
+
+TEAMS = ['CSK', 'MI', 'RCB', 'KKR', 'DC', 'PBKS', 'RR', 'SRH', 'GT', 'LSG']
+
+INBOUND = [
+    {'action': 'place_bid', 'bid_amount': 2.3},
+    {'action': 'send_message', 'message': 'That was a steal at two crore'},
+    {'action': 'sync', 'version': 1234},
+    {'action': 'create_room', 'player_name': 'Host', 'team': 'CSK', 'auction_mode': 'mega', 'timer_duration': 15},
+    {'action': 'list_rooms', 'offset': 0, 'limit': 50},
+]
+
+def build_room():
+    room = server.AuctionRoom('BENCH1', 'P0', 'mega', 15)
+    for i, team in enumerate(TEAMS):
+        room.add_player(f'player-{i}', f'Player {i}', team)
+    room.commit('room_created')
+    server.start_queue(room, server.catalog.default_queue('mega'))
+    room.commit('auction_started')
+    bidders = list(room.players)
+    for lot in range(20):
+        for n in range(8):
+            amount = server.next_bid_amount(room.auction_state['current_bid'])
+            server.cmd_place_bid(room, bidders[(lot + n) % len(bidders)], None, {'bid_amount': amount})
+        server.settle_lot(room)
+    for n in range(60):
+        server.cmd_send_message(room, bidders[n % len(bidders)], None, {'message': f'message number {n}'})
+    room.commit('settled')
+
+    amount = server.next_bid_amount(room.auction_state['current_bid'])
+    server.cmd_place_bid(room, bidders[0], None, {'bid_amount': amount})
+    version, ops = room.commit('bid_placed')
+    bid = {'type': 'bid_placed', 'version': version, 'delta': ops, 'server_time': server.now_ms()}
+    server.cmd_send_message(room, bidders[1], None, {'message': 'well bid'})
+    version, ops = room.commit('new_message')
+    chat = {'type': 'new_message', 'version': version, 'delta': ops, 'server_time': server.now_ms()}
+    snapshot = {'type': 'room_snapshot', 'room_data': room.to_dict()}
+    room.stop_clock()
+    return {'bid_delta': bid, 'chat_delta': chat, 'snapshot': snapshot}
+
+def legacy_dispatch(data):
+    # The handle_websocket branch order before the dispatch table
+    action = data.get('action')
+    if action == 'reconnect':
+        return 1
+    elif action == 'create_room':
+        return 2
+    elif action == 'join_room':
+        return 3
+    elif action == 'list_rooms':
+        return 4
+    elif action == 'subscribe_lobby':
+        return 5
+    elif action == 'unsubscribe_lobby':
+        return 6
+    elif action in server.ROOM_COMMANDS:
+        return 7
+    return 0
+
+def table_dispatch(data):
+    action = data['action']
+    handler = server.CONNECTION_COMMANDS.get(action)
+    codec.validate(server.SCHEMAS.get(action, {}), data)
+    return handler or action in server.ROOM_COMMANDS
+
+def per_message_us(fn, items, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations // len(items)):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - started) / (iterations // len(items) * len(items)) * 1e6
+
+def run(iterations):
+    outbound = asyncio.run(build())
+    codecs = {'json (stdlib)': codec.JsonCodec()}
+    if codec.orjson is not None:
+        codecs['orjson'] = codec.OrjsonCodec()
+    if codec.msgpack is not None:
+        codecs['msgpack'] = codec.MsgpackCodec()
+
+    print(f"{'path':<16} {'decode+dispatch':>16} " + ' '.join(f'{name:>14}' for name in outbound) + '   (us/message)')
+    text = [json.dumps(m) for m in INBOUND]
+    legacy_in = per_message_us(lambda frame: legacy_dispatch(json.loads(frame)), text, iterations)
+    legacy_out = [per_message_us(json.dumps, [m], iterations // 10) for m in outbound.values()]
+    print(f"{'legacy':<16} {legacy_in:>16.2f} " + ' '.join(f'{us:>14.2f}' for us in legacy_out))
+
+    for name, c in codecs.items():
+        frames = [c.encode(m) for m in INBOUND]
+        inbound = per_message_us(lambda frame: table_dispatch(c.decode(frame)), frames, iterations)
+        out = [per_message_us(c.encode, [m], iterations // 10) for m in outbound.values()]
+        print(f"{name:<16} {inbound:>16.2f} " + ' '.join(f'{us:>14.2f}' for us in out))
+
+    print('\nencoded bytes')
+    for name, c in codecs.items():
+        print(f'{name:<16} ' + ' '.join(f'{label}={len(c.encode(m))}' for label, m in outbound.items()))
+
+async def build():
+    # The lot clock needs a running loop
+    return build_room()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+    run(args.iterations)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,608 @@
+"""Load and latency benchmark for the websocket auction protocol.
+
+Drives simulated teams through the real protocol: create_room, join_room,
+start_auction, bursts of place_bid, the host's player_sold hammer, chat and
+reconnects. Reports:
+
+  - bid-to-broadcast latency (p50/p99/p999), measured from a bid being sent
+    to every team in the room seeing it in a bid_placed delta
+  - with --spectators, the same for read-only spectators (whose updates are
+    coalesced on a fixed tick), plus their frame rate and bytes, separately
+  - messages and bytes per second, each way
+  - server CPU and RSS
+  - event-loop lag (in-process mode)
+
+Server modes:
+  (default)      the aiohttp app runs in this process, on a localhost port.
+                 CPU, RSS and loop lag then include the load generator.
+  --spawn        auction_server.py runs as a subprocess (with --workers N);
+                 CPU and RSS cover the server processes only
+  --url URL      an already running server; client-side numbers only
+
+Results go to stdout as a summary and, with --json PATH, as a JSON document.
+--compare OLD.json prints the change against an earlier run, and
+--fail-over PCT exits non-zero when a headline metric regresses by more.
+
+Usage: python benchmarks/bench_load.py [--rooms 20] [--teams 4] [--bid-rate 4]
+           [--burst 2] [--lots 8] [--lot-seconds 2] [--chat-rate 0.5]
+           [--reconnect-every 3] [--spectators 0] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEAMS = ['CSK', 'MI', 'RCB', 'KKR', 'DC', 'PBKS', 'RR', 'SRH', 'GT', 'LSG']
+
+# Headline metrics for --compare / --fail-over; True when higher is better
+HEADLINE = {
+    'latency_ms.p50': False,
+    'latency_ms.p99': False,
+    'latency_ms.p999': False,
+    'throughput.bids_accepted_per_s': True,
+    'throughput.msgs_in_per_s': True,
+    'server.cpu_s': False,
+    'server.rss_peak_mb': False,
+    'loop_lag_ms.p99': False,
+    'spectator_latency_ms.p99': False,
+}
+
+def next_bid(current):
+    return round(current + (0.10 if current < 5 else 0.25), 2)
+
+def percentiles(values, points=(50, 99, 99.9)):
+    if not values:
+        return {f'p{str(p).replace(".", "")}': None for p in points} | {'max': None, 'count': 0}
+    ordered = sorted(values)
+    result = {}
+    for p in points:
+        index = min(len(ordered) - 1, int(len(ordered) * p / 100))
+        result[f'p{str(p).replace(".", "")}'] = round(ordered[index], 3)
+    result['max'] = round(ordered[-1], 3)
+    result['count'] = len(ordered)
+    return result
+
+class Stats:
+    def __init__(self):
+        self.msgs_in = 0
+        self.bytes_in = 0
+        self.msgs_out = 0
+        self.bytes_out = 0
+        self.bids_sent = 0
+        self.bids_accepted = 0
+        self.bids_rejected = 0
+        self.chat_sent = 0
+        self.reconnects = {}  # 'resumed' (replayed) / 'reconnected' (snapshot) -> count
+        self.errors = 0
+        self.latencies = []  # ms, one per (bid, receiving team)
+        self.reconnect_ms = []
+        self.loop_lag = []
+        self.spectator_msgs_in = 0
+        self.spectator_bytes_in = 0
+        self.spectator_snapshots = 0
+        self.spectator_latencies = []  # ms, one per (bid, spectator)
+
+class Team:
+    def __init__(self, room, index):
+        self.room = room
+        self.index = index
+        self.name = f'T{index}'
+        self.team = TEAMS[index]
+        self.player_id = None
+        self.resume_token = None
+        self.version = 0  # Latest room version this team has seen
+        self.online = False
+        self.connected_at = 0
+        self.ws = None
+        self.reader = None
+        self.waiters = {}  # message type -> future
+
+    async def send(self, message):
+        if not self.online:
+            return
+        text = json.dumps(message)
+        stats = self.room.stats
+        stats.msgs_out += 1
+        stats.bytes_out += len(text)
+        await self.ws.send_str(text)
+
+    def expect(self, *message_types):
+        future = asyncio.get_running_loop().create_future()
+        for message_type in message_types:
+            self.waiters[message_type] = future
+        return future
+
+    async def connect(self, session, url):
+        self.ws = await session.ws_connect(url, max_msg_size=0)
+        self.reader = asyncio.get_running_loop().create_task(self._read())
+        self.online = True
+        self.connected_at = time.perf_counter()
+
+    async def close(self):
+        self.online = False
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            await self.reader
+
+    async def _read(self):
+        stats = self.room.stats
+        async for msg in self.ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            received = time.perf_counter()
+            stats.msgs_in += 1
+            stats.bytes_in += len(msg.data)
+            data = json.loads(msg.data)
+            if 'version' in data:
+                self.version = max(self.version, data['version'])
+            elif 'room_data' in data:
+                self.version = data['room_data']['version']
+            self.room.observe(self, data, received)
+            future = self.waiters.pop(data.get('type'), None)
+            if future is not None and not future.done():
+                future.set_result(data)
+
+class Spectator:
+    # Read-only viewer: watch_room, then a spectating snapshot and room_update frames
+    def __init__(self, room):
+        self.room = room
+        self.ws = None
+        self.reader = None
+        self.watching_since = 0
+
+    async def watch(self, session, url):
+        self.ws = await session.ws_connect(url, max_msg_size=0)
+        self.watching_since = time.perf_counter()
+        await self.ws.send_str(json.dumps({'action': 'watch_room', 'room_code': self.room.code}))
+        self.reader = asyncio.get_running_loop().create_task(self._read())
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            await self.reader
+
+    async def _read(self):
+        stats = self.room.stats
+        async for msg in self.ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            received = time.perf_counter()
+            stats.spectator_msgs_in += 1
+            stats.spectator_bytes_in += len(msg.data)
+            data = json.loads(msg.data)
+            if data['type'] == 'spectating':
+                stats.spectator_snapshots += 1
+            elif data['type'] == 'error':
+                stats.errors += 1
+            elif data['type'] == 'room_update':
+                for op in data['delta']:
+                    if op[0] == 'append' and op[1] == ['auction_state', 'bid_history']:
+                        sent = self.room.sent.get((op[2]['player_id'], op[2]['amount']))
+                        if sent is not None and sent >= self.watching_since:
+                            stats.spectator_latencies.append((received - sent) * 1000)
+
+class Room:
+    def __init__(self, args, stats, serial, session, ws_url, lot_ids):
+        self.args = args
+        self.stats = stats
+        self.serial = serial
+        self.session = session
+        self.ws_url = ws_url
+        self.lot_ids = lot_ids
+        self.code = None
+        self.teams = [Team(self, i) for i in range(args.teams)]
+        self.spectators = [Spectator(self) for _ in range(args.spectators)]
+        self.version = 0
+        self.current_bid = 0
+        self.current_bidder = None
+        self.sent = {}  # (player_id, amount) -> perf_counter at send
+        self.rng = random.Random(serial)
+
+    def observe(self, team, data, received):
+        # Every team runs this for every frame; room state follows the
+        # newest version seen by any of them
+        if data.get('type') == 'bid_rejected':
+            self.stats.bids_rejected += 1
+            return
+        if data.get('type') == 'error':
+            self.stats.errors += 1
+            return
+        if 'delta' not in data:
+            room_data = data.get('room_data')
+            if room_data and room_data.get('version', 0) > self.version:
+                self.version = room_data['version']
+                self.current_bid = room_data['auction_state']['current_bid']
+                self.current_bidder = room_data['auction_state']['current_bidder_id']
+            return
+
+        for op in data['delta']:
+            path = op[1]
+            if op[0] == 'append' and path == ['auction_state', 'bid_history']:
+                key = (op[2]['player_id'], op[2]['amount'])
+                sent = self.sent.get(key)
+                # Bids replayed after a reconnect are not broadcast latency
+                if sent is not None and sent >= team.connected_at:
+                    self.stats.latencies.append((received - sent) * 1000)
+                    if team is self.teams[0]:
+                        self.stats.bids_accepted += 1
+            elif data['version'] > self.version and path == ['auction_state', 'current_bid']:
+                self.current_bid = op[2]
+            elif data['version'] > self.version and path == ['auction_state', 'current_bidder_id']:
+                self.current_bidder = op[2]
+        self.version = max(self.version, data['version'])
+
+    async def run(self):
+        host = self.teams[0]
+        await host.connect(self.session, self.ws_url)
+        created = host.expect('room_created')
+        await host.send({'action': 'create_room', 'player_name': host.name, 'team': host.team,
+                         'auction_mode': 'mega', 'timer_duration': 30})
+        created = await created
+        self.code, host.player_id = created['room_code'], created['player_id']
+        host.resume_token = created['resume_token']
+        self.version = created['room_data']['version']
+        self.timer_duration = created['room_data']['timer_duration']
+
+        for team in self.teams[1:]:
+            await team.connect(self.session, f'{self.ws_url}?room={self.code}')
+            joined = team.expect('joined_room')
+            await team.send({'action': 'join_room', 'room_code': self.code, 'player_name': team.name, 'team': team.team})
+            joined = await joined
+            team.player_id, team.resume_token = joined['player_id'], joined['resume_token']
+
+        started = host.expect('auction_started')
+        await host.send({'action': 'start_auction', 'player_ids': self.lot_ids})
+        await started
+        for spectator in self.spectators:
+            await spectator.watch(self.session, f'{self.ws_url}?room={self.code}')
+
+        loop = asyncio.get_running_loop()
+        chat = loop.create_task(self._chat())
+        reconnects = []
+        try:
+            for lot in range(len(self.lot_ids)):
+                if self.args.reconnect_every and lot % self.args.reconnect_every == self.args.reconnect_every - 1:
+                    # Drops out while the room keeps bidding, then catches up
+                    team = self.teams[1 + lot % (len(self.teams) - 1)]
+                    reconnects.append(loop.create_task(self._reconnect(team)))
+                await self._bid_for(self.args.lot_seconds)
+                sold = host.expect('player_sold')
+                await host.send({'action': 'player_sold', 'lot': lot})
+                # Bids are refused until the next lot opens
+                await asyncio.sleep(self._opens_in(await sold))
+            await asyncio.gather(*reconnects)
+        finally:
+            chat.cancel()
+
+        for spectator in self.spectators:
+            await spectator.close()
+        for team in reversed(self.teams):
+            await team.send({'action': 'leave_room'})
+        for team in self.teams:
+            await team.close()
+
+    def _opens_in(self, sold):
+        # The next lot's clock runs its timer plus the intermission; bidding
+        # opens once only the timer is left. Relative to server_time, so
+        # --url servers with a skewed clock work too.
+        for op in sold.get('delta', ()):
+            if op[1] == ['auction_state', 'deadline'] and op[2] is not None:
+                return max(0, (op[2] - sold['server_time']) / 1000 - self.timer_duration)
+        return 0
+
+    async def _bid_for(self, seconds):
+        # Every tick, `burst` teams bid the same next amount at once; the
+        # server accepts one and rejects the rest
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.args.bid_rate
+        deadline = loop.time() + seconds
+        while loop.time() < deadline:
+            amount = next_bid(self.current_bid)
+            candidates = [t for t in self.teams if t.online and t.player_id != self.current_bidder]
+            bidders = self.rng.sample(candidates, min(self.args.burst, len(candidates)))
+            now = time.perf_counter()
+            for team in bidders:
+                self.sent[(team.player_id, amount)] = now
+            self.stats.bids_sent += len(bidders)
+            await asyncio.gather(*(t.send({'action': 'place_bid', 'bid_amount': amount}) for t in bidders))
+            await asyncio.sleep(interval * self.rng.uniform(0.5, 1.5))
+
+    async def _chat(self):
+        if not self.args.chat_rate:
+            return
+        while True:
+            await asyncio.sleep(self.rng.expovariate(self.args.chat_rate))
+            team = self.rng.choice(self.teams)
+            if not team.online:
+                continue
+            self.stats.chat_sent += 1
+            await team.send({'action': 'send_message', 'message': f'chat from {team.name}'})
+
+    async def _reconnect(self, team):
+        await team.close()
+        await asyncio.sleep(self.args.downtime)
+        started = time.perf_counter()
+        await team.connect(self.session, f'{self.ws_url}?room={self.code}')
+        reconnected = team.expect('reconnected', 'resumed')
+        await team.send({'action': 'reconnect', 'room_code': self.code, 'player_id': team.player_id,
+                         'resume_token': team.resume_token, 'last_seq': team.version})
+        outcome = (await reconnected)['type']
+        self.stats.reconnects[outcome] = self.stats.reconnects.get(outcome, 0) + 1
+        self.stats.reconnect_ms.append((time.perf_counter() - started) * 1000)
+
+# Resource sampling
+
+def read_proc(pid):
+    # (cpu seconds, rss bytes) from /proc; None where /proc is unavailable
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            rss_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    return (int(fields[11]) + int(fields[12])) / ticks, rss_pages * os.sysconf('SC_PAGE_SIZE')
+
+def process_tree(pid):
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            for child in f.read().split():
+                pids.extend(process_tree(int(child)))
+    except OSError:
+        pass
+    return pids
+
+def usage(pid):
+    if pid is None:
+        return None
+    samples = [read_proc(p) for p in process_tree(pid)]
+    samples = [s for s in samples if s is not None]
+    if samples:
+        return sum(s[0] for s in samples), sum(s[1] for s in samples)
+    if pid == os.getpid():
+        ru = resource.getrusage(resource.RUSAGE_SELF)
+        return ru.ru_utime + ru.ru_stime, ru.ru_maxrss * 1024
+    return None
+
+async def sample_rss(pid, peak, stop):
+    while not stop.is_set():
+        current = usage(pid)
+        if current:
+            peak[0] = max(peak[0], current[1])
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+async def measure_loop_lag(stats, stop, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(max(0.0, loop.time() - started - interval) * 1000)
+
+# Servers
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+async def start_in_process(port):
+    os.environ.setdefault('AUCTION_DATA_DIR', tempfile.mkdtemp(prefix='bench_load_'))
+    sys.path.insert(0, ROOT)
+    import auction_server
+    from aiohttp import web
+
+    runner = web.AppRunner(auction_server.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+async def wait_for_port(port, timeout=30):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'server did not start on port {port}')
+
+def start_subprocess(port, workers):
+    env = dict(os.environ, AUCTION_DATA_DIR=tempfile.mkdtemp(prefix='bench_load_'))
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'auction_server.py'),
+                             '--port', str(port), '--workers', str(workers)],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+# Reporting
+
+def flatten(report, prefix=''):
+    flat = {}
+    for key, value in report.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+def compare(report, baseline_path, fail_over):
+    with open(baseline_path) as f:
+        baseline = flatten(json.load(f))
+    current = flatten(report)
+    regressions = []
+    print(f'\nvs {baseline_path}:')
+    for metric, higher_is_better in HEADLINE.items():
+        old, new = baseline.get(metric), current.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        worse = -change if higher_is_better else change
+        flag = '  REGRESSION' if fail_over is not None and worse > fail_over else ''
+        print(f'  {metric:<34} {old:>10.2f} -> {new:>10.2f} ({change:+.1f}%){flag}')
+        if flag:
+            regressions.append(metric)
+    return regressions
+
+async def run(args):
+    port = args.port or free_port()
+    runner = server_process = None
+    server_pid = None
+    if args.url:
+        base = args.url.rstrip('/')
+    else:
+        base = f'http://127.0.0.1:{port}'
+        if args.spawn:
+            server_process = start_subprocess(port, args.workers)
+            server_pid = server_process.pid
+            await wait_for_port(port)
+            await asyncio.sleep(0.5)
+        else:
+            runner = await start_in_process(port)
+            server_pid = os.getpid()
+
+    stats = Stats()
+    stop = asyncio.Event()
+    peak = [0]
+    monitors = [asyncio.get_running_loop().create_task(sample_rss(server_pid, peak, stop))]
+    if runner is not None:
+        monitors.append(asyncio.get_running_loop().create_task(measure_loop_lag(stats, stop)))
+
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async with session.get(f'{base}/api/catalog') as response:
+                catalog = (await response.json())['players']
+            lot_ids = [p['id'] for p in catalog if p['mode'] == 'mega'][:args.lots]
+
+            ws_url = base.replace('http', 'ws', 1) + '/ws'
+            rooms = [Room(args, stats, serial, session, ws_url, lot_ids) for serial in range(args.rooms)]
+            usage_before = usage(server_pid)
+            started = time.perf_counter()
+            results = await asyncio.gather(*(room.run() for room in rooms), return_exceptions=True)
+            elapsed = time.perf_counter() - started
+            usage_after = usage(server_pid)
+        failures = [r for r in results if isinstance(r, Exception)]
+    finally:
+        stop.set()
+        await asyncio.gather(*monitors)
+        if runner is not None:
+            await runner.cleanup()
+        if server_process is not None:
+            server_process.send_signal(subprocess.signal.SIGINT)
+            server_process.wait(15)
+
+    cpu = usage_after[0] - usage_before[0] if usage_before and usage_after else None
+    report = {
+        'run': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'mode': 'url' if args.url else 'spawn' if args.spawn else 'in-process',
+            'config': {k: v for k, v in vars(args).items() if k not in ('json', 'compare', 'fail_over')},
+            'elapsed_s': round(elapsed, 3),
+            'failed_rooms': len(failures),
+        },
+        'latency_ms': percentiles(stats.latencies),
+        'reconnect_ms': percentiles(stats.reconnect_ms),
+        'spectator_latency_ms': percentiles(stats.spectator_latencies),
+        'loop_lag_ms': percentiles(stats.loop_lag),
+        'counts': {
+            'msgs_in': stats.msgs_in, 'bytes_in': stats.bytes_in,
+            'msgs_out': stats.msgs_out, 'bytes_out': stats.bytes_out,
+            'bids_sent': stats.bids_sent, 'bids_accepted': stats.bids_accepted,
+            'bids_rejected': stats.bids_rejected, 'chat_sent': stats.chat_sent,
+            'reconnects': stats.reconnects, 'errors': stats.errors,
+            'spectator_msgs_in': stats.spectator_msgs_in, 'spectator_bytes_in': stats.spectator_bytes_in,
+            'spectator_snapshots': stats.spectator_snapshots,
+        },
+        'throughput': {
+            'msgs_in_per_s': round(stats.msgs_in / elapsed, 1),
+            'bytes_in_per_s': round(stats.bytes_in / elapsed, 1),
+            'msgs_out_per_s': round(stats.msgs_out / elapsed, 1),
+            'bytes_out_per_s': round(stats.bytes_out / elapsed, 1),
+            'bids_accepted_per_s': round(stats.bids_accepted / elapsed, 1),
+            'spectator_msgs_per_s': round(stats.spectator_msgs_in / elapsed, 1),
+            'spectator_bytes_per_s': round(stats.spectator_bytes_in / elapsed, 1),
+        },
+        'server': {
+            'cpu_s': round(cpu, 3) if cpu is not None else None,
+            'cpu_percent': round(cpu / elapsed * 100, 1) if cpu is not None else None,
+            'rss_peak_mb': round(peak[0] / 1e6, 1) if peak[0] else None,
+            'includes_load_generator': runner is not None,
+        },
+    }
+    if failures:
+        report['run']['first_failure'] = repr(failures[0])
+    return report
+
+def print_summary(report):
+    latency, counts, throughput, server = report['latency_ms'], report['counts'], report['throughput'], report['server']
+    print(f"{report['run']['mode']}: {report['run']['config']['rooms']} rooms x {report['run']['config']['teams']} teams "
+          f"in {report['run']['elapsed_s']}s ({report['run']['failed_rooms']} failed)")
+    print(f"  bid->broadcast ms   p50 {latency['p50']}  p99 {latency['p99']}  p999 {latency['p999']}  max {latency['max']}")
+    print(f"  bids                sent {counts['bids_sent']}  accepted {counts['bids_accepted']}  rejected {counts['bids_rejected']}")
+    print(f"  messages/s          in {throughput['msgs_in_per_s']}  out {throughput['msgs_out_per_s']}")
+    print(f"  bytes/s             in {throughput['bytes_in_per_s']}  out {throughput['bytes_out_per_s']}")
+    print(f"  server              cpu {server['cpu_s']}s ({server['cpu_percent']}%)  rss peak {server['rss_peak_mb']} MB")
+    spectators = report['run']['config']['rooms'] * report['run']['config']['spectators']
+    if spectators:
+        spectator = report['spectator_latency_ms']
+        print(f"  bid->spectator ms   p50 {spectator['p50']}  p99 {spectator['p99']}  p999 {spectator['p999']}  max {spectator['max']}")
+        print(f"  spectators          {spectators}: {throughput['spectator_msgs_per_s']} msgs/s "
+              f"({throughput['spectator_msgs_per_s'] / spectators:.1f} each)  {throughput['spectator_bytes_per_s']} bytes/s")
+    lag = report['loop_lag_ms']
+    if lag['count']:
+        print(f"  loop lag ms         p50 {lag['p50']}  p99 {lag['p99']}  max {lag['max']}")
+    if 'first_failure' in report['run']:
+        print(f"  first failure       {report['run']['first_failure']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--teams', type=int, default=4, help='teams per room (2-10)')
+    parser.add_argument('--bid-rate', type=float, default=4, help='bid bursts per second per room')
+    parser.add_argument('--burst', type=int, default=2, help='teams bidding at once in each burst')
+    parser.add_argument('--lots', type=int, default=8, help='lots per auction')
+    parser.add_argument('--lot-seconds', type=float, default=2, help='bidding time before the host sells')
+    parser.add_argument('--chat-rate', type=float, default=0.5, help='chat messages per second per room')
+    parser.add_argument('--reconnect-every', type=int, default=3, help='lots between reconnects (0 = never)')
+    parser.add_argument('--downtime', type=float, default=0.5, help='seconds a reconnecting team stays offline')
+    parser.add_argument('--spectators', type=int, default=0, help='read-only spectators per room')
+    parser.add_argument('--spawn', action='store_true', help='run the server as a subprocess')
+    parser.add_argument('--workers', type=int, default=1, help='server workers with --spawn')
+    parser.add_argument('--url', help='benchmark an already running server')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument('--compare', help='earlier --json report to compare against')
+    parser.add_argument('--fail-over', type=float, help='exit 1 if a headline metric regresses by more than this %%')
+    args = parser.parse_args()
+    args.teams = max(2, min(len(TEAMS), args.teams))
+
+    report = asyncio.run(run(args))
+    print_summary(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare and compare(report, args.compare, args.fail_over):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
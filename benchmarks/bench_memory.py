@@ -0,0 +1,81 @@
+"""Memory held per room as rooms age.
+
+Builds rooms of 8 teams through the real command handlers: a full lot
+cycle of bids and sales, plus a growing amount of chat. Measures the
+traced heap per room with tracemalloc. Because of the history rings,
+bytes/room should flatten once chat passes CHAT_CAPACITY. The heap should
+return to its baseline after the idle sweeper evicts the rooms.
+
+Usage: python benchmarks/bench_memory.py [--rooms 100] [--chat 0 100 1000 5000] [--lots 30]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auction_server as server
+
+TEAMS = ['CSK', 'MI', 'RCB', 'KKR', 'DC', 'PBKS', 'RR', 'SRH']
+
+def build_room(code, lots, chat):
+    room = server.AuctionRoom(code, 'P0', 'mega', 30)
+    for i, team in enumerate(TEAMS):
+        room.add_player(f'{code}-{i}', f'Player {i}', team)
+    room.commit('room_created')
+    server.rooms[code] = room
+    server.start_queue(room, server.catalog.default_queue('mega'))
+    room.commit('auction_started')
+
+    bidders = list(room.players)
+    for lot in range(lots):
+        for n in range(6):
+            amount = server.next_bid_amount(room.auction_state['current_bid'])
+            server.cmd_place_bid(room, bidders[(lot + n) % len(bidders)], None, {'bid_amount': amount})
+        server.settle_lot(room)
+    for n in range(chat):
+        server.cmd_send_message(room, bidders[n % len(bidders)], None, {'message': f'message number {n} from the table'})
+    room.stop_clock()
+    room.commit('settled')
+    return room
+
+def traced():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+async def run_case(room_count, lots, chat):
+    baseline = traced()
+    for r in range(room_count):
+        build_room(f'M{chat:05d}{r:05d}', lots, chat)
+    held = traced() - baseline
+
+    # Age every room past the TTL and let one sweep evict them
+    server.ROOM_TTL = 0
+    server.SWEEP_INTERVAL = 0
+    for room in server.rooms.values():
+        room.last_active = time.monotonic() - 1
+    sweeper = asyncio.get_running_loop().create_task(server.sweep_idle_rooms())
+    while server.rooms:
+        await asyncio.sleep(0.01)
+    sweeper.cancel()
+    left = traced() - baseline
+    return held / room_count, left
+
+async def main(args):
+    tracemalloc.start()
+    print(f"{'rooms':>6} {'lots':>5} {'chat':>6} {'KiB/room':>9} {'KiB after evict':>16}")
+    for chat in args.chat:
+        per_room, left = await run_case(args.rooms, args.lots, chat)
+        print(f'{args.rooms:>6} {args.lots:>5} {chat:>6} {per_room / 1024:>9.1f} {left / 1024:>16.1f}')
+    await server.scheduler.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--lots', type=int, default=30)
+    parser.add_argument('--chat', type=int, nargs='+', default=[0, 100, 1000, 5000])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,62 @@
+"""Cost of building player valuations and of ranking queries.
+
+Times the one-off Valuations build (stats parsing, ratings, name matching),
+then a 250-player auction queue and top-K queries, cold (first use of the
+filter) and cached, against a plain Python loop that filters and sorts the
+catalog dicts per request, as the browser used to.
+
+Usage: python benchmarks/bench_rankings.py [--iterations 2000] [--size 250]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import Valuations
+from catalog import ROLE_GROUPS, PlayerCatalog
+
+def python_queue(catalog, scores, mode, size):
+    # Filter, sort by score and take each role's share, dict by dict
+    pools = []
+    for _, role in ROLE_GROUPS:
+        pool = [p for p in catalog.players if p['mode'] == mode and p['role'] == role]
+        pool.sort(key=lambda p: -scores[p['id']])
+        pools.append(pool)
+    total = sum(len(pool) for pool in pools)
+    return [p['id'] for pool in pools for p in pool[:len(pool) * size // total]]
+
+def per_call_ms(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=250)
+    args = parser.parse_args()
+
+    catalog = PlayerCatalog.load()
+    started = time.perf_counter()
+    valuations = Valuations(catalog)
+    print(f'build ({len(catalog)} players)          {(time.perf_counter() - started) * 1000:8.3f} ms')
+
+    started = time.perf_counter()
+    valuations.auction_queue('mega', args.size)
+    print(f'{args.size}-player queue, cold        {(time.perf_counter() - started) * 1000:8.3f} ms')
+    print(f'{args.size}-player queue, cached      '
+          f'{per_call_ms(lambda: valuations.auction_queue("mega", args.size), args.iterations):8.3f} ms')
+    print(f'top-20 batsmen, cached          '
+          f'{per_call_ms(lambda: valuations.top(20, "mega", "batsman"), args.iterations):8.3f} ms')
+    print(f'top-20 band 2 Cr, cached        '
+          f'{per_call_ms(lambda: valuations.top(20, "legend", None, 2.0), args.iterations):8.3f} ms')
+
+    scores = [0.0 if s != s else float(s) for s in valuations.score]
+    print(f'{args.size}-player queue, python loop '
+          f'{per_call_ms(lambda: python_queue(catalog, scores, "mega", args.size), args.iterations // 10):8.3f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Restore-time benchmark for the room journal.
+
+Builds journals of synthetic auctions (N rooms x E bid events each) with the
+real AuctionRoom code paths, then times a cold restore two ways:
+
+  log      no usable snapshot; every record is replayed (crash before the
+           first compaction)
+  snapshot the shutdown snapshot alone (clean restart)
+
+Usage: python benchmarks/bench_restore.py [--rooms 10 100 1000] [--events 50 500]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auction_server as server
+from journal import Journal
+
+TEAMS = ['CSK', 'MI', 'RCB', 'KKR', 'DC', 'PBKS', 'RR', 'SRH']
+
+def build_room(code, events):
+    room = server.AuctionRoom(code, 'P0', 'mega', 30)
+    server.journal.record_state(code, room.version, room.state())
+    for i, team in enumerate(TEAMS):
+        room.add_player(f'{code}-{i}', f'P{i}', team)
+    room.commit('room_created')
+    server.start_queue(room, server.catalog.default_queue('mega'))
+    room.commit('auction_started')
+
+    bidders = list(room.players)
+    for n in range(events):
+        if n % 6 == 5:
+            server.settle_lot(room)  # Commits 'player_sold'
+            continue
+        bidder = bidders[n % len(bidders)]
+        if server.cmd_place_bid(room, bidder, None, {'bid_amount': server.next_bid_amount(room.auction_state['current_bid'])}):
+            room.commit('bid_placed')
+    room.stop_clock()
+    return room
+
+def time_restore(directory):
+    started = time.perf_counter()
+    states = Journal(directory).restore()
+    rebuilt = [server.AuctionRoom.from_dict(state) for state in states.values()]
+    return time.perf_counter() - started, len(rebuilt)
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+async def run_case(room_count, events, workdir):
+    directory = os.path.join(workdir, f'{room_count}x{events}')
+    server.journal = Journal(directory, fsync=False, snapshot_interval=3600, snapshot_every=10 ** 9)
+    server.journal.restore()
+    live = {}
+    server.journal.start(live)
+    await asyncio.sleep(0.01)  # Initial (empty) snapshot
+
+    for r in range(room_count):
+        code = f'R{r:05d}'
+        live[code] = build_room(code, events)
+        if r % 50 == 49:
+            await asyncio.sleep(0)  # Let the writer drain
+    await asyncio.sleep(server.journal.flush_interval * 2)
+    while server.journal._buffer:
+        await asyncio.sleep(server.journal.flush_interval)
+
+    records = server.journal.stats['records']
+    log_copy = directory + '-log'
+    shutil.copytree(directory, log_copy)
+    log_bytes = directory_size(log_copy)
+    log_time, restored = time_restore(log_copy)
+    assert restored == room_count
+
+    await server.journal.close()
+    snap_bytes = directory_size(directory)
+    snap_time, restored = time_restore(directory)
+    assert restored == room_count
+
+    # Both paths must land on the same state
+    expected = {code: room.version for code, room in live.items()}
+    assert {c: s['version'] for c, s in Journal(log_copy).restore().items()} == expected
+    return records, log_time, log_bytes, snap_time, snap_bytes
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix='bench_restore_')
+    try:
+        print(f"{'rooms':>6} {'events':>7} {'records':>9} {'log ms':>9} {'log MB':>8} {'snap ms':>9} {'snap MB':>8}")
+        for room_count in args.rooms:
+            for events in args.events:
+                records, log_time, log_bytes, snap_time, snap_bytes = await run_case(room_count, events, workdir)
+                print(f'{room_count:>6} {events:>7} {records:>9} {log_time * 1000:>9.1f} {log_bytes / 1e6:>8.2f} '
+                      f'{snap_time * 1000:>9.1f} {snap_bytes / 1e6:>8.2f}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        await server.scheduler.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--events', type=int, nargs='+', default=[50, 500])
+    asyncio.run(main(parser.parse_args()))
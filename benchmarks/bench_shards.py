@@ -0,0 +1,140 @@
+"""Throughput of the sharded server as the worker count grows.
+
+For each worker count, starts `auction_server.py --workers N` and drives it
+from several client processes. Each client repeatedly creates a room, has a
+second player join, runs 40 alternating bids and leaves. Reports rooms and
+acknowledged bids per second; with enough cores these should grow close to
+linearly with N (the clients need cores of their own too).
+
+Usage: python benchmarks/bench_shards.py [--workers 1 2 4] [--clients 8] [--duration 10]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BIDS_PER_ROOM = 40
+
+def next_bid(current):
+    return round(current + (0.10 if current < 5 else 0.25), 2)
+
+async def receive_until(ws, accept):
+    while True:
+        message = json.loads((await ws.receive()).data)
+        if accept(message):
+            return message
+
+def bid_by(player_id):
+    def accept(message):
+        if message['type'] == 'bid_rejected':
+            return True
+        if message['type'] != 'bid_placed':
+            return False
+        return ['set', ['auction_state', 'current_bidder_id'], player_id] in message['delta']
+    return accept
+
+async def one_room(session, url, serial):
+    async with session.ws_connect(url) as host:
+        await host.send_json({'action': 'create_room', 'player_name': f'H{serial}', 'team': 'CSK', 'timer_duration': 30})
+        created = await receive_until(host, lambda m: m['type'] == 'room_created')
+        code, host_id = created['room_code'], created['player_id']
+        current = 0
+
+        async with session.ws_connect(f'{url}?room={code}') as guest:
+            await guest.send_json({'action': 'join_room', 'room_code': code, 'player_name': f'G{serial}', 'team': 'MI'})
+            guest_id = (await receive_until(guest, lambda m: m['type'] == 'joined_room'))['player_id']
+            await host.send_json({'action': 'start_auction'})
+            started = await receive_until(host, lambda m: m['type'] == 'auction_started')
+            for op in started['delta']:
+                if op[1] == ['auction_state', 'current_bid']:
+                    current = op[2]
+
+            bids = 0
+            players = [(guest, guest_id), (host, host_id)]
+            for n in range(BIDS_PER_ROOM):
+                ws, player_id = players[n % 2]
+                current = next_bid(current)
+                await ws.send_json({'action': 'place_bid', 'bid_amount': current})
+                reply = await receive_until(ws, bid_by(player_id))
+                bids += reply['type'] == 'bid_placed'
+            await guest.send_json({'action': 'leave_room'})
+        await host.send_json({'action': 'leave_room'})
+        return bids
+
+async def client_loop(url, duration, counts):
+    deadline = time.monotonic() + duration
+    serial = 0
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            counts['bids'] += await one_room(session, url, serial)
+            counts['rooms'] += 1
+            serial += 1
+
+def client_process(url, duration, result_queue):
+    counts = {'rooms': 0, 'bids': 0}
+    asyncio.run(client_loop(url, duration, counts))
+    result_queue.put(counts)
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server did not start on port {port}')
+
+def run_case(workers, clients, duration, port):
+    env = dict(os.environ, AUCTION_DATA_DIR=tempfile.mkdtemp(prefix='bench_shards_'))
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, 'auction_server.py'),
+                               '--workers', str(workers), '--port', str(port)],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        time.sleep(0.5)  # Workers restoring their journals
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=client_process, args=(f'http://127.0.0.1:{port}/ws', duration, results))
+                     for _ in range(clients)]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        totals = {'rooms': 0, 'bids': 0}
+        for _ in processes:
+            for key, value in results.get().items():
+                totals[key] += value
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+        return totals['rooms'] / elapsed, totals['bids'] / elapsed
+    finally:
+        server.send_signal(subprocess.signal.SIGINT)
+        server.wait(15)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPU(s), {args.clients} client processes, {args.duration:.0f}s per run')
+    print(f"{'workers':>7} {'rooms/s':>9} {'bids/s':>9} {'speedup':>8}")
+    baseline = None
+    for workers in args.workers:
+        rooms_rate, bids_rate = run_case(workers, args.clients, args.duration, args.port)
+        baseline = baseline or bids_rate
+        print(f'{workers:>7} {rooms_rate:>9.1f} {bids_rate:>9.1f} {bids_rate / baseline:>7.2f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Startup, drain and restart benchmark.
+
+Measures what a deploy costs:
+
+  - import time of auction_server (fresh interpreter, best of --imports), and
+    how long each lazily built resource takes on first use
+  - spawn to listening, then the first and second /api/catalog and / requests
+    (the first may wait for the background preload)
+  - drain: --rooms bot auctions are started, then the server gets SIGTERM.
+    Reports how many auctions finished before their sockets were closed,
+    how long until every client saw the restart close (1012) and until the
+    process exited
+  - restart: a new server on the same data directory, time to listening and
+    rooms restored
+
+Usage: python benchmarks/bench_startup.py [--rooms 20] [--bots 5] [--lots 4]
+           [--time-scale 20] [--drain-timeout 30] [--workers 1] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from bench_load import ROOT, free_port
+
+def import_seconds(repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import auction_server'], cwd=ROOT, check=True)
+        times.append(time.perf_counter() - started)
+    baseline = min(_interpreter_seconds() for _ in range(repeat))
+    return round(min(times), 3), round(min(times) - baseline, 3)
+
+def _interpreter_seconds():
+    started = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True)
+    return time.perf_counter() - started
+
+def resource_ms():
+    # First-use cost of each deferred resource, in this process
+    sys.path.insert(0, ROOT)
+    import auction_server
+    costs = {}
+    for name in ('catalog', 'catalog_asset', 'valuations', 'static_assets'):
+        started = time.perf_counter()
+        getattr(auction_server, name).load()
+        costs[name] = round((time.perf_counter() - started) * 1000, 1)
+    return costs
+
+def spawn(port, data_dir, args, env=None):
+    env = dict(os.environ, AUCTION_DATA_DIR=data_dir, AUCTION_TIME_SCALE=str(args.time_scale), **(env or {}))
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'auction_server.py'), '--host', '127.0.0.1',
+                             '--port', str(port), '--workers', str(args.workers),
+                             '--drain-timeout', str(args.drain_timeout)],
+                            env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+
+async def until_listening(port, started, timeout=30):
+    # Finer polling than bench_load.wait_for_port, since this is the measurement
+    while time.perf_counter() - started < timeout:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return round(time.perf_counter() - started, 3)
+        except OSError:
+            await asyncio.sleep(0.005)
+    raise RuntimeError(f'server did not start on port {port}')
+
+async def timed_get(session, url):
+    started = time.perf_counter()
+    async with session.get(url) as response:
+        await response.read()
+    return round((time.perf_counter() - started) * 1000, 1)
+
+async def wait_exit(process, timeout):
+    started = time.perf_counter()
+    while process.poll() is None and time.perf_counter() - started < timeout:
+        await asyncio.sleep(0.01)
+    return process.poll() is not None
+
+async def run_room(session, base, args, serial, rooms):
+    # One host, bot teams, then read until the server closes the socket
+    room = {'ended': None, 'notice': None, 'closed': None, 'code': None}
+    rooms.append(room)
+    async with session.ws_connect(f'{base}/ws', max_msg_size=0) as ws:
+        await ws.send_json({'action': 'create_room', 'player_name': f'Host{serial}', 'team': 'CSK',
+                            'auction_mode': 'mega', 'timer_duration': 5})
+        if (await ws.receive_json()).get('type') != 'room_created':
+            return
+        for _ in range(args.bots):
+            await ws.send_json({'action': 'add_bot', 'risk': 'balanced'})
+        await ws.send_json({'action': 'start_auction', 'size': args.lots})
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                break
+            data = json.loads(msg.data)
+            if data.get('type') == 'server_draining':
+                room['notice'] = time.perf_counter()
+            for op in data.get('delta', ()):
+                if op[1] == ['auction_state', 'status'] and op[2] == 'ended':
+                    room['ended'] = time.perf_counter()
+        room['closed'] = time.perf_counter()
+        room['code'] = ws.close_code
+
+async def run(args):
+    report = {'config': {k: v for k, v in vars(args).items() if k != 'json'}}
+    report['import_s'], report['import_over_interpreter_s'] = import_seconds(args.imports)
+    report['first_use_ms'] = resource_ms()
+
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    data_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    started = time.perf_counter()
+    process = spawn(port, data_dir, args)
+    try:
+        report['spawn_to_listening_s'] = await until_listening(port, started)
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+            report['first_catalog_ms'] = await timed_get(session, f'{base}/api/catalog')
+            report['second_catalog_ms'] = await timed_get(session, f'{base}/api/catalog')
+            report['first_page_ms'] = await timed_get(session, f'{base}/')
+
+            rooms = []
+            tasks = [asyncio.create_task(run_room(session, base, args, serial, rooms))
+                     for serial in range(args.rooms)]
+            await asyncio.sleep(args.drain_after)
+            sigterm = time.perf_counter()
+            process.send_signal(signal.SIGTERM)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            exited = await wait_exit(process, args.drain_timeout + 30)
+            stopped = time.perf_counter()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    closed = [room for room in rooms if room['closed'] is not None]
+    ended = [room['ended'] for room in rooms if room['ended'] is not None]
+    report['drain'] = {
+        'rooms': len(rooms),
+        'live_at_sigterm': sum(1 for room in rooms if room['ended'] is None or room['ended'] > sigterm),
+        'finished_during_drain': sum(1 for room in rooms if room['ended'] is not None and room['ended'] > sigterm),
+        'cut_off': sum(1 for room in rooms if room['ended'] is None),
+        'notified': sum(1 for room in rooms if room['notice'] is not None),
+        'closed_1012': sum(1 for room in closed if room['code'] == 1012),
+        'last_finish_s': round(max(ended) - sigterm, 3) if ended else None,
+        'last_close_s': round(max(room['closed'] for room in closed) - sigterm, 3) if closed else None,
+        'process_exit_s': round(stopped - sigterm, 3) if exited else None
+    }
+
+    # Restart on the same data directory
+    started = time.perf_counter()
+    process = spawn(port, data_dir, args)
+    try:
+        report['restart_to_listening_s'] = await until_listening(port, started)
+        restored = 0
+        async with aiohttp.ClientSession() as session:
+            # /stats reports one worker; ?shard=N picks it
+            for index in range(args.workers):
+                async with session.get(f'{base}/stats?shard={index}') as response:
+                    restored += (await response.json())['rooms']
+        report['restored_rooms'] = restored
+    finally:
+        process.send_signal(signal.SIGTERM)
+        await wait_exit(process, 30)
+        if process.poll() is None:
+            process.kill()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--bots', type=int, default=5, help='bot teams per room (1-9)')
+    parser.add_argument('--lots', type=int, default=4, help='lots per auction')
+    parser.add_argument('--time-scale', type=float, default=20, help='lot clock speed-up')
+    parser.add_argument('--drain-after', type=float, default=0.5, help='seconds of play before SIGTERM')
+    parser.add_argument('--drain-timeout', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--imports', type=int, default=5, help='fresh interpreters timed for the import')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+    args.bots = max(1, min(9, args.bots))
+
+    report = asyncio.run(run(args))
+    for key, value in report.items():
+        if key != 'config':
+            print(f'{key:<28} {value}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Soak test: hundreds of bot-run auctions on one server.
+
+Each room is created over a websocket by a host that never bids, filled with
+bot teams (mixed risk profiles) and started; the bots then play the whole
+auction from inside the server, with lot clocks sped up by --time-scale
+(AUCTION_TIME_SCALE). Rooms are ramped up in batches. Reports rooms finished,
+lots and bids per second, broadcast traffic seen by the hosts, server CPU and
+RSS, event-loop lag (in-process) and the bots' per-decision cost from /metrics.
+
+Usage: python benchmarks/soak_bots.py [--rooms 200] [--bots 9] [--lots 10]
+           [--time-scale 20] [--spawn --workers N] [--json out.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+
+import aiohttp
+
+from bench_load import free_port, measure_loop_lag, percentiles, sample_rss, start_subprocess, usage, wait_for_port
+
+RISKS = ('cautious', 'balanced', 'aggressive')
+
+class Stats:
+    def __init__(self):
+        self.msgs = 0
+        self.bytes = 0
+        self.bids = 0
+        self.lots = 0
+        self.finished = 0
+        self.errors = 0
+        self.loop_lag = []
+        self.room_seconds = []
+
+async def run_room(session, ws_url, args, stats, serial):
+    async with session.ws_connect(ws_url, max_msg_size=0) as ws:
+        await ws.send_json({'action': 'create_room', 'player_name': f'Host{serial}', 'team': 'CSK',
+                            'auction_mode': 'mega', 'timer_duration': 5})
+        created = await ws.receive_json()
+        if created.get('type') != 'room_created':
+            stats.errors += 1
+            return
+        risks = itertools.cycle(RISKS[serial % len(RISKS):] + RISKS[:serial % len(RISKS)])
+        for _ in range(args.bots):
+            await ws.send_json({'action': 'add_bot', 'risk': next(risks)})
+        await ws.send_json({'action': 'start_auction', 'size': args.lots})
+
+        started = time.perf_counter()
+        deadline = started + args.timeout
+        async for msg in ws:
+            stats.msgs += 1
+            stats.bytes += len(msg.data)
+            data = json.loads(msg.data)
+            if data.get('type') == 'error':
+                stats.errors += 1
+            elif data.get('type') == 'player_sold':
+                stats.lots += 1
+            for op in data.get('delta', ()):
+                if op[0] == 'append' and op[1] == ['auction_state', 'bid_history']:
+                    stats.bids += 1
+                elif op[1] == ['auction_state', 'status'] and op[2] == 'ended':
+                    stats.finished += 1
+                    stats.room_seconds.append(time.perf_counter() - started)
+                    await ws.send_json({'action': 'leave_room'})
+                    return
+            if time.perf_counter() > deadline:
+                return
+
+async def scrape_decisions(session, base):
+    # Mean bot decision time from the Prometheus text
+    async with session.get(f'{base}/metrics') as response:
+        text = await response.text()
+    values = {}
+    for line in text.splitlines():
+        for suffix in ('_sum', '_count'):
+            if line.startswith(f'auction_bot_decision_seconds{suffix} '):
+                values[suffix] = float(line.split()[1])
+    if values.get('_count'):
+        return round(values['_sum'] / values['_count'] * 1e6, 1), int(values['_count'])
+    return None, 0
+
+async def run(args):
+    os.environ['AUCTION_TIME_SCALE'] = str(args.time_scale)
+    port = args.port or free_port()
+    base = f'http://127.0.0.1:{port}'
+    runner = process = None
+    if args.spawn:
+        process = start_subprocess(port, args.workers)
+        server_pid = process.pid
+        await wait_for_port(port)
+        await asyncio.sleep(0.5)
+    else:
+        from bench_load import start_in_process
+        runner = await start_in_process(port)
+        server_pid = os.getpid()
+
+    stats = Stats()
+    stop = asyncio.Event()
+    peak = [0]
+    loop = asyncio.get_running_loop()
+    monitors = [loop.create_task(sample_rss(server_pid, peak, stop))]
+    if runner is not None:
+        monitors.append(loop.create_task(measure_loop_lag(stats, stop)))
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+            before = usage(server_pid)
+            started = time.perf_counter()
+            tasks = []
+            for serial in range(args.rooms):
+                # Rooms in a shard-aware URL would need their code first; the
+                # front places new rooms itself
+                tasks.append(loop.create_task(run_room(session, f'{base}/ws', args, stats, serial)))
+                if serial % args.ramp == args.ramp - 1:
+                    await asyncio.sleep(0.1)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            elapsed = time.perf_counter() - started
+            after = usage(server_pid)
+            decision_us, decisions = (await scrape_decisions(session, base)) if not args.spawn or args.workers == 1 \
+                else (None, 0)
+    finally:
+        stop.set()
+        await asyncio.gather(*monitors)
+        if runner is not None:
+            await runner.cleanup()
+        if process is not None:
+            process.send_signal(2)
+            process.wait(15)
+
+    cpu = after[0] - before[0] if before and after else None
+    return {
+        'config': {k: v for k, v in vars(args).items() if k != 'json'},
+        'elapsed_s': round(elapsed, 2),
+        'rooms_finished': stats.finished,
+        'errors': stats.errors,
+        'room_seconds': percentiles(stats.room_seconds, (50, 99)),
+        'lots_per_s': round(stats.lots / elapsed, 1),
+        'bids_per_s': round(stats.bids / elapsed, 1),
+        'host_msgs_per_s': round(stats.msgs / elapsed, 1),
+        'host_bytes_per_s': round(stats.bytes / elapsed, 1),
+        'bot_decision_us': decision_us,
+        'bot_decisions': decisions,
+        'server_cpu_percent': round(cpu / elapsed * 100, 1) if cpu is not None else None,
+        'rss_peak_mb': round(peak[0] / 1e6, 1) if peak[0] else None,
+        'loop_lag_ms': percentiles(stats.loop_lag),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--bots', type=int, default=9, help='bot teams per room (1-9)')
+    parser.add_argument('--lots', type=int, default=10, help='lots per auction')
+    parser.add_argument('--time-scale', type=float, default=20, help='lot clock speed-up')
+    parser.add_argument('--ramp', type=int, default=25, help='rooms created per 0.1 s')
+    parser.add_argument('--timeout', type=float, default=300, help='give up on a room after this many seconds')
+    parser.add_argument('--spawn', action='store_true', help='run the server as a subprocess')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+    args.bots = max(1, min(9, args.bots))
+
+    report = asyncio.run(run(args))
+    for key, value in report.items():
+        if key != 'config':
+            print(f'{key:<20} {value}')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
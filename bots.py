@@ -0,0 +1,105 @@
+import asyncio
+import math
+import random
+
+import metrics
+
+# risk profile -> multiplier on what a bot thinks a player is worth
+RISK_PROFILES = {
+    'cautious': 0.8,
+    'balanced': 1.0,
+    'aggressive': 1.25
+}
+
+# Squad shape bots aim for; a role already filled is worth half as much
+ROLE_TARGETS = {'batsman': 8, 'all_rounder': 7, 'bowler': 8}
+
+# Bots keep enough purse to fill MIN_SQUAD slots at RESERVE_PER_SLOT each
+MIN_SQUAD = 18
+RESERVE_PER_SLOT = 0.5
+
+# What the best-rated player is worth above base price, in crores; players
+# without stats count as this score
+MAX_PREMIUM = 15
+UNRATED_SCORE = 30
+
+# Once the lot is open, a bot waits this fraction of its remaining clock
+# before bidding
+THINK_TIME = (0.05, 0.35)
+
+decision_seconds = metrics.histogram('auction_bot_decision_seconds', 'One bot look at a lot, all bots of the room')
+bot_bids = metrics.counter('auction_bot_bids_total', 'Bids scheduled by bots')
+
+class BotDriver:
+    # Computer-controlled teams, bidding from inside the server. A bot is a
+    # Team with a risk profile and no websocket. After each batch of room
+    # commands react() looks at the lot once per lot update (lot, bid or
+    # status change): the bot that values the lot furthest above the next
+    # bid schedules a single place_bid, submitted to the room's queue like
+    # any other command after a think delay. A newer update supersedes a
+    # pending bid, so bots add at most one bid per update.
+    def __init__(self, catalog, valuations, next_bid_amount, time_scale=1):
+        self.catalog = catalog
+        self.valuations = valuations
+        self.next_bid_amount = next_bid_amount
+        self.time_scale = time_scale
+        self.looked = {}  # room_code -> lot state last decided on
+        self.pending = {}  # room_code -> TimerHandle of the scheduled bid
+
+    def react(self, room):
+        state = room.auction_state
+        key = (state['status'], state['current_player_idx'], state['current_bid'], state['current_bidder_id'])
+        if self.looked.get(room.room_code) == key:
+            return
+        self.looked[room.room_code] = key
+        self.cancel(room.room_code)
+        if state['status'] != 'active' or state['current_player_idx'] >= len(state['auction_queue']):
+            return
+        bots = [pid for pid, team in room.players.items() if team.bot and pid != state['current_bidder_id']]
+        if not bots:
+            return
+
+        started = decision_seconds.start()
+        lot = self.catalog.get(state['auction_queue'][state['current_player_idx']])
+        amount = self.next_bid_amount(state['current_bid'])
+        best, margin = None, 0
+        for pid in bots:
+            limit = self.limit(room, room.players[pid], lot)
+            if limit >= amount and (best is None or limit - amount > margin):
+                best, margin = pid, limit - amount
+        if best is not None:
+            # Counted from when the lot opens, not from the sale before it
+            delay = (room.intermission_left() + room.time_left() * random.uniform(*THINK_TIME)) / self.time_scale
+            self.pending[room.room_code] = asyncio.get_running_loop().call_later(
+                delay, room.submit, 'place_bid', best, None, {'bid_amount': amount})
+            bot_bids.inc()
+        decision_seconds.stop(started, room=room.room_code, bots=len(bots))
+
+    def limit(self, room, team, lot):
+        # Highest bid this team would make for the lot
+        if len(team.players) >= room.max_players_per_team:
+            return 0
+        if room.auction_mode == 'mega' and lot['isForeign'] and team.foreign_count >= room.max_foreign_players:
+            return 0
+        score = float(self.valuations.score[lot['id']])
+        if math.isnan(score):
+            score = UNRATED_SCORE
+        worth = lot['basePrice'] + MAX_PREMIUM * (score / 100) ** 2
+
+        target = ROLE_TARGETS.get(lot['role'], 1)
+        have = sum(1 for bought in team.players if self.catalog.get(bought['id'])['role'] == lot['role'])
+        need = 0.5 if have >= target else 1 + 0.5 * (1 - have / target)
+
+        # Same bot, same lot: same opinion, however often it looks
+        noise = random.Random(f'{team.team}:{lot["id"]}').uniform(0.85, 1.15)
+        reserve = max(0, MIN_SQUAD - len(team.players) - 1) * RESERVE_PER_SLOT
+        return min(worth * need * RISK_PROFILES.get(team.bot, 1.0) * noise, team.purse - reserve)
+
+    def cancel(self, room_code):
+        handle = self.pending.pop(room_code, None)
+        if handle is not None:
+            handle.cancel()
+
+    def forget(self, room_code):
+        self.cancel(room_code)
+        self.looked.pop(room_code, None)
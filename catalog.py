@@ -0,0 +1,203 @@
+import json
+import os
+import re
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATS_FILE = os.path.join(BASE_DIR, 'ipl_players_with_stats.json')
+CATEGORIZED_FILE = os.path.join(BASE_DIR, 'ipl_categorized_players.json')
+
+# Queue order within an auction: Batsmen -> All-Rounders -> Bowlers
+ROLE_GROUPS = [('batsmen', 'batsman'), ('all_rounders', 'all_rounder'), ('bowlers', 'bowler')]
+
+TEAM_ABBREVIATIONS = {
+    'Chennai Super Kings': 'CSK',
+    'Mumbai Indians': 'MI',
+    'Royal Challengers Bengaluru': 'RCB',
+    'Kolkata Knight Riders': 'KKR',
+    'Delhi Capitals': 'DC',
+    'Punjab Kings': 'PBKS',
+    'Rajasthan Royals': 'RR',
+    'Sunrisers Hyderabad': 'SRH',
+    'Gujarat Titans': 'GT',
+    'Lucknow Super Giants': 'LSG'
+}
+
+# The categorized file mixes demonyms and country names
+NATIONALITY_ALIASES = {
+    'indian': 'India',
+    'india': 'India',
+    'australian': 'Australia',
+    'australia': 'Australia',
+    'singaporean / australian': 'Australia',
+    'english': 'England',
+    'england': 'England',
+    'south african': 'South Africa',
+    'south africa': 'South Africa',
+    'new zealander': 'New Zealand',
+    'new zealand': 'New Zealand',
+    'west indian': 'West Indies',
+    'west indies': 'West Indies',
+    'afghan': 'Afghanistan',
+    'sri lankan': 'Sri Lanka',
+    'sri lanka': 'Sri Lanka',
+    'bangladesh': 'Bangladesh'
+}
+
+PRICE_PATTERN = re.compile(r'([\d.]+)\s*(crore|cr|lakhs?|l)\b', re.IGNORECASE)
+
+def parse_price(text):
+    # "INR 18.00 Cr (trade value)" -> 18.0, "INR 75 Lakh" -> 0.75 (in crores)
+    if not text:
+        return None
+    match = PRICE_PATTERN.search(text)
+    if not match:
+        return None
+    value = float(match.group(1))
+    if match.group(2).lower().startswith('l'):
+        value /= 100
+    return round(value, 2)
+
+def normalize_nationality(text):
+    if not text:
+        return None
+    return NATIONALITY_ALIASES.get(text.strip().lower(), text.strip())
+
+def mega_base_price(price_cr):
+    # Tiers by last contract value: marquee, established, everyone else
+    if price_cr is None:
+        return 0.5
+    if price_cr >= 14:
+        return 2
+    if price_cr >= 4:
+        return 1
+    return 0.5
+
+def legend_sort_key(player):
+    # Career volume used to rank legends within their role
+    if player['role'] == 'batsman':
+        stat = player.get('stats', {}).get('runs_or_wickets')
+    elif player['role'] == 'bowler':
+        stat = player.get('stats', {}).get('matches')
+    else:
+        stat = player.get('batting_stats', {}).get('matches')
+    try:
+        return -float(stat or 0)
+    except ValueError:
+        return 0.0
+
+def split_legend_name(name):
+    # "V Kohli (RCB)" -> ("V Kohli", ["RCB"])
+    match = re.match(r'^(.+?)\s*\((.+)\)$', name)
+    if not match:
+        return name, []
+    return match.group(1), match.group(2).split('/')
+
+class PlayerCatalog:
+    # Immutable view over both player files. Every player gets a stable integer
+    # id (its position in load order), and rooms reference players by id only.
+    def __init__(self, players):
+        self.players = tuple(players)
+        self.by_mode = {}
+        self.by_role = {}
+        self.by_nationality = {}
+        self.by_team = {}
+        self.by_band = {}
+        for player in self.players:
+            pid = player['id']
+            self.by_mode.setdefault(player['mode'], []).append(pid)
+            self.by_role.setdefault(player['role'], []).append(pid)
+            self.by_band.setdefault(player['basePrice'], []).append(pid)
+            if player['nationality_key']:
+                self.by_nationality.setdefault(player['nationality_key'], []).append(pid)
+            for team in player['teams']:
+                self.by_team.setdefault(team, []).append(pid)
+
+        for index in (self.by_mode, self.by_role, self.by_nationality, self.by_team, self.by_band):
+            for key in index:
+                index[key] = tuple(index[key])
+
+        # Serialized once; served as-is by the catalog endpoint
+        self.payload = json.dumps({'players': self.players}, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def load(cls, stats_file=STATS_FILE, categorized_file=CATEGORIZED_FILE):
+        with open(categorized_file, encoding='utf-8') as f:
+            categorized = json.load(f)
+        with open(stats_file, encoding='utf-8') as f:
+            with_stats = json.load(f)
+
+        players = []
+        for group, role in ROLE_GROUPS:
+            for raw in categorized.get(group, []):
+                price_cr = parse_price(raw.get('price'))
+                nationality = normalize_nationality(raw.get('nationality'))
+                team = TEAM_ABBREVIATIONS.get(raw.get('team'), raw.get('team'))
+                players.append(dict(
+                    raw,
+                    id=len(players),
+                    mode='mega',
+                    role=role,
+                    price_cr=price_cr,
+                    basePrice=mega_base_price(price_cr),
+                    isForeign=nationality is not None and nationality != 'India',
+                    nationality_key=nationality,
+                    teams=[team] if team else []
+                ))
+
+        for group, role in ROLE_GROUPS:
+            # Legends are ranked within their role and split into thirds
+            ranked = sorted(with_stats.get(group, []), key=legend_sort_key)
+            third = -(-len(ranked) // 3)
+            for i, raw in enumerate(ranked):
+                _, teams = split_legend_name(raw['name'])
+                players.append(dict(
+                    raw,
+                    id=len(players),
+                    mode='legend',
+                    role=role,
+                    price_cr=None,
+                    basePrice=2 if i < third else 1 if i < third * 2 else 0.5,
+                    isForeign=False,
+                    nationality_key=None,
+                    teams=teams
+                ))
+
+        return cls(players)
+
+    def __len__(self):
+        return len(self.players)
+
+    def get(self, player_id):
+        if isinstance(player_id, int) and 0 <= player_id < len(self.players):
+            return self.players[player_id]
+        return None
+
+    def default_queue(self, mode):
+        # Load order already is role order, ranked within role for legends
+        return list(self.by_mode.get(mode, ()))
+
+    def query(self, mode=None, role=None, nationality=None, team=None, band=None):
+        selected = None
+        for index, key in ((self.by_mode, mode), (self.by_role, role), (self.by_team, team), (self.by_band, band)):
+            if key is None:
+                continue
+            ids = set(index.get(key, ()))
+            selected = ids if selected is None else selected & ids
+        if nationality is not None:
+            ids = set(self.by_nationality.get(normalize_nationality(nationality), ()))
+            selected = ids if selected is None else selected & ids
+        if selected is None:
+            return [p['id'] for p in self.players]
+        return sorted(selected)
+
+    def validate_queue(self, player_ids, mode):
+        # Only ids that exist in this room's mode, each at most once
+        seen = set()
+        queue = []
+        for pid in player_ids:
+            player = self.get(pid)
+            if player is None or player['mode'] != mode or pid in seen:
+                continue
+            seen.add(pid)
+            queue.append(pid)
+        return queue
@@ -0,0 +1,134 @@
+import json
+import math
+import os
+
+try:
+    import orjson
+except ImportError:  # Optional: stdlib json produces the same wire format
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # Optional: clients then only get JSON
+    msgpack = None
+
+# permessage-deflate for clients that offer it. Small frames gain little, but
+# full room snapshots and lobby pages shrink several times over.
+DEFLATE = os.environ.get('AUCTION_WS_DEFLATE', '1') != '0'
+
+class ProtocolError(Exception):
+    # A client frame that is malformed or fails its action's schema; the
+    # message is sent back to the client as-is
+    pass
+
+def reject_constant(name):
+    # Stdlib json accepts NaN and Infinity, which orjson and browsers refuse
+    raise ProtocolError('Malformed message')
+
+class JsonCodec:
+    name = 'json'
+    binary = False
+
+    def encode(self, message):
+        return json.dumps(message)
+
+    def decode(self, data):
+        return json.loads(data, parse_constant=reject_constant)
+
+class OrjsonCodec(JsonCodec):
+    # Same JSON text as JsonCodec, several times faster. Deques (history
+    # rings) become lists; integer dict keys become strings like json's.
+    def encode(self, message):
+        return orjson.dumps(message, default=list, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def decode(self, data):
+        return orjson.loads(data)
+
+class MsgpackCodec:
+    name = 'msgpack'
+    binary = True
+
+    def encode(self, message):
+        return msgpack.packb(message, default=list)
+
+    def decode(self, data):
+        return msgpack.unpackb(data)
+
+JSON = OrjsonCodec() if orjson is not None else JsonCodec()
+
+# Websocket subprotocol -> codec. Clients that offer none (browsers) get JSON.
+CODECS = {'auction.json': JSON}
+if msgpack is not None:
+    CODECS['auction.msgpack'] = MsgpackCodec()
+
+PROTOCOLS = tuple(CODECS)
+
+def for_protocol(protocol):
+    return CODECS.get(protocol, JSON)
+
+def decode_frame(data, binary):
+    # Text frames are always JSON; binary frames are MessagePack
+    try:
+        if binary:
+            if msgpack is None:
+                raise ProtocolError('Binary frames are not supported')
+            message = CODECS['auction.msgpack'].decode(data)
+        else:
+            message = JSON.decode(data)
+    except ProtocolError:
+        raise
+    except Exception:
+        raise ProtocolError('Malformed message')
+    if not isinstance(message, dict) or not isinstance(message.get('action'), str):
+        raise ProtocolError('Message must be an object with an action')
+    return message
+
+# Schemas
+
+NUMBER = (int, float)
+
+def valid(value, types):
+    if isinstance(value, bool) or not isinstance(value, types):
+        return False
+    return not isinstance(value, float) or math.isfinite(value)
+
+class Field:
+    # One expected key of a message. None counts as absent, so optional
+    # fields may be sent as null.
+    __slots__ = ('types', 'required', 'max_length', 'items', 'choices', 'minimum')
+
+    def __init__(self, types, required=False, max_length=None, items=None, choices=None, minimum=None):
+        self.types = types if isinstance(types, tuple) else (types,)
+        self.required = required
+        self.max_length = max_length
+        self.items = items  # Element type for lists
+        self.choices = choices
+        self.minimum = minimum
+
+    def check(self, name, value):
+        if value is None:
+            if self.required:
+                raise ProtocolError(f'Missing {name}')
+            return
+        # bool is an int subclass, but never a valid amount or id; NaN and
+        # infinities (MessagePack can carry them) compare False to any bound
+        if not valid(value, self.types):
+            raise ProtocolError(f'Invalid {name}')
+        if self.choices is not None and value not in self.choices:
+            raise ProtocolError(f'Invalid {name}')
+        if self.minimum is not None and value < self.minimum:
+            raise ProtocolError(f'Invalid {name}')
+        if self.max_length is not None and len(value) > self.max_length:
+            raise ProtocolError(f'{name} is too long')
+        if self.items is not None:
+            for item in value:
+                if not valid(item, self.items):
+                    raise ProtocolError(f'Invalid {name}')
+
+def validate(schema, message):
+    # Optional fields sent as null are removed, so handlers can read them
+    # with message.get(name, default)
+    for name, field in schema.items():
+        field.check(name, message.get(name))
+        if name in message and message[name] is None:
+            del message[name]
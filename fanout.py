@@ -0,0 +1,169 @@
+import asyncio
+import collections
+
+from aiohttp import WSCloseCode
+
+import codec
+import metrics
+
+# Frames a connection may have queued before the slow-consumer policy kicks in
+MAX_QUEUE = 256
+
+# Process-wide delivery counters, reported by /stats
+stats = {
+    'frames_sent': 0,
+    'frames_dropped': 0,
+    'coalesced': 0,
+    'snapshots_sent': 0,
+    'slow_disconnects': 0,
+    'send_errors': 0,
+    'bytes_sent': 0
+}
+
+connections = set()
+
+broadcast_seconds = metrics.histogram(
+    'auction_broadcast_seconds', 'Encoding a broadcast and queueing it for every recipient', label='type')
+broadcast_bytes = metrics.histogram(
+    'auction_broadcast_bytes', 'Encoded broadcast payload size', metrics.SIZE_BUCKETS, label='type')
+broadcast_recipients = metrics.histogram(
+    'auction_broadcast_recipients', 'Connections a broadcast was queued for', metrics.COUNT_BUCKETS, label='type')
+send_seconds = metrics.histogram('auction_send_seconds', 'Writing one frame to one websocket')
+
+class Connection:
+    # Outbound side of one websocket. Frames are pushed into a bounded queue
+    # that a dedicated writer task drains, so a slow client only ever delays
+    # itself. When the queue overflows, queued state frames are coalesced into
+    # a single snapshot built at send time; a client that overflows again
+    # before that snapshot has gone out is disconnected. Frames are already
+    # encoded with the connection's codec.
+    def __init__(self, ws, max_queue=MAX_QUEUE, codec=codec.JSON):
+        self.ws = ws
+        self.max_queue = max_queue
+        self.codec = codec
+        self.queue = collections.deque()
+        self.snapshot = None  # Callable returning the current room snapshot message
+        self.needs_snapshot = False
+        self.closed = False
+        self._ready = asyncio.Event()
+        self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+        connections.add(self)
+
+    @property
+    def backlog(self):
+        return len(self.queue)
+
+    def send_json(self, message):
+        self.send_frame(self.codec.encode(message))
+
+    def send_frame(self, frame, state=False):
+        # state=True marks versioned room deltas, which may be coalesced
+        if self.closed:
+            return
+        if state and self.needs_snapshot:
+            stats['coalesced'] += 1
+            return
+
+        if len(self.queue) >= self.max_queue:
+            if self.needs_snapshot or self.snapshot is None:
+                self._disconnect_slow()
+                return
+            self._coalesce()
+            if state:
+                stats['coalesced'] += 1
+                return
+            if len(self.queue) >= self.max_queue:
+                self._disconnect_slow()
+                return
+
+        self.queue.append((frame, state))
+        self._ready.set()
+
+    def _coalesce(self):
+        kept = collections.deque(item for item in self.queue if not item[1])
+        dropped = len(self.queue) - len(kept)
+        stats['frames_dropped'] += dropped
+        stats['coalesced'] += dropped
+        self.queue = kept
+        self.needs_snapshot = True
+        self._ready.set()
+
+    def _disconnect_slow(self):
+        stats['slow_disconnects'] += 1
+        stats['frames_dropped'] += len(self.queue)
+        self.queue.clear()
+        self.closed = True
+        self._ready.set()
+        connections.discard(self)
+        asyncio.ensure_future(self.ws.close(code=WSCloseCode.TRY_AGAIN_LATER, message=b'Too far behind'))
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                if not self.queue and not self.needs_snapshot:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                if self.needs_snapshot:
+                    self.needs_snapshot = False
+                    frame = self.codec.encode(self.snapshot())
+                    stats['snapshots_sent'] += 1
+                else:
+                    frame, _ = self.queue.popleft()
+
+                started = send_seconds.start()
+                if self.codec.binary:
+                    await self.ws.send_bytes(frame)
+                else:
+                    await self.ws.send_str(frame)
+                send_seconds.stop(started, bytes=len(frame), backlog=len(self.queue))
+                stats['frames_sent'] += 1
+                stats['bytes_sent'] += len(frame)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            stats['send_errors'] += 1
+            self.closed = True
+        finally:
+            connections.discard(self)
+
+    async def close(self):
+        self.closed = True
+        self._ready.set()
+        connections.discard(self)
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+
+def broadcast(conns, message, state=True, frames=None):
+    # Encode once per codec in use and hand the same frame to every
+    # recipient's queue. Returns {codec: frame}; pass it back in as frames
+    # to send the same message to more connections without re-encoding.
+    started = broadcast_seconds.start()
+    if frames is None:
+        frames = {}
+    for conn in conns:
+        frame = frames.get(conn.codec)
+        if frame is None:
+            frame = frames[conn.codec] = conn.codec.encode(message)
+        conn.send_frame(frame, state)
+    if started is not None:
+        label = message.get('type', '')
+        size = sum(len(frame) for frame in frames.values())
+        broadcast_seconds.stop(started, label, recipients=len(conns), bytes=size)
+        broadcast_bytes.observe(size, label, metrics.SAMPLE_EVERY)
+        broadcast_recipients.observe(len(conns), label, metrics.SAMPLE_EVERY)
+    return frames
+
+def report():
+    backlogs = [conn.backlog for conn in connections]
+    return dict(
+        stats,
+        connections=len(backlogs),
+        backlog_total=sum(backlogs),
+        backlog_max=max(backlogs, default=0)
+    )
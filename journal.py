@@ -0,0 +1,267 @@
+import asyncio
+import glob
+import json
+import os
+import re
+import time
+
+# How long the writer lets records accumulate before one write + fsync
+FLUSH_INTERVAL = 0.05
+
+# A snapshot is taken on whichever comes first, bounding replay on restore
+SNAPSHOT_INTERVAL = 60
+SNAPSHOT_EVERY = 20000
+
+SEGMENT_PATTERN = re.compile(r'^(journal|snapshot)-(\d+)\.(log|json)$')
+
+def encode(record):
+    return (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+def apply_ops(state, ops):
+    # Same patch semantics as the client applies to room deltas
+    for op in ops:
+        path = op[1]
+        target = state
+        for key in path[:-1]:
+            target = target[key]
+        if op[0] == 'set':
+            target[path[-1]] = op[2]
+        elif op[0] == 'append':
+            target[path[-1]].append(op[2])
+        elif op[0] == 'del':
+            target.pop(path[-1], None)
+
+class Journal:
+    # Write-behind log of committed room changes. Every commit appends one
+    # line per room (seq = room version) to an in-memory buffer; a background
+    # task writes and fsyncs the buffer in batches, so command handlers never
+    # wait on disk. Periodically the writer rotates to a new log segment and
+    # writes a snapshot of every room alongside it; older segments and
+    # snapshots are then deleted. Restore = latest snapshot + later segments.
+    #
+    # Files in directory:
+    #   snapshot-N.json  every room's state before any record in journal-N.log
+    #   journal-N.log    one JSON record per line:
+    #                    {"room", "seq", "event", "ops"}  a committed change
+    #                    {"room", "seq", "state"}         a room's full state
+    #                    {"room", "drop": true}           room closed
+    #   archive/CODE-T.json  final state of a room evicted for being idle
+    def __init__(self, directory, flush_interval=FLUSH_INTERVAL, snapshot_interval=SNAPSHOT_INTERVAL,
+                 snapshot_every=SNAPSHOT_EVERY, fsync=True):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.index = 0
+        self.rooms = None
+        self.stats = {'records': 0, 'flushes': 0, 'snapshots': 0, 'bytes': 0}
+        self._buffer = []
+        self._since_snapshot = 0
+        self._encoded = {}  # room_code -> (version, encoded state) for unchanged rooms
+        self._file = None
+        self._ready = asyncio.Event()
+        self._task = None
+        self._closing = False
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+    def append(self, room_code, seq, event, ops):
+        if self._task is None:
+            return
+        # Encoded now: ops reference live room objects that keep changing
+        self._push(encode({'room': room_code, 'seq': seq, 'event': event, 'ops': ops}))
+
+    def record_state(self, room_code, seq, state):
+        if self._task is None:
+            return
+        self._push(encode({'room': room_code, 'seq': seq, 'state': state}))
+
+    def drop(self, room_code):
+        if self._task is None:
+            return
+        self._encoded.pop(room_code, None)
+        self._push(encode({'room': room_code, 'drop': True}))
+
+    async def archive(self, room_code, state):
+        # Keep an evicted room's final state outside the replayed files
+        path = os.path.join(self.directory, 'archive', f'{room_code}-{int(time.time())}.json')
+        data = json.dumps(state, separators=(',', ':')).encode('utf-8')
+        await asyncio.get_running_loop().run_in_executor(None, self._write_atomic, path, data)
+        self.drop(room_code)
+
+    def archived(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'archive', '*.json')))
+
+    async def read_archived(self, path):
+        return await asyncio.get_running_loop().run_in_executor(None, self._read_json, path)
+
+    @staticmethod
+    def _read_json(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _push(self, line):
+        self._buffer.append(line)
+        self._since_snapshot += 1
+        self.stats['records'] += 1
+        self._ready.set()
+
+    # Restore
+
+    def _files(self, kind):
+        found = []
+        for path in glob.glob(os.path.join(self.directory, f'{kind}-*')):
+            match = SEGMENT_PATTERN.match(os.path.basename(path))
+            if match and match.group(1) == kind:
+                found.append((int(match.group(2)), path))
+        return sorted(found)
+
+    def restore(self):
+        # Returns {room_code: state} with each state in AuctionRoom.to_dict() shape
+        os.makedirs(self.directory, exist_ok=True)
+        states = {}
+        base = 0
+        for index, path in reversed(self._files('snapshot')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    states = json.load(f)['rooms']
+                base = index
+                break
+            except (OSError, ValueError, KeyError):
+                continue  # Torn snapshot; fall back to an older one
+
+        segments = [(i, p) for i, p in self._files('journal') if i >= base]
+        for _, path in segments:
+            self._replay(path, states)
+
+        self.index = max([base] + [i for i, _ in segments] + [i for i, _ in self._files('snapshot')])
+        return states
+
+    def _replay(self, path, states):
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn tail from a crash mid-write
+                code = record['room']
+                if record.get('drop'):
+                    states.pop(code, None)
+                elif 'state' in record:
+                    states[code] = record['state']
+                else:
+                    state = states.get(code)
+                    if state is None or record['seq'] <= state['version']:
+                        continue  # Already covered by the snapshot
+                    apply_ops(state, record['ops'])
+                    state['version'] = record['seq']
+
+    # Writer
+
+    def start(self, rooms):
+        # rooms: live {room_code: AuctionRoom}; snapshotted via version/state()
+        self.rooms = rooms
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        # Flush what is buffered and leave a fresh snapshot for a fast restart
+        if self._task is None:
+            return
+        # Let the writer finish any batch it is in the middle of
+        self._closing = True
+        self._ready.set()
+        await self._task
+        self._task = None
+        lines, self._buffer = self._buffer, []
+        self._write_snapshot(lines, self._capture())
+        self._file.close()
+        self._file = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_snapshot = loop.time()  # First pass compacts whatever restore read
+        while True:
+            if not self._buffer:
+                self._ready.clear()
+                try:
+                    await asyncio.wait_for(self._ready.wait(), max(0, next_snapshot - loop.time()))
+                except asyncio.TimeoutError:
+                    pass
+            if self._buffer and not self._closing:
+                # Let a burst of commits share one write + fsync
+                await asyncio.sleep(self.flush_interval)
+
+            # Taking the lines and capturing state in one step, with no await
+            # between, keeps the snapshot consistent with the segment it closes
+            lines, self._buffer = self._buffer, []
+            if loop.time() >= next_snapshot or self._since_snapshot >= self.snapshot_every:
+                snapshot = self._capture()
+                await loop.run_in_executor(None, self._write_snapshot, lines, snapshot)
+                next_snapshot = loop.time() + self.snapshot_interval
+            elif lines:
+                await loop.run_in_executor(None, self._write, lines)
+
+            if self._closing:
+                return
+
+    def _capture(self):
+        self._since_snapshot = 0
+        parts = []
+        for code, room in self.rooms.items():
+            cached = self._encoded.get(code)
+            if cached is None or cached[0] != room.version:
+                cached = (room.version, json.dumps(room.state(), separators=(',', ':')))
+                self._encoded[code] = cached
+            parts.append(json.dumps(code) + ':' + cached[1])
+        for code in set(self._encoded) - set(self.rooms):
+            del self._encoded[code]
+        return ('{"rooms":{' + ','.join(parts) + '}}').encode('utf-8')
+
+    def _sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+            self._sync(f)
+        os.replace(path + '.tmp', path)
+
+    def _write(self, lines):
+        data = b''.join(lines)
+        self._file.write(data)
+        self._sync(self._file)
+        self.stats['flushes'] += 1
+        self.stats['bytes'] += len(data)
+
+    def _write_snapshot(self, lines, snapshot):
+        if self._file is not None:
+            if lines:
+                self._write(lines)
+            self._file.close()
+
+        self.index += 1
+        self._write_atomic(os.path.join(self.directory, f'snapshot-{self.index:06d}.json'), snapshot)
+        self._file = open(os.path.join(self.directory, f'journal-{self.index:06d}.log'), 'ab')
+        if self.fsync and hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self.directory, os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        self.stats['snapshots'] += 1
+
+        # The new snapshot covers everything older
+        for kind in ('journal', 'snapshot'):
+            for index, old in self._files(kind):
+                if index < self.index:
+                    os.remove(old)
@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+
+import fanout
+
+# Subscribers receive accumulated lobby changes at most this often
+FLUSH_INTERVAL = 0.5
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Summary fields a subscriber may filter on
+FILTER_FIELDS = ('auction_mode', 'status')
+
+def matches(summary, filters):
+    if summary is None:
+        return False
+    return all(value is None or summary.get(key) == value for key, value in zip(FILTER_FIELDS, filters))
+
+def parse_filters(data):
+    return tuple(data.get(key) or None for key in FILTER_FIELDS)
+
+def page_bounds(data):
+    offset = max(0, int(data.get('offset', 0)))
+    limit = max(1, min(MAX_PAGE_SIZE, int(data.get('limit', PAGE_SIZE))))
+    return offset, limit
+
+class LobbyIndex:
+    # Room summaries for the lobby, kept current as rooms change instead of
+    # being rebuilt per request. Entries are bucketed by each filter field
+    # so filtered pages only walk matching rooms, newest first (for status,
+    # most recently entering that status first). Subscribed
+    # connections get the changes since the previous flush, batched every
+    # FLUSH_INTERVAL and encoded once per distinct filter.
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.entries = {}  # room_code -> summary, in creation order
+        self.owners = {}  # room_code -> shard index for rooms hosted elsewhere
+        self.buckets = {key: {} for key in FILTER_FIELDS}  # field -> value -> {room_code: None}
+        self.subscribers = {}  # Connection -> filters
+        self._flushed = {}  # room_code -> summary as subscribers last saw it
+        self._pending = {}  # room_code -> None, in change order
+        self._task = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, summary, owner=None):
+        code = summary['room_code']
+        previous = self.entries.get(code)
+        if previous == summary:
+            return
+        self.entries[code] = summary
+        for key in FILTER_FIELDS:
+            # Moved only when the field changes, so a bucket stays in the
+            # order rooms entered it rather than the order they last changed
+            if previous is None or previous.get(key) != summary.get(key):
+                if previous is not None:
+                    self._unbucket(code, key, previous.get(key))
+                self.buckets[key].setdefault(summary.get(key), {})[code] = None
+        if owner is None:
+            self.owners.pop(code, None)
+        else:
+            self.owners[code] = owner
+        self._pending[code] = None
+
+    def remove(self, room_code):
+        previous = self.entries.pop(room_code, None)
+        if previous is None:
+            return
+        for key in FILTER_FIELDS:
+            self._unbucket(room_code, key, previous.get(key))
+        self.owners.pop(room_code, None)
+        self._pending[room_code] = None
+
+    def _unbucket(self, code, key, value):
+        bucket = self.buckets[key].get(value)
+        if bucket is not None:
+            bucket.pop(code, None)
+            if not bucket:
+                del self.buckets[key][value]
+
+    def replace_shard(self, owner, summaries):
+        # Reconcile with the full room list another shard published
+        seen = set()
+        for summary in summaries:
+            seen.add(summary['room_code'])
+            self.update(summary, owner)
+        for code in [code for code, shard in self.owners.items() if shard == owner and code not in seen]:
+            self.remove(code)
+
+    def local_summaries(self):
+        return [summary for code, summary in self.entries.items() if code not in self.owners]
+
+    def query(self, filters=(None, None), offset=0, limit=PAGE_SIZE):
+        # Returns (page, total matching) with the newest rooms first
+        active = [(key, value) for key, value in zip(FILTER_FIELDS, filters) if value is not None]
+        if len(active) <= 1:
+            # Every room in the bucket matches: slice it without a scan
+            candidates = self.buckets[active[0][0]].get(active[0][1], {}) if active else self.entries
+            codes = itertools.islice(reversed(candidates), offset, offset + limit)
+            return [self.entries[code] for code in codes], len(candidates)
+
+        smallest = min((self.buckets[key].get(value, {}) for key, value in active), key=len)
+        codes = [code for code in reversed(smallest) if matches(self.entries[code], filters)]
+        return [self.entries[code] for code in codes[offset:offset + limit]], len(codes)
+
+    # Subscriptions
+
+    def subscribe(self, conn, filters):
+        self.subscribers[conn] = filters
+
+    def unsubscribe(self, conn):
+        self.subscribers.pop(conn, None)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        changes = []
+        for code in self._pending:
+            changes.append((code, self._flushed.get(code), self.entries.get(code)))
+            if code in self.entries:
+                self._flushed[code] = self.entries[code]
+            else:
+                self._flushed.pop(code, None)
+        self._pending = {}
+
+        groups = {}
+        for conn, filters in list(self.subscribers.items()):
+            if conn.closed:
+                del self.subscribers[conn]
+            else:
+                groups.setdefault(filters, []).append(conn)
+
+        for filters, conns in groups.items():
+            events = []
+            for code, before, after in changes:
+                was, now = matches(before, filters), matches(after, filters)
+                if now:
+                    events.append({'event': 'room_changed' if was else 'room_added', 'room': after})
+                elif was:
+                    events.append({'event': 'room_removed', 'room_code': code})
+            if events:
+                fanout.broadcast(conns, {'type': 'lobby_events', 'events': events}, state=False)
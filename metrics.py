@@ -0,0 +1,179 @@
+import asyncio
+import bisect
+import json
+import os
+import time
+
+# Time (and size) one in every SAMPLE_EVERY events per histogram; each sample
+# is counted SAMPLE_EVERY times, so rates and averages stay right. 1 = all.
+SAMPLE_EVERY = max(1, int(os.environ.get('AUCTION_METRICS_SAMPLE', 1)))
+
+# With AUCTION_TRACE set, every sampled event is also written to that file
+# as one JSON line
+TRACE_PATH = os.environ.get('AUCTION_TRACE')
+
+LAG_INTERVAL = 0.25
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+BOUND = 'le="%s"'
+
+registry = []
+_trace_buffer = []
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def series_name(name, label_name, label, extra=''):
+    labels = [f'{label_name}="{escape(label)}"'] if label_name else []
+    if extra:
+        labels.append(extra)
+    return f'{name}{{{",".join(labels)}}}' if labels else name
+
+class Histogram:
+    # Bucketed observations per label value. Call start() on the hot path:
+    # it returns a start time for sampled events and None for the rest, so
+    # unsampled events cost a decrement.
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, label=None):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label = label
+        self.series = {}  # label value -> [count per bucket..., +Inf count, sum]
+        self._countdown = 1
+
+    def start(self):
+        self._countdown -= 1
+        if self._countdown:
+            return None
+        self._countdown = SAMPLE_EVERY
+        return time.perf_counter()
+
+    def stop(self, started, label='', **context):
+        # Observe the time since start(); returns it, or None if unsampled
+        if started is None:
+            return None
+        elapsed = time.perf_counter() - started
+        self.observe(elapsed, label, SAMPLE_EVERY)
+        if TRACE_PATH:
+            trace(self.name, label, elapsed, context)
+        return elapsed
+
+    def observe(self, value, label='', weight=1):
+        series = self.series.get(label)
+        if series is None:
+            series = self.series[label] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += weight
+        series[-1] += value * weight
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} histogram')
+        bucket = self.name + '_bucket'
+        for label, series in self.series.items():
+            total = 0
+            for bound, count in zip(self.buckets, series):
+                total += count
+                lines.append(f'{series_name(bucket, self.label, label, BOUND % bound)} {total}')
+            total += series[-2]
+            lines.append(f'{series_name(bucket, self.label, label, BOUND % "+Inf")} {total}')
+            lines.append(f'{series_name(self.name + "_sum", self.label, label)} {series[-1]:.6f}')
+            lines.append(f'{series_name(self.name + "_count", self.label, label)} {total}')
+
+class Counter:
+    # Exact counts per label value; not sampled
+    def __init__(self, name, help, label=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values = {}
+
+    def inc(self, label='', amount=1):
+        self.values[label] = self.values.get(label, 0) + amount
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} counter')
+        for label, value in self.values.items():
+            lines.append(f'{series_name(self.name, self.label, label)} {value}')
+
+class Callback:
+    # A gauge or counter whose value is read at scrape time
+    def __init__(self, name, help, kind, read):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.read = read
+
+    def render(self, lines):
+        lines.append(f'# HELP {self.name} {self.help}')
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        lines.append(f'{self.name} {self.read()}')
+
+def histogram(name, help, buckets=LATENCY_BUCKETS, label=None):
+    metric = Histogram(name, help, buckets, label)
+    registry.append(metric)
+    return metric
+
+def counter(name, help, label=None):
+    metric = Counter(name, help, label)
+    registry.append(metric)
+    return metric
+
+def gauge_func(name, help, read):
+    registry.append(Callback(name, help, 'gauge', read))
+
+def counter_func(name, help, read):
+    registry.append(Callback(name, help, 'counter', read))
+
+def render():
+    lines = []
+    for metric in registry:
+        metric.render(lines)
+    lines.append('')
+    return '\n'.join(lines)
+
+# Trace log
+
+def trace(metric, label, elapsed, context):
+    record = {'ts': round(time.time(), 6), 'metric': metric, 'ms': round(elapsed * 1000, 3)}
+    if label:
+        record['label'] = label
+    record.update(context)
+    _trace_buffer.append(json.dumps(record, separators=(',', ':')) + '\n')
+
+def _write_trace(lines):
+    with open(TRACE_PATH, 'a', encoding='utf-8') as f:
+        f.writelines(lines)
+
+async def flush_trace():
+    global _trace_buffer
+    if not _trace_buffer:
+        return
+    lines, _trace_buffer = _trace_buffer, []
+    await asyncio.get_running_loop().run_in_executor(None, _write_trace, lines)
+
+# Event-loop lag
+
+loop_lag = histogram('auction_event_loop_lag_seconds', 'How late the event loop woke a sleeping task')
+last_lag = 0.0
+gauge_func('auction_event_loop_lag_last_seconds', 'Event-loop lag at the latest check', lambda: f'{last_lag:.6f}')
+
+async def monitor(interval=LAG_INTERVAL):
+    # Measures loop lag and writes out the trace buffer; runs for the life of the app
+    global last_lag
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            last_lag = max(0.0, loop.time() - expected)
+            loop_lag.observe(last_lag)
+            if TRACE_PATH:
+                await flush_trace()
+    finally:
+        if TRACE_PATH and _trace_buffer:
+            _write_trace(_trace_buffer)
+            _trace_buffer.clear()
@@ -0,0 +1,142 @@
+import csv
+import heapq
+import io
+import json
+
+from aiohttp import web
+
+# Most expensive buys kept in a room summary
+TOP_BUYS = 10
+
+# Export rows buffered before each write to the response
+CHUNK_ROWS = 200
+
+FIELDS = ('room_code', 'player_id', 'name', 'role', 'nationality', 'status', 'base_price', 'price', 'premium',
+          'team', 'team_name')
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+class RoomSummary:
+    # A room's results so far, updated on every settled lot instead of
+    # recomputed from the rosters: spend and buys per role and per team, the
+    # premium paid over base price, and the most expensive buys (a bounded
+    # min-heap). as_dict() is cached until the next lot settles.
+    def __init__(self):
+        self.spend_by_role = {}
+        self.bought_by_role = {}
+        self.spend_by_team = {}
+        self.sold = 0
+        self.unsold = 0
+        self.spend = 0.0
+        self.premium = 0.0
+        self.top_buys = []  # (price, seq, entry)
+        self._seq = 0
+        self._cached = None
+
+    @classmethod
+    def from_state(cls, auction_state, catalog):
+        # Rebuilt once from a restored room's results
+        summary = cls()
+        for sale in auction_state['sold_players']:
+            summary.record_sale(catalog.get(sale['id']), sale['price'], sale['winner'], sale['winner_team'])
+        for _ in auction_state['unsold_players']:
+            summary.record_unsold()
+        return summary
+
+    def record_sale(self, lot, price, team_name, team):
+        role = lot['role']
+        premium = price - lot['basePrice']
+        self.spend_by_role[role] = round(self.spend_by_role.get(role, 0) + price, 2)
+        self.bought_by_role[role] = self.bought_by_role.get(role, 0) + 1
+        self.spend_by_team[team] = round(self.spend_by_team.get(team, 0) + price, 2)
+        self.sold += 1
+        self.spend = round(self.spend + price, 2)
+        self.premium = round(self.premium + premium, 2)
+
+        self._seq += 1
+        entry = (price, self._seq, {
+            'id': lot['id'], 'name': lot['name'], 'role': role, 'price': price,
+            'premium': round(premium, 2), 'team': team, 'team_name': team_name
+        })
+        if len(self.top_buys) < TOP_BUYS:
+            heapq.heappush(self.top_buys, entry)
+        elif entry[:2] > self.top_buys[0][:2]:
+            heapq.heapreplace(self.top_buys, entry)
+        self._cached = None
+
+    def record_unsold(self):
+        self.unsold += 1
+        self._cached = None
+
+    def as_dict(self, players):
+        # players: the room's player_id -> Team (at most 10), for purses
+        if self._cached is None:
+            self._cached = {
+                'sold': self.sold,
+                'unsold': self.unsold,
+                'spend': self.spend,
+                'premium': self.premium,
+                'spend_by_role': self.spend_by_role,
+                'bought_by_role': self.bought_by_role,
+                'top_buys': [entry for _, _, entry in sorted(self.top_buys, reverse=True)]
+            }
+        return dict(self._cached, teams=[{
+            'team': team.team,
+            'name': team.name,
+            'purse': team.purse,
+            'spent': self.spend_by_team.get(team.team, 0),
+            'players': len(team.players)
+        } for team in players.values()])
+
+def result_rows(room_code, auction_state, catalog):
+    # One row per settled lot: sales, then lots that went unsold
+    for sale in auction_state['sold_players']:
+        lot = catalog.get(sale['id'])
+        yield {
+            'room_code': room_code, 'player_id': lot['id'], 'name': lot['name'], 'role': lot['role'],
+            'nationality': lot.get('nationality_key'), 'status': 'sold', 'base_price': lot['basePrice'],
+            'price': sale['price'], 'premium': round(sale['price'] - lot['basePrice'], 2),
+            'team': sale['winner_team'], 'team_name': sale['winner']
+        }
+    for entry in auction_state['unsold_players']:
+        lot = catalog.get(entry['id'])
+        yield {
+            'room_code': room_code, 'player_id': lot['id'], 'name': lot['name'], 'role': lot['role'],
+            'nationality': lot.get('nationality_key'), 'status': 'unsold', 'base_price': lot['basePrice'],
+            'price': None, 'premium': None, 'team': None, 'team_name': None
+        }
+
+async def stream_results(request, results, catalog, fmt):
+    # results: async iterable of (room_code, auction_state). Rows are written
+    # CHUNK_ROWS at a time as a chunked response, so only one room and one
+    # chunk are held at once.
+    response = web.StreamResponse(headers={
+        'Content-Type': FORMATS[fmt],
+        'Content-Disposition': f'attachment; filename="results.{fmt}"'
+    })
+    response.enable_chunked_encoding()
+    await response.prepare(request)
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, FIELDS, lineterminator='\n') if fmt == 'csv' else None
+    if writer:
+        writer.writeheader()
+    rows = 0
+    async for room_code, auction_state in results:
+        for row in result_rows(room_code, auction_state, catalog):
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, separators=(',', ':')) + '\n')
+            rows += 1
+            if rows % CHUNK_ROWS == 0:
+                await response.write(buffer.getvalue().encode('utf-8'))
+                buffer.seek(0)
+                buffer.truncate()
+    if buffer.tell():
+        await response.write(buffer.getvalue().encode('utf-8'))
+    await response.write_eof()
+    return response
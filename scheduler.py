@@ -0,0 +1,75 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class Scheduler:
+    # Single driver task for every room clock in the process. Entries are
+    # keyed (one live deadline per key, e.g. per room code); rescheduling or
+    # cancelling just bumps the key's generation and the stale heap entry is
+    # skipped when it surfaces, so both operations are O(log n).
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []
+        self._live = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def schedule(self, key, delay, callback):
+        when = self.clock() + max(0, delay)
+        generation = next(self._counter)
+        self._live[key] = generation
+        heapq.heappush(self._heap, (when, generation, key, callback))
+        self._compact()
+        # Wake the driver if this deadline is now the earliest one
+        if self._heap[0][1] == generation:
+            self._wakeup.set()
+        self._ensure_running()
+        return when
+
+    def cancel(self, key):
+        self._live.pop(key, None)
+        self._compact()
+
+    def _compact(self):
+        # Stale entries otherwise sit in the heap until their time comes,
+        # keeping their callbacks (and the rooms those reference) alive.
+        # Rebuild once they outnumber live ones; amortized O(1) per call.
+        if len(self._heap) > 2 * len(self._live) + 64:
+            self._heap = [entry for entry in self._heap if self._live.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._live)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = self.clock()
+            while self._heap and self._heap[0][0] <= now:
+                _, generation, key, callback = heapq.heappop(self._heap)
+                if self._live.get(key) != generation:
+                    continue  # Cancelled or rescheduled
+                del self._live[key]
+                asyncio.ensure_future(callback())
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,377 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import secrets
+import shutil
+import signal
+import socket
+import tempfile
+import zlib
+from urllib.parse import parse_qs, urlsplit
+
+# How often a worker republishes its room list (only when it has changed)
+PUBLISH_INTERVAL = 1.0
+
+# A connection that has not sent its request line by then is dropped
+ROUTE_TIMEOUT = 5.0
+MAX_REQUEST_LINE = 8192
+
+# Room lists for a busy shard run well past asyncio's default 64 KiB line limit
+BUS_LINE_LIMIT = 16 * 1024 * 1024
+
+def shard_for(room_code, count):
+    return zlib.crc32(room_code.encode('utf-8')) % count
+
+def bus_path(run_dir):
+    return os.path.join(run_dir, 'bus.sock')
+
+def handoff_path(run_dir, index):
+    return os.path.join(run_dir, f'worker-{index}.sock')
+
+class LocalBus:
+    # In-process pub/sub. Used as-is when the server runs as a single
+    # process; SocketBus has the same interface and could be swapped for an
+    # external broker.
+    def __init__(self):
+        self.handlers = {}
+
+    def subscribe(self, topic, handler):
+        self.handlers.setdefault(topic, []).append(handler)
+
+    def publish(self, topic, message):
+        self.deliver(topic, message)
+
+    def deliver(self, topic, message):
+        for handler in self.handlers.get(topic, ()):
+            handler(message)
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+class SocketBus(LocalBus):
+    # Newline-delimited JSON over the front process's Unix socket. The hub
+    # relays each message to every other member, so publishers do not hear
+    # their own messages.
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._writer = None
+        self._reader = None
+
+    async def connect(self, timeout=30):
+        # Workers may start before the front's hub is listening
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path, limit=BUS_LINE_LIMIT)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if loop.time() > deadline:
+                    raise
+                await asyncio.sleep(0.05)
+        self._reader = asyncio.get_running_loop().create_task(self._read(reader))
+
+    def publish(self, topic, message):
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(json.dumps({'topic': topic, 'message': message}).encode('utf-8') + b'\n')
+
+    async def _read(self, reader):
+        async for line in reader:
+            envelope = json.loads(line)
+            self.deliver(envelope['topic'], envelope['message'])
+
+    async def close(self):
+        if self._reader:
+            self._reader.cancel()
+        if self._writer:
+            self._writer.close()
+
+class BusHub:
+    # Runs in the front process: relays every line from one member to all
+    # the others, and hands decoded messages to the front's own subscribers.
+    def __init__(self, path):
+        self.path = path
+        self.bus = LocalBus()
+        self.members = set()
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_unix_server(self._serve, self.path, limit=BUS_LINE_LIMIT)
+
+    async def _serve(self, reader, writer):
+        self.members.add(writer)
+        try:
+            async for line in reader:
+                for member in self.members:
+                    if member is not writer:
+                        member.write(line)
+                envelope = json.loads(line)
+                self.bus.deliver(envelope['topic'], envelope['message'])
+        except (asyncio.CancelledError, ConnectionError):
+            pass  # Front shutting down or the worker went away
+        finally:
+            self.members.discard(writer)
+            writer.close()
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+        for writer in list(self.members):
+            writer.close()
+
+class Shard:
+    # This process's slice of the room space. A room lives on the shard its
+    # code hashes to, so codes are unique across shards without any locking;
+    # the bus only carries each shard's room list for the lobby.
+    def __init__(self, index=0, count=1, bus=None):
+        self.index = index
+        self.count = count
+        self.bus = bus or LocalBus()
+        self._published = None
+        self._task = None
+
+    def owns(self, room_code):
+        return self.count == 1 or shard_for(room_code, self.count) == self.index
+
+    def new_room_code(self, taken):
+        # About `count` draws on average
+        while True:
+            code = secrets.token_hex(3).upper()
+            if code not in taken and self.owns(code):
+                return code
+
+    def start(self, summaries, on_remote_rooms):
+        # summaries: callable returning this shard's room list
+        # on_remote_rooms(shard_index, rooms): another shard's full room list
+        def receive(message):
+            if message['shard'] != self.index:
+                on_remote_rooms(message['shard'], message['rooms'])
+
+        if self.count > 1:
+            self.bus.subscribe('rooms', receive)
+            self._task = asyncio.get_running_loop().create_task(self._publish_loop(summaries))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.bus.close()
+
+    async def _publish_loop(self, summaries):
+        while True:
+            rooms = summaries()
+            if rooms != self._published:
+                self._published = rooms
+                self.bus.publish('rooms', {'shard': self.index, 'rooms': rooms})
+            await asyncio.sleep(PUBLISH_INTERVAL)
+
+# Worker side
+
+async def accept_handoffs(server, path):
+    # Serve connections the front process accepted and passed over `path`.
+    # server: an aiohttp protocol factory (AppRunner.server). Returns when
+    # the front closes the channel or the task is cancelled.
+    loop = asyncio.get_running_loop()
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+    listener.setblocking(False)
+    try:
+        channel, _ = await loop.sock_accept(listener)
+    finally:
+        listener.close()
+    channel.setblocking(False)
+
+    done = loop.create_future()
+
+    def finish():
+        if not done.done():
+            done.set_result(None)
+
+    def on_readable():
+        while True:
+            try:
+                data, fds, _, _ = socket.recv_fds(channel, 1, 16)
+            except BlockingIOError:
+                return
+            except OSError:
+                finish()
+                return
+            if not data:
+                finish()
+                return
+            for fd in fds:
+                sock = socket.socket(fileno=fd)
+                sock.setblocking(False)
+                loop.create_task(loop.connect_accepted_socket(server, sock))
+
+    loop.add_reader(channel.fileno(), on_readable)
+    try:
+        await done
+    finally:
+        loop.remove_reader(channel.fileno())
+        channel.close()
+
+# Front side
+
+class Router:
+    # Picks the worker for each new connection from its HTTP request line.
+    # /ws?room=CODE and /api/rooms/CODE/... go to the room's shard; /ws
+    # without a room (create or browse) goes to the shard with the fewest
+    # rooms; /metrics, /stats and /api/results with ?shard=N go to worker N;
+    # anything else is shard-agnostic and goes round-robin. Connections are
+    # routed once, so workers close them after each HTTP response.
+    def __init__(self, count, bus):
+        self.count = count
+        self.load = [0] * count
+        self.pending = [0] * count  # Room-less sockets routed since the shard last reported
+        self._next = 0
+        bus.subscribe('rooms', self._on_rooms)
+
+    def _on_rooms(self, message):
+        self.load[message['shard']] = len(message['rooms'])
+        self.pending[message['shard']] = 0
+
+    def route(self, request_line):
+        parts = request_line.split(' ')
+        url = urlsplit(parts[1] if len(parts) > 1 else '/')
+        if url.path == '/ws':
+            room = parse_qs(url.query).get('room')
+            if room:
+                return shard_for(room[0], self.count)
+            index = min(range(self.count), key=lambda i: (self.load[i] + self.pending[i], i))
+            self.pending[index] += 1
+            return index
+        if url.path.startswith('/api/rooms/'):
+            # Room results live on the room's worker
+            return shard_for(url.path.split('/')[3], self.count)
+        if url.path in ('/metrics', '/stats', '/api/results'):
+            # Per-worker endpoints: ?shard=N picks the worker to report
+            shard = parse_qs(url.query).get('shard')
+            if shard and shard[0].isdigit() and int(shard[0]) < self.count:
+                return int(shard[0])
+        self._next = (self._next + 1) % self.count
+        return self._next
+
+async def peek_request_line(sock):
+    # Read the request line without consuming it, so the worker still sees
+    # the complete request
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ROUTE_TIMEOUT
+    while loop.time() < deadline:
+        try:
+            data = sock.recv(MAX_REQUEST_LINE, socket.MSG_PEEK)
+        except BlockingIOError:
+            data = None
+        except OSError:
+            return None
+        if data is not None:
+            if not data:
+                return None
+            end = data.find(b'\r\n')
+            if end >= 0:
+                return data[:end].decode('latin-1')
+            if len(data) >= MAX_REQUEST_LINE:
+                return None
+        await asyncio.sleep(0.002)
+    return None
+
+async def serve_front(host, port, channels, router):
+    loop = asyncio.get_running_loop()
+    listener = socket.create_server((host, port), backlog=1024)
+    listener.setblocking(False)
+
+    async def hand_off(sock):
+        try:
+            line = await peek_request_line(sock)
+            if line is not None:
+                socket.send_fds(channels[router.route(line)], [b'c'], [sock.fileno()])
+        finally:
+            sock.close()  # The worker holds its own duplicate
+
+    try:
+        while True:
+            sock, _ = await loop.sock_accept(listener)
+            loop.create_task(hand_off(sock))
+    finally:
+        listener.close()
+
+async def connect_channel(path, timeout=30):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        channel = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            channel.connect(path)
+            return channel
+        except (FileNotFoundError, ConnectionRefusedError):
+            channel.close()
+            if loop.time() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+async def wait_for_exit(processes, timeout):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while any(process.is_alive() for process in processes) and loop.time() < deadline:
+        await asyncio.sleep(0.1)
+
+async def run_front_async(host, port, processes, run_dir, shutdown_timeout):
+    # SIGINT or SIGTERM is passed on to every worker as SIGTERM: the first
+    # starts their drain, a second cuts it short. The front keeps routing
+    # until the workers have exited, so players can still reconnect to rooms
+    # that are finishing.
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+
+    def on_signal():
+        stop.set()
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, on_signal)
+
+    hub = BusHub(bus_path(run_dir))
+    await hub.start()
+    router = Router(len(processes), hub.bus)
+    channels = [await connect_channel(handoff_path(run_dir, index)) for index in range(len(processes))]
+    front = loop.create_task(serve_front(host, port, channels, router))
+    try:
+        await stop.wait()
+        await wait_for_exit(processes, shutdown_timeout)
+    finally:
+        front.cancel()
+        # Closing a channel tells a worker still running to shut down
+        for channel in channels:
+            channel.close()
+        await hub.close()
+
+def run_front(host, port, count, target, shutdown_timeout=10):
+    # Spawns `count` workers running target(index, count, run_dir) and routes
+    # every incoming connection to one of them by passing the accepted
+    # socket over a Unix socket. The front never touches the traffic itself.
+    # Workers get shutdown_timeout seconds to drain after a signal.
+    run_dir = tempfile.mkdtemp(prefix='auction-')
+    processes = [multiprocessing.Process(target=target, args=(index, count, run_dir), daemon=True)
+                 for index in range(count)]
+    # Started before this process has an event loop, so forked workers
+    # begin with a clean asyncio state
+    for process in processes:
+        process.start()
+    try:
+        asyncio.run(run_front_async(host, port, processes, run_dir, shutdown_timeout))
+    finally:
+        # Workers are writing their journals; don't abort that half way
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for process in processes:
+            process.join(10)
+            if process.is_alive():
+                process.kill()
+        shutil.rmtree(run_dir, ignore_errors=True)
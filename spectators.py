@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+import codec
+import fanout
+import metrics
+
+# Spectators get at most one update per room per FRAME_INTERVAL, however
+# busy the room is
+FRAME_INTERVAL = 0.25
+
+# Connections handed frames per event-loop turn during a flush; between
+# chunks bidder commands and broadcasts get to run
+CHUNK_SIZE = 256
+
+# Spectators fall behind to a snapshot sooner than bidders do
+SPECTATOR_QUEUE = 16
+
+MAX_SPECTATORS = 5000
+
+flush_seconds = metrics.histogram('auction_spectator_flush_seconds', 'Building and queueing one spectator frame')
+
+def snapshot_message(room):
+    return {'type': 'spectating', 'room_code': room.room_code, 'room_data': room.to_dict()}
+
+class Stream:
+    __slots__ = ('conns', 'joining', 'version', 'pending_version', 'ops', 'events', 'gap')
+
+    def __init__(self):
+        self.conns = set()
+        self.joining = set()  # Get a snapshot at the next flush, then the stream
+        self.version = None  # Room version spectators are at
+        self.pending_version = None  # Latest version published in this window
+        self.ops = []
+        self.events = []
+        self.gap = False
+
+class SpectatorTier:
+    # Read-only watchers, kept off the bidders' per-room broadcast path. A
+    # room's versioned broadcasts are collected per window and, every
+    # FRAME_INTERVAL, merged into one compacted delta that is encoded once
+    # and shared by every spectator of the room. New spectators get their
+    # snapshot at the next flush, so a crowd joining at once costs a single
+    # snapshot. If the stream misses a version, everyone gets a snapshot.
+    def __init__(self, lookup, compact, interval=FRAME_INTERVAL, chunk_size=CHUNK_SIZE):
+        # lookup(room_code): the live room or None; compact(ops): patch compaction
+        self.lookup = lookup
+        self.compact = compact
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.streams = {}  # room_code -> Stream
+        self.watching = {}  # Connection -> room_code
+        self._task = None
+
+    def __len__(self):
+        return len(self.watching)
+
+    def count(self, room_code):
+        stream = self.streams.get(room_code)
+        return len(stream.conns) + len(stream.joining) if stream else 0
+
+    def watch(self, room, conn):
+        room_code = room.room_code
+        if self.count(room_code) >= MAX_SPECTATORS:
+            return False
+        self.unwatch(conn)
+        conn.max_queue = SPECTATOR_QUEUE
+        conn.snapshot = lambda: snapshot_message(room)
+        stream = self.streams.get(room_code)
+        if stream is None:
+            stream = self.streams[room_code] = Stream()
+        stream.joining.add(conn)
+        self.watching[conn] = room_code
+        return True
+
+    def unwatch(self, conn):
+        room_code = self.watching.pop(conn, None)
+        if room_code is None:
+            return
+        conn.max_queue = fanout.MAX_QUEUE
+        conn.snapshot = None
+        stream = self.streams.get(room_code)
+        if stream is None:
+            return
+        stream.conns.discard(conn)
+        stream.joining.discard(conn)
+        if not stream.conns and not stream.joining:
+            del self.streams[room_code]
+
+    def publish(self, room_code, version, frame):
+        # frame: the JSON-encoded versioned broadcast bidders were sent
+        stream = self.streams.get(room_code)
+        if stream is None or stream.version is None:
+            return  # Nobody watching yet; joiners get a snapshot anyway
+        if version != stream.pending_version + 1:
+            stream.gap = True
+        stream.pending_version = version
+        if stream.gap:
+            return
+        # Decoded from the frame: a private copy of ops that reference live room state
+        message = codec.JSON.decode(frame)
+        stream.ops.extend(message.pop('delta'))
+        message.pop('version', None)
+        message.pop('server_time', None)
+        stream.events.append(message)
+
+    def close(self, room_code, message):
+        stream = self.streams.pop(room_code, None)
+        if stream is None:
+            return
+        conns = list(stream.conns | stream.joining)
+        for conn in conns:
+            self.watching.pop(conn, None)
+        fanout.broadcast(conns, message, state=False)
+
+    # Flushing
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        for room_code in list(self.streams):
+            stream = self.streams.get(room_code)
+            if stream is None or not (stream.ops or stream.joining or stream.gap):
+                continue
+            room = self.lookup(room_code)
+            if room is None:
+                continue
+            started = flush_seconds.start()
+
+            # Take the window before sending: sends yield, and broadcasts
+            # published meanwhile belong to the next one
+            version = room.version
+            resync = stream.gap or stream.pending_version != version
+            base, ops, events, joining = stream.version, stream.ops, stream.events, stream.joining
+            stream.version = stream.pending_version = version
+            stream.ops, stream.events, stream.joining = [], [], set()
+            stream.gap = False
+
+            if resync:
+                # Everyone restarts from one shared snapshot
+                stream.conns |= joining
+                await self._send(list(stream.conns), snapshot_message(room))
+            else:
+                if ops:
+                    await self._send(list(stream.conns), {
+                        'type': 'room_update',
+                        'base_version': base,
+                        'version': version,
+                        'delta': self.compact(ops),
+                        'events': events,
+                        'server_time': int(time.time() * 1000)
+                    })
+                if joining:
+                    stream.conns |= joining
+                    await self._send(list(joining), snapshot_message(room))
+            flush_seconds.stop(started, room=room_code, spectators=len(stream.conns))
+
+    async def _send(self, conns, message):
+        # Encoded once per codec for the whole set; yields between chunks
+        conns = [conn for conn in conns if not conn.closed]
+        state = message['type'] == 'room_update'
+        frames = {}
+        for start in range(0, len(conns), self.chunk_size):
+            if start:
+                await asyncio.sleep(0)
+            fanout.broadcast(conns[start:start + self.chunk_size], message, state, frames)
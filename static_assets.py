@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip alone still covers every browser
+    brotli = None
+
+# Only these files are ever served; anything else (including ../ paths) is a 404
+STATIC_FILES = [
+    'index.html',
+    'lobby.html',
+    'auction.html',
+    'auction.js',
+    'styles.css',
+    'ipl_players_with_stats.json',
+    'ipl_categorized_players.json'
+]
+
+# Hashed URLs (?v=<hash>) never change content, so they can be cached for a year
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+class Asset:
+    def __init__(self, name, body, mtime):
+        self.name = name
+        self.mtime = mtime
+        self.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = {'identity': body, 'gzip': gzip.compress(body, 9)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body, quality=11)
+
+    def etag(self, encoding):
+        # Strong ETag per representation; the hash part identifies the content
+        suffix = '' if encoding == 'identity' else '-' + encoding
+        return f'"{self.digest}{suffix}"'
+
+class StaticAssets:
+    # Whitelisted static files held in memory with gzip/brotli variants. HTML
+    # pages are rewritten to reference scripts and styles by content hash.
+    def __init__(self, root, names=STATIC_FILES, dev=False):
+        self.root = root
+        self.names = list(names)
+        self.dev = dev
+        self.assets = {}
+        self.load()
+
+    def load(self):
+        raw = {}
+        for name in self.names:
+            path = os.path.join(self.root, name)
+            with open(path, 'rb') as f:
+                raw[name] = (f.read(), os.path.getmtime(path))
+
+        assets = {name: Asset(name, body, mtime) for name, (body, mtime) in raw.items() if not name.endswith('.html')}
+        for name, (body, mtime) in raw.items():
+            if name.endswith('.html'):
+                assets[name] = Asset(name, self._version_links(body, assets), mtime)
+        self.assets = assets
+
+    def _version_links(self, body, assets):
+        def replace(match):
+            asset = assets.get(match.group(2))
+            if asset is None:
+                return match.group(0)
+            return f'{match.group(1)}="{match.group(2)}?v={asset.digest}"'
+        return re.sub(r'(src|href)="([^"?#]+)"', replace, body.decode('utf-8')).encode('utf-8')
+
+    def _stale(self):
+        for name, asset in self.assets.items():
+            try:
+                if os.path.getmtime(os.path.join(self.root, name)) != asset.mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def response(self, request, name):
+        if self.dev and self._stale():
+            self.load()
+
+        asset = self.assets.get(name)
+        if asset is None:
+            return web.Response(status=404, text='Not found')
+
+        versioned = request.query.get('v') == asset.digest
+        cache_control = IMMUTABLE_CACHE if versioned and not self.dev else REVALIDATE_CACHE
+        return asset_response(request, asset, cache_control)
+
+def asset_response(request, asset, cache_control):
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''), asset.variants)
+    headers = {
+        'ETag': asset.etag(encoding),
+        'Cache-Control': cache_control,
+        'Vary': 'Accept-Encoding'
+    }
+
+    if etag_matches(request.headers.get('If-None-Match'), asset.digest):
+        return web.Response(status=304, headers=headers)
+
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    response = web.Response(body=asset.variants[encoding], content_type=asset.content_type, headers=headers)
+    if asset.content_type.startswith('text/') or asset.content_type == 'application/json':
+        response.charset = 'utf-8'
+    return response
+
+def negotiate_encoding(header, variants):
+    accepted = set()
+    for token in header.split(','):
+        parts = [p.strip() for p in token.split(';')]
+        if parts[0] and not any(p.replace(' ', '') in ('q=0', 'q=0.0') for p in parts[1:]):
+            accepted.add(parts[0].lower())
+    for encoding in ('br', 'gzip'):
+        if encoding in variants and encoding in accepted:
+            return encoding
+    return 'identity'
+
+def etag_matches(header, digest):
+    # Any representation of the same content counts as a match
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"').split('-')[0] == digest:
+            return True
+    return False
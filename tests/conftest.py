@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The server keeps its journal under AUCTION_DATA_DIR; never the repo's data/
+os.environ.setdefault('AUCTION_DATA_DIR', tempfile.mkdtemp(prefix='auction_tests_'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auction_server as server
+
+@pytest.fixture(scope='session')
+def loop():
+    # One loop for the whole run: the server's clock scheduler is module-level
+    # and stays bound to the loop it first ran on
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.run_until_complete(server.scheduler.stop())
+    loop.close()
+
+@pytest.fixture
+def room(loop):
+    # A two-team room registered with the server, outside any event loop
+    # task: commands are applied with process_commands directly
+    room = server.AuctionRoom('TEST01', 'Host', 'mega', 15)
+    room.add_player('host', 'Host', 'CSK')
+    room.add_player('p2', 'Second', 'MI')
+    room.commit('room_created')
+    server.rooms[room.room_code] = room
+    yield room
+    room.stop_clock()
+    server.bots.forget(room.room_code)
+    server.rooms.pop(room.room_code, None)
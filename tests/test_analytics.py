@@ -0,0 +1,39 @@
+import math
+
+import pytest
+
+import auction_server as server
+from analytics import NameIndex
+
+def test_ranking_rejects_unknown_filters():
+    valuations = server.valuations.load()
+    for mode, role, band in (('ipl', None, None), (None, 'keeper', None),
+                             (None, None, 3.0), (None, None, math.nan)):
+        with pytest.raises(ValueError):
+            valuations.ranking(mode, role, band)
+    assert all(key[0] in (None, 'mega', 'legend') for key in valuations._rankings)
+    assert not any(isinstance(key[2], float) and math.isnan(key[2]) for key in valuations._rankings)
+
+def test_ranking_band_filter():
+    valuations = server.valuations.load()
+    ids = valuations.ranking('mega', 'batsman', 2.0)
+    assert all(valuations.suggested_price[pid] == 2 for pid in ids)
+    assert valuations.ranking('mega', 'batsman', 2) is ids
+
+def mega(name, role, *teams):
+    return {'name': name, 'role': role, 'teams': list(teams)}
+
+def test_initials_need_role_and_team():
+    index = NameIndex([mega('Kartik Sharma', 'batsman', 'CSK'),
+                       mega('Sharukh Khan', 'batsman', 'GT'), mega('Sharukh Khan', 'batsman', 'PBKS'),
+                       mega('Sarfaraz Khan', 'batsman', 'CSK'),
+                       mega('Virat Kohli', 'batsman', 'RCB'), mega('Hardik Pandya', 'all_rounder', 'MI')])
+    # Karn Sharma, a bowler, shares Kartik's initial, surname and a team
+    assert index.match('KV Sharma', ('CSK', 'MI', 'RCB', 'SRH'), 'bowler') is None
+    # Sarfaraz: two different players are "S Khan", one of them at PBKS
+    assert index.match('SN Khan', ('DC', 'KXIP', 'PBKS', 'RCB'), 'batsman') is None
+    assert index.match('V Kohli', ('RCB',), 'batsman')['name'] == 'Virat Kohli'
+    assert index.match('V Kohli', ('DC',), 'batsman') is None
+    assert index.match('HH Pandya', ('MI',), 'bowler')['name'] == 'Hardik Pandya'
+    # A full name still matches on its own
+    assert index.match('Kartik Sharma', ('DC',), 'bowler')['name'] == 'Kartik Sharma'
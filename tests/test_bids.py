@@ -0,0 +1,47 @@
+import auction_server as server
+import bots
+
+def start(room, lots=3):
+    # The lot clock needs a running loop
+    server.start_queue(room, server.catalog.default_queue('mega')[:lots])
+    room.commit('auction_started')
+
+def test_rejects_non_finite_amounts(loop, room):
+    async def scenario():
+        start(room)
+        for amount in (float('nan'), float('inf'), True, '5'):
+            assert server.validate_bid(room, 'p2', amount) == 'Invalid bid amount'
+        assert server.validate_bid(room, 'p2', server.next_bid_amount(room.auction_state['current_bid'])) is None
+
+    loop.run_until_complete(scenario())
+
+def test_no_bids_during_the_intermission(loop, room):
+    async def scenario():
+        start(room)
+        server.process_commands(room, [('player_sold', 'host', None, {}, None)])
+        assert room.intermission_left() > server.LOT_INTERMISSION - 1
+        amount = server.next_bid_amount(room.auction_state['current_bid'])
+        assert server.validate_bid(room, 'p2', amount) == 'Bidding on this player has not opened yet'
+
+        # Once only the lot's own clock is left, bidding is open
+        room.start_clock(room.timer_duration)
+        assert room.intermission_left() == 0
+        assert server.validate_bid(room, 'p2', amount) is None
+
+    loop.run_until_complete(scenario())
+
+def test_bots_wait_for_the_lot_to_open(loop, room, monkeypatch):
+    # Quickest think time, so the only thing keeping the bid back is the intermission
+    monkeypatch.setattr(bots.random, 'uniform', lambda low, high: low)
+
+    async def scenario():
+        room.add_player('bot', 'Bot', 'RCB', bot='aggressive')
+        room.commit('bot_added')
+        start(room)
+        server.process_commands(room, [('player_sold', 'host', None, {}, None)])
+        handle = server.bots.pending[room.room_code]
+        opens_in = room.intermission_left() / server.TIME_SCALE
+        assert handle.when() - loop.time() >= opens_in
+        server.bots.forget(room.room_code)
+
+    loop.run_until_complete(scenario())
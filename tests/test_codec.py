@@ -0,0 +1,33 @@
+import pytest
+
+import auction_server as server
+import codec
+import lobby
+
+@pytest.mark.parametrize('text', ['{"action": "place_bid", "bid_amount": NaN}',
+                                  '{"action": "place_bid", "bid_amount": -Infinity}'])
+def test_stdlib_json_rejects_non_finite_numbers(text):
+    with pytest.raises(codec.ProtocolError):
+        codec.JsonCodec().decode(text)
+
+@pytest.mark.parametrize('value', [float('nan'), float('inf'), True, '5'])
+def test_number_fields_reject_non_numbers(value):
+    with pytest.raises(codec.ProtocolError):
+        codec.validate({'bid_amount': codec.Field(codec.NUMBER, required=True)}, {'bid_amount': value})
+
+def test_list_items_reject_non_finite_numbers():
+    field = codec.Field(list, items=codec.NUMBER)
+    field.check('ids', [1, 2.5])
+    with pytest.raises(codec.ProtocolError):
+        field.check('ids', [1, float('nan')])
+
+@pytest.mark.parametrize('size', [0, -3])
+def test_queue_size_must_be_positive(size):
+    with pytest.raises(codec.ProtocolError):
+        codec.validate(server.SCHEMAS['start_auction'], {'size': size})
+
+def test_null_optional_fields_are_dropped():
+    message = {'action': 'list_rooms', 'offset': None, 'limit': None}
+    codec.validate(server.SCHEMAS['list_rooms'], message)
+    assert message == {'action': 'list_rooms'}
+    assert lobby.page_bounds(message) == (0, lobby.PAGE_SIZE)
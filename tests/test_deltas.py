@@ -0,0 +1,134 @@
+import json
+
+import auction_server as server
+from journal import apply_ops
+
+def plain(value):
+    # Wire form: what a client holds after JSON.parse
+    return json.loads(json.dumps(value))
+
+def client_view(room):
+    state = plain(room.to_dict())
+    del state['server_time']
+    return without_clock(state)
+
+def without_clock(state):
+    # time_left is recomputed for every snapshot; clients count down from
+    # the deadline between deltas
+    state['auction_state'].pop('time_left', None)
+    return state
+
+def run(room, *commands):
+    server.process_commands(room, [(action, player_id, None, data, None) for action, player_id, data in commands])
+
+def test_compact_ops_drops_overwritten_sets():
+    # Only the first current_bid goes: the nested purse set in between keeps
+    # the earlier players.a set, as compact_ops never reasons inside a path
+    ops = [
+        ['set', ['auction_state', 'current_bid'], 1.0],
+        ['set', ['auction_state', 'current_bid'], 1.1],
+        ['set', ['players', 'a'], {'purse': 100}],
+        ['set', ['players', 'a', 'purse'], 90],
+        ['set', ['players', 'a'], {'purse': 80}]
+    ]
+    assert server.compact_ops(ops) == [
+        ['set', ['auction_state', 'current_bid'], 1.1],
+        ['set', ['players', 'a'], {'purse': 100}],
+        ['set', ['players', 'a', 'purse'], 90],
+        ['set', ['players', 'a'], {'purse': 80}]
+    ]
+
+def test_compact_ops_keeps_set_an_append_depends_on():
+    ops = [
+        ['set', ['auction_state', 'bid_history'], []],
+        ['append', ['auction_state', 'bid_history'], {'amount': 1}],
+        ['set', ['auction_state', 'bid_history'], []]
+    ]
+    assert server.compact_ops(ops) == ops
+
+def test_deltas_rebuild_the_snapshot(loop, room, monkeypatch):
+    async def scenario():
+        sent = []
+        monkeypatch.setattr(server, 'broadcast_to_room', lambda code, message, exclude_id=None: sent.append(message))
+        base = client_view(room)
+
+        lots = server.catalog.default_queue('mega')[:3]
+        run(room, ('start_auction', 'host', {'player_ids': lots}))
+        bid = room.auction_state['current_bid']
+        run(room,
+            ('place_bid', 'p2', {'bid_amount': bid}),
+            ('place_bid', 'host', {'bid_amount': server.next_bid_amount(bid)}),
+            ('send_message', 'p2', {'message': 'hello'}),
+            ('pause_auction', 'p2', {}),
+            ('resume_auction', 'host', {}))
+        run(room, ('player_sold', 'host', {}))
+
+        state = base
+        for message in sent:
+            assert message['version'] == state['version'] + 1
+            apply_ops(state, plain(message['delta']))
+            state['version'] = message['version']
+        assert without_clock(state) == client_view(room)
+
+    loop.run_until_complete(scenario())
+
+def test_replay_since(room):
+    start = room.version
+    for _ in range(3):
+        version, _ = room.commit('test')
+        room.remember(version, f'frame-{version}')
+    assert room.replay_since(start) == [f'frame-{start + 1}', f'frame-{start + 2}', f'frame-{start + 3}']
+    assert room.replay_since(start + 2) == [f'frame-{start + 3}']
+    assert room.replay_since(room.version) == []
+    # Ahead of the room, or from before the buffer: the client needs a snapshot
+    assert room.replay_since(room.version + 1) is None
+    assert room.replay_since(start - 1) is None
+
+def test_replay_since_with_a_gap(room):
+    # A commit that was never broadcast (and so never buffered) leaves a hole
+    start = room.version
+    version, _ = room.commit('test')
+    room.remember(version, 'a')
+    room.commit('not broadcast')
+    version, _ = room.commit('test')
+    room.remember(version, 'c')
+    assert room.replay_since(start + 2) == ['c']
+    assert room.replay_since(start + 1) is None
+    assert room.replay_since(start) is None
+
+def test_replay_since_after_the_buffer_wraps(room):
+    start = room.version
+    for _ in range(server.REPLAY_CAPACITY + 5):
+        version, _ = room.commit('test')
+        room.remember(version, version)
+    assert room.replay_since(start + 4) is None
+    assert room.replay_since(start + 5) == list(range(start + 6, room.version + 1))
+
+class StubConnection:
+    # Just enough of fanout.Connection for broadcasts
+    def __init__(self):
+        self.codec = server.codec.JSON
+        self.frames = []
+
+    def send_frame(self, frame, state=False):
+        self.frames.append(json.loads(frame))
+
+    def send_json(self, message):
+        self.frames.append(message)
+
+def test_failed_handler_resyncs_the_room(room, monkeypatch):
+    def fail_half_way(room, player_id, conn, data):
+        room.set_field(['timer_duration'], 20)
+        raise KeyError('boom')
+    monkeypatch.setitem(server.ROOM_COMMANDS, 'fail_half_way', fail_half_way)
+    conn = StubConnection()
+    room.websockets['p2'] = conn
+    version = room.version
+
+    run(room, ('fail_half_way', 'host', {}))
+    # Applied, committed as a new version and sent as a full snapshot
+    assert room.version == version + 1
+    assert room._ops == []
+    snapshots = [frame for frame in conn.frames if frame['type'] == 'room_snapshot']
+    assert snapshots[-1]['room_data']['timer_duration'] == 20
+    assert snapshots[-1]['room_data']['version'] == room.version
@@ -0,0 +1,84 @@
+import asyncio
+
+from aiohttp import WSCloseCode
+
+import codec
+from fanout import Connection
+
+class StubWs:
+    # Records what the writer sends; nothing goes out until the test yields
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+
+    async def send_str(self, frame):
+        self.sent.append(frame)
+
+    async def close(self, code, message=b''):
+        self.close_code = code
+
+def frame(message):
+    return codec.JSON.encode(message)
+
+async def flushed(conn):
+    while conn.queue or conn.needs_snapshot:
+        await asyncio.sleep(0)
+    await conn.close()
+
+def test_overflow_coalesces_state_frames(loop):
+    async def scenario():
+        ws = StubWs()
+        conn = Connection(ws, max_queue=3)
+        room = {'version': 1}
+        conn.snapshot = lambda: {'type': 'room_state', 'version': room['version']}
+        conn.send_frame(frame({'version': 1}), state=True)
+        conn.send_frame(frame({'type': 'chat'}))
+        conn.send_frame(frame({'version': 2}), state=True)
+        # Full: the state frames give way to one snapshot, chat stays queued
+        conn.send_frame(frame({'version': 3}), state=True)
+        assert conn.needs_snapshot
+        assert list(conn.queue) == [(frame({'type': 'chat'}), False)]
+        conn.send_frame(frame({'version': 4}), state=True)
+        assert conn.backlog == 1
+        # The snapshot is built when it goes out, not when it was scheduled
+        room['version'] = 4
+        await flushed(conn)
+        return ws
+
+    ws = loop.run_until_complete(scenario())
+    assert ws.sent == [frame({'type': 'room_state', 'version': 4}), frame({'type': 'chat'})]
+    assert ws.close_code is None
+
+def test_second_overflow_disconnects(loop):
+    async def scenario():
+        ws = StubWs()
+        conn = Connection(ws, max_queue=2)
+        conn.snapshot = lambda: {'type': 'room_state'}
+        conn.send_frame(frame({'version': 1}), state=True)
+        conn.send_frame(frame({'version': 2}), state=True)
+        conn.send_frame(frame({'type': 'chat', 'n': 1}))
+        assert conn.needs_snapshot and not conn.closed
+        conn.send_frame(frame({'type': 'chat', 'n': 2}))
+        # Overflowing again before the snapshot went out
+        conn.send_frame(frame({'type': 'chat', 'n': 3}))
+        assert conn.closed and not conn.queue
+        await asyncio.sleep(0)
+        await conn.close()
+        return ws
+
+    ws = loop.run_until_complete(scenario())
+    assert ws.sent == []
+    assert ws.close_code == WSCloseCode.TRY_AGAIN_LATER
+
+def test_overflow_without_snapshot_disconnects(loop):
+    async def scenario():
+        ws = StubWs()
+        conn = Connection(ws, max_queue=1)
+        conn.send_frame(frame({'version': 1}), state=True)
+        conn.send_frame(frame({'version': 2}), state=True)
+        assert conn.closed
+        await asyncio.sleep(0)
+        await conn.close()
+        return ws
+
+    assert loop.run_until_complete(scenario()).close_code == WSCloseCode.TRY_AGAIN_LATER
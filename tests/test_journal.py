@@ -0,0 +1,103 @@
+import asyncio
+import glob
+import json
+import os
+
+import pytest
+
+import auction_server as server
+from journal import Journal
+
+def saved(room):
+    # Persisted form, as read back from disk, less the derived time_left
+    state = json.loads(json.dumps(room.state()))
+    del state['auction_state']['time_left']
+    return state
+
+def restored(directory):
+    states = Journal(directory).restore()
+    for state in states.values():
+        del state['auction_state']['time_left']
+    return states
+
+async def play(room, journal, directory, monkeypatch):
+    # room is in the first snapshot; a second room is created after it, so
+    # restore needs snapshot + log tail for both
+    monkeypatch.setattr(server, 'broadcast_to_room', lambda *args, **kwargs: None)
+    rooms = {room.room_code: room}
+    journal.start(rooms)
+    while not glob.glob(os.path.join(directory, 'snapshot-*.json')):
+        await asyncio.sleep(0.01)
+
+    late = server.AuctionRoom('TEST02', 'Late', 'legend', 10)
+    journal.record_state(late.room_code, late.version, late.state())
+    late.add_player('late', 'Late', 'RCB')
+    late.commit('room_created')
+    rooms[late.room_code] = late
+
+    server.process_commands(room, [('start_auction', 'host', None,
+                                    {'player_ids': server.catalog.default_queue('mega')[:3]}, None)])
+    bid = room.auction_state['current_bid']
+    server.process_commands(room, [('place_bid', 'p2', None, {'bid_amount': server.next_bid_amount(bid)}, None),
+                                   ('send_message', 'host', None, {'message': 'hi'}, None)])
+    server.process_commands(room, [('player_sold', 'host', None, {}, None)])
+    late.stop_clock()
+    return late
+
+@pytest.mark.parametrize('crash', [False, True])
+def test_restore(loop, room, tmp_path, monkeypatch, crash):
+    directory = str(tmp_path)
+    journal = Journal(directory, flush_interval=0.01, fsync=False)
+    monkeypatch.setattr(server, 'journal', journal)
+
+    async def scenario():
+        late = await play(room, journal, directory, monkeypatch)
+        if crash:
+            # Let the writer flush, then die without the closing snapshot,
+            # leaving half a record at the end of the log
+            while journal.pending:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            journal._task.cancel()
+            await asyncio.gather(journal._task, return_exceptions=True)
+            [log] = glob.glob(os.path.join(directory, 'journal-*.log'))
+            with open(log, 'ab') as f:
+                f.write(b'{"room":"TEST01","seq":999,"ev')
+        else:
+            await journal.close()
+        return late
+
+    late = loop.run_until_complete(scenario())
+    states = restored(directory)
+    assert set(states) == {room.room_code, late.room_code}
+    assert states[room.room_code] == saved(room)
+    assert states[late.room_code] == saved(late)
+    assert states[room.room_code]['auction_state']['sold_players']
+
+def test_restored_room_matches(room, tmp_path):
+    # from_dict is the inverse of state(); it adopts the dict it is given
+    state = json.loads(json.dumps(room.state()))
+    rebuilt = server.AuctionRoom.from_dict(json.loads(json.dumps(state)))
+    assert json.loads(json.dumps(rebuilt.state())) == state
+
+def test_worker_count_change_with_rooms_refuses(room, tmp_path):
+    directory = str(tmp_path)
+    server.check_data_layout(directory, 1)
+    with open(os.path.join(directory, 'snapshot-000001.json'), 'w') as f:
+        json.dump({'rooms': {room.room_code: room.state()}}, f)
+    with pytest.raises(SystemExit):
+        server.check_data_layout(directory, 2)
+    server.check_data_layout(directory, 1)
+
+def test_worker_count_change_without_rooms(tmp_path):
+    directory = str(tmp_path)
+    server.check_data_layout(directory, 1)
+    server.check_data_layout(directory, 4)
+    with open(os.path.join(directory, 'workers')) as f:
+        assert f.read() == '4'
+
+def test_config_default_data_dir_follows_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv('AUCTION_DATA_DIR', str(tmp_path))
+    assert server.ServerConfig().data_dir == str(tmp_path)
+    monkeypatch.delenv('AUCTION_DATA_DIR')
+    assert server.ServerConfig().data_dir == os.path.join(server.BASE_DIR, 'data')
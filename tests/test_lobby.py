@@ -0,0 +1,30 @@
+from lobby import LobbyIndex
+
+def summary(code, mode='mega', status='waiting', players=1):
+    return {'room_code': code, 'auction_mode': mode, 'status': status, 'players': players}
+
+def codes(result):
+    page, _ = result
+    return [entry['room_code'] for entry in page]
+
+def test_filtered_pages_keep_creation_order():
+    lobby = LobbyIndex()
+    for code in 'ABC':
+        lobby.update(summary(code))
+    # A join changes the summary but no filtered field
+    lobby.update(summary('A', players=2))
+    assert codes(lobby.query()) == ['C', 'B', 'A']
+    assert codes(lobby.query(('mega', None))) == ['C', 'B', 'A']
+    assert codes(lobby.query(('mega', 'waiting'))) == ['C', 'B', 'A']
+
+def test_status_change_moves_bucket():
+    lobby = LobbyIndex()
+    for code in 'ABC':
+        lobby.update(summary(code))
+    lobby.update(summary('B', status='active'))
+    assert codes(lobby.query((None, 'waiting'))) == ['C', 'A']
+    assert codes(lobby.query((None, 'active'))) == ['B']
+    assert codes(lobby.query(('mega', None))) == ['C', 'B', 'A']
+    lobby.remove('B')
+    assert 'active' not in lobby.buckets['status']
+    assert lobby.query((None, 'active')) == ([], 0)
@@ -0,0 +1,12 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+import auction_server as server
+from sharding import Shard
+
+@pytest.mark.parametrize('path', ['/api/results', '/api/results?shard=0', '/api/results?shard=7'])
+def test_sharded_results_need_this_workers_index(loop, monkeypatch, path):
+    monkeypatch.setattr(server, 'shard', Shard(1, 2))
+    with pytest.raises(web.HTTPBadRequest):
+        loop.run_until_complete(server.handle_results(make_mocked_request('GET', path)))